@@ -1,45 +1,434 @@
 import numpy as np
+import json
+import os
+import time
 from datetime import datetime
+from OWLOutput import BinaryOutput
+
+# Number of bytes of an ASOS file converted at once by readASOSFile
+chunkBytes = 8 * 1024 * 1024
+
+# Character positions in an IEM 'YYYY-MM-DD HH:MM' valid time that form the 'YYYYMMDD_HH:MM' time string
+timeChars = [0,1,2,3,5,6,8,9,10,11,12,13,14,15]
+
+# Cloud cover categories in order of increasing coverage.  Stored skyc columns hold indices into this list.
+cloudCategories = ['CLR','FEW','SCT','BKN','OVC']
+cloudToValue = {"CLR":0,"FEW":1,"SCT":2,"BKN":3,"OVC":4,"VV ":4,"VV":4}
+# Code of missing or blank cloud layers in encoded skyc columns
+missingCloud = -1
+
+def encodeClouds(values):
+    """ encodeClouds(values)
+        Purpose:  Dictionary encode an array of skyc strings
+        Parameters:
+            values:  array of cloud cover strings.  Arrays that are already encoded are returned as int8.
+        Returns:
+            int8 array of indices into cloudCategories, with missingCloud for missing or blank layers
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(np.int8)
+    codes = np.zeros(values.shape,dtype=np.int8) + missingCloud
+    for cloud,value in cloudToValue.iteritems():
+        codes[values == cloud] = value
+    return codes
+
+def validToTime(validTimes):
+    """ validToTime(validTimes)
+        Purpose:  Convert 'YYYY-MM-DD HH:MM' valid times to 'YYYYMMDD_HH:MM' time strings
+        Parameters:
+            validTimes:  array of valid time strings.  Any character may separate the date and time.
+        Returns:
+            Array of 'S14' time strings
+    """
+    chars = np.ascontiguousarray(validTimes,dtype='S16').view(np.uint8).reshape(-1,16)[:,timeChars]
+    chars[:,8] = ord('_')
+    return chars.copy().view('S14').ravel()
+
+def epochToTime(epoch):
+    """ epochToTime(epoch)
+        Purpose:  Convert integer minutes since 1970-01-01 00:00 back to time strings
+        Parameters:
+            epoch:  array of minutes, as returned by timeToEpoch
+        Returns:
+            Array of 'YYYYMMDD_HH:MM' strings
+    """
+    return validToTime(np.datetime_as_string(np.asarray(epoch,dtype=np.int64).astype('datetime64[m]')).astype('S16'))
+
+def timeToEpoch(times):
+    """ timeToEpoch(times)
+        Purpose:  Convert date strings to integer minutes since 1970-01-01 00:00
+        Parameters:
+            times:  'YYYYMMDD_HH:MM' or 'YYYYMMDD' string, or array of strings.  Dates without a time are midnight.
+        Returns:
+            Array of int64 minutes
+    """
+    times = np.ascontiguousarray(np.atleast_1d(times),dtype='S14')
+    digits = times.view(np.uint8).reshape(-1,14).astype(np.int64) - ord('0')
+    digits[digits < 0] = 0
+    years = digits[:,0] * 1000 + digits[:,1] * 100 + digits[:,2] * 10 + digits[:,3]
+    months = digits[:,4] * 10 + digits[:,5]
+    days = digits[:,6] * 10 + digits[:,7]
+    hours = digits[:,9] * 10 + digits[:,10]
+    minutes = digits[:,12] * 10 + digits[:,13]
+    monthStarts = ((years - 1970) * 12 + months - 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    return (monthStarts + days - 1) * 1440 + hours * 60 + minutes
+
+def asosDatatype(header):
+    """ asosDatatype(header)
+        Purpose:  Build the record array datatype for the columns of an IEM ASOS file
+        Parameters:
+            header:  list of column names from the file header
+        Returns:
+            List of (name,type) tuples
+    """
+    datatype = []
+    for item in header:
+        if item == 'station':
+            datatype.append((item,'S3'))
+        elif 'valid' in item:
+            datatype.append(('time','S14'))
+        elif 'skyc' in item:
+            datatype.append((item,np.int8))
+        elif item=='metar':
+            datatype.append((item,'S99'))
+        else:
+            datatype.append((item,float))
+    return datatype
+
+def asosFilename(path,site,year):
+    """ asosFilename(path,site,year)
+        Purpose:  Name of the IEM ASOS file holding one year of observations for a site
+    """
+    return path + site.upper() + '_asos_' + str(year) + '.txt'
+
+def readASOSFile(filename,startTime,endTime,header=None,offset=0,holdPartial=False):
+    """ readASOSFile(filename,startTime,endTime,header=None,offset=0,holdPartial=False)
+        Purpose:  Bulk load the rows of an IEM ASOS file that fall within a time window.
+            The file is converted in chunks of chunkBytes, and only rows inside the window are kept,
+            so memory use does not grow with the length of the file.
+        Parameters:
+            filename:  name of the IEM ASOS comma separated file
+            startTime,endTime:  'YYYYMMDD_HH:MM' strings bounding the rows that are kept
+            header:  list of column names.  Required if offset starts past the header line.  Header lines repeated
+                later in the file, as in concatenated downloads, are skipped.  A header line with other columns
+                raises a ValueError.
+            offset:  byte offset in the file where reading starts
+            holdPartial:  if True, a last line without a newline is taken to be a row that is still being written.  It
+                is not read, and offset stops at its start so that the next read picks it up once it is complete.
+        Returns:
+            A tuple of (header, record array, offset, rows scanned).  Rows scanned counts every data row parsed,
+            including rows outside the window that are not kept.  offset is the byte position of the
+            first row that was not consumed, either the first row after endTime or the end of the file.
+    """
+    datafile = open(filename)
+    datafile.seek(offset)
+    datatype = None
+    if header is not None:
+        datatype = asosDatatype(header)
+    chunks = []
+    rowsScanned = 0
+    finished = False
+    while not finished:
+        lines = datafile.readlines(chunkBytes)
+        if len(lines) == 0:
+            break
+        if holdPartial and not lines[-1].endswith('\n'):
+            # Leave a partially written last row for the next read
+            lines = lines[:-1]
+            finished = True
+        lineStarts = offset + np.cumsum([0] + [len(line) for line in lines])
+        offset = lineStarts[-1]
+        rows = []
+        rowStarts = []
+        for i,line in enumerate(lines):
+            if line[0] == '#':
+                continue
+            if 'station' in line:
+                columns = [x.strip() for x in line.rstrip('\r\n').split(',')]
+                if header is None:
+                    header = columns
+                    datatype = asosDatatype(header)
+                elif columns != header:
+                    raise ValueError('Header line with different columns in ' + filename)
+            elif header is not None:
+                rows.append(line.rstrip('\r\n').split(',',len(header) - 1))
+                rowStarts.append(lineStarts[i])
+        rows = [row for row in rows if len(row) == len(header)]
+        if len(rows) == 0:
+            continue
+        rowsScanned += len(rows)
+        fields = np.array(rows)
+        timeCol = [i for i,item in enumerate(header) if 'valid' in item][0]
+        times = validToTime(fields[:,timeCol])
+        late = np.nonzero(times > endTime)[0]
+        if len(late) > 0:
+            # Rows are in time order, so nothing after the first late row is needed
+            offset = rowStarts[late[0]]
+            fields = fields[:late[0]]
+            times = times[:late[0]]
+            finished = True
+        keep = np.nonzero(times >= startTime)[0]
+        fields = fields[keep]
+        values = fields[:,:-1]
+        values[values == 'M'] = '-999'
+        records = np.empty(len(keep),dtype=datatype)
+        for i,(name,dtype) in enumerate(datatype):
+            if name == 'time':
+                records[name] = times[keep]
+            elif 'skyc' in name:
+                records[name] = encodeClouds(fields[:,i])
+            else:
+                records[name] = fields[:,i]
+        chunks.append(records)
+    datafile.close()
+    if header is None:
+        raise ValueError('No header line found in ' + filename)
+    if len(chunks) == 0:
+        return header,np.array([],dtype=datatype),offset,rowsScanned
+    return header,np.concatenate(chunks),offset,rowsScanned
+
+def storeColumns(records):
+    """ storeColumns(records)
+        Purpose:  Convert ASOS records to the typed columns kept by an ASOS store.  skyc columns are dictionary encoded
+            with encodeClouds, and every other field, including the station, time and metar strings, is kept as it is.
+        Parameters:
+            records:  record array with an asosDatatype
+        Returns:
+            Dictionary mapping column names to arrays
+    """
+    columns = {}
+    for name in records.dtype.names:
+        if 'skyc' in name:
+            columns[name] = encodeClouds(records[name])
+        else:
+            columns[name] = np.ascontiguousarray(records[name])
+    return columns
+
+def saveArray(filename,array):
+    """ saveArray(filename,array)
+        Purpose:  Write a .npy file next to its final name and rename it into place, so that arrays still memory
+            mapped from the previous version of the file stay valid.  The file is written by BinaryOutput, so that
+            appendArray can add to it later.
+    """
+    output = BinaryOutput(filename + '.tmp',array.dtype)
+    output.write(array)
+    output.close()
+    os.rename(filename + '.tmp',filename)
+
+def appendArray(filename,array):
+    """ appendArray(filename,array)
+        Purpose:  Add values to the end of a .npy file written by saveArray without reading the values already in it.
+            Arrays memory mapped from the file stay valid and keep their old length.
+    """
+    output = BinaryOutput(filename,array.dtype,append=True)
+    output.write(array)
+    output.close()
+
+def openASOSStore(directory):
+    """ openASOSStore(directory)
+        Purpose:  Open observations written by ASOS.writeStore.  Every column is memory mapped, so the data are read
+            from the page cache as they are used instead of being copied onto the heap.
+        Parameters:
+            directory:  store directory of a single site
+        Returns:
+            ASOS object whose data is a dictionary of memory mapped columns
+    """
+    infofile = open(os.path.join(directory,'store.json'))
+    info = json.load(infofile)
+    infofile.close()
+    data = {}
+    for name in info['columns']:
+        data[str(name)] = np.load(os.path.join(directory,name + '.npy'),mmap_mode='r')
+    state = dict(header=[str(item) for item in info['header']],
+        fileOffsets=dict([(str(filename),offset) for filename,offset in info['fileOffsets'].iteritems()]),
+        data=data,epoch=np.load(os.path.join(directory,'epoch.npy'),mmap_mode='r'),store=directory)
+    return ASOS(str(info['site']),str(info['start']),str(info['end']),path=str(info['path']),state=state)
+
 class ASOS:
-    def __init__(self,site,startDate,endDate,path='verif_data/'):
-        """Initialize ASOS class.  Opens file and loads data from file"""
+    def __init__(self,site,startDate,endDate,path='verif_data/',state=None,files=None):
+        """Initialize ASOS class.  Opens file and loads data from file.
+           state is an optional dictionary with the data, epoch, header and fileOffsets of observations
+           that were loaded before, for example from a cache.  When it is given no files are read.
+           files is an optional list of (filename, readASOSFile result) tuples for the yearly files of the site that
+           were already read between startDate and endDate, for example by a process pool.
+           self.data is the structured record array of the observations, sorted by time, and self.epoch holds the time
+           of each row.  Observations opened with openASOSStore instead hold a dictionary of the memory mapped columns
+           from storeColumns, so columns are read the same way, with self.data[name], either way.  self.store is the
+           store directory the columns are mapped from, or None."""
         self.site = site.upper()
         self.startDateTime = datetime.strptime(startDate,'%Y%m%d')
         self.endDateTime = datetime.strptime(endDate,'%Y%m%d')
-        years = range(self.startDateTime.year,self.endDateTime.year + 1)
+        self.path = path
+        self.fileOffsets = {}
+        self.store = None
+        if state is not None:
+            self.header = state['header']
+            self.datatype = asosDatatype(self.header)
+            self.fileOffsets = dict(state['fileOffsets'])
+            self.data = state['data']
+            self.epoch = state['epoch']
+            self.store = state.get('store')
+            return
+        loadStart = time.time()
+        readFiles = files is None
+        if readFiles:
+            startTime = self.startDateTime.strftime('%Y%m%d_%H:%M')
+            endTime = self.endDateTime.strftime('%Y%m%d_%H:%M')
+            files = [(filename,readASOSFile(filename,startTime,endTime)) for filename in self.yearFiles()]
         data = []
-        for year in years:
-            self.filename=path + self.site + '_asos_' + str(year) + '.txt'
-            datafile = open(self.filename)
-            for line in datafile:
-                if line[0] != '#':
-                    if 'station' in line:
-                        self.header = [x.strip() for x in line[:-1].split(',')]
-                    else:
-                        dataline = line[:-2].split(',')
-                        for i,val in enumerate(dataline[:-1]):
-                            if val=='M':
-                                dataline[i] = -999
-                        dataline[1] = dataline[1].replace(' ','_')
-                        dataline[1] = dataline[1].replace('-','')
-                        currDateTime = datetime.strptime(dataline[1][:14],'%Y%m%d_%H:%M')
-                        if currDateTime >= self.startDateTime and currDateTime <= self.endDateTime:
-                            data.append(tuple(dataline))
-            datafile.close()
-        self.datatype = []
-        for item in self.header:
-            if item == 'station':
-                self.datatype.append((item,'S3'))
-            elif 'valid' in item:
-                self.datatype.append(('time','S14'))
-            elif 'skyc' in item:
-                self.datatype.append((item,'S3'))
-            elif item=='metar':
-                self.datatype.append((item,'S99'))
-            else:
-                self.datatype.append((item,float))
-        self.data = np.array(data,dtype=self.datatype)
+        rowsScanned = 0
+        for filename,(header,records,offset,nrows) in files:
+            self.filename = filename
+            self.header = header
+            self.fileOffsets[filename] = offset
+            data.append(records)
+            rowsScanned += nrows
+        self.datatype = asosDatatype(self.header)
+        self.data,self.epoch = self.buildTimeIndex(np.concatenate(data))
+        elapsed = max(time.time() - loadStart,1e-6)
+        if readFiles:
+            print "%s: scanned %d rows, kept %d, in %.2f s (%.0f rows scanned/s)" % (self.site,rowsScanned,len(self.epoch),elapsed,rowsScanned / elapsed)
+
+    def __getstate__(self):
+        """ __getstate__()
+            Purpose:  Pickle observations mapped from an ASOS store as the name of the store, so that sending them to
+                another process does not copy their columns.  Other observations are pickled in full.
+        """
+        if self.store is not None:
+            return dict(store=self.store)
+        return self.__dict__
+
+    def __setstate__(self,state):
+        """ __setstate__(state)
+            Purpose:  Restore pickled observations, mapping the columns of an ASOS store again
+        """
+        if len(state) == 1 and 'store' in state:
+            state = openASOSStore(state['store']).__dict__
+        self.__dict__.update(state)
+
+    def yearFiles(self):
+        """ yearFiles()
+            Purpose:  List the IEM ASOS files of the site for every year from the start date to the end date
+            Returns:  list of file names, oldest first
+        """
+        return [asosFilename(self.path,self.site,year) for year in range(self.startDateTime.year,self.endDateTime.year + 1)]
     
+    def writeStore(self,directory):
+        """ writeStore(directory)
+            Purpose:  Write the observations as an ASOS store: one .npy file per typed column plus the time index and a
+                store.json description.  Open it with openASOSStore.  When the observations are mapped from the store in
+                directory, update() has already appended to its columns and only store.json is written.
+            Parameters:
+                directory:  store directory for this site
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        columns = self.typedColumns()
+        if self.store is None or os.path.realpath(self.store) != os.path.realpath(directory):
+            for name,column in columns.iteritems():
+                saveArray(os.path.join(directory,name + '.npy'),column)
+            saveArray(os.path.join(directory,'epoch.npy'),self.epoch)
+        info = dict(site=self.site,header=self.header,fileOffsets=self.fileOffsets,path=self.path,columns=sorted(columns.keys()),
+            start=self.startDateTime.strftime('%Y%m%d'),end=self.endDateTime.strftime('%Y%m%d'))
+        infofile = open(os.path.join(directory,'store.json.tmp'),'w')
+        json.dump(info,infofile)
+        infofile.close()
+        os.rename(os.path.join(directory,'store.json.tmp'),os.path.join(directory,'store.json'))
+
+    def update(self,startDate,endDate):
+        """ update(startDate,endDate)
+            Purpose:  Append observations newer than the last stored observation, up to endDate.
+                Files that were read before are resumed from the byte offset where the last read stopped,
+                so earlier history is not parsed again and every row after the offset is new, even one with the
+                same time as the last stored observation.  Yearly files that have appeared since are read in full
+                and only their rows after the last stored observation are kept.  Observations mapped from an ASOS store
+                are appended to the store files, which are then mapped again, so the stored rows are not copied.
+            Parameters:
+                startDate:  YYYYMMDD string.  Only used when no observations are stored yet.
+                endDate:  YYYYMMDD string for the last date to include
+        """
+        self.endDateTime = max(self.endDateTime,datetime.strptime(endDate,'%Y%m%d'))
+        if len(self.epoch) > 0:
+            lastTime = epochToTime(self.epoch[-1:])[0]
+        else:
+            lastTime = datetime.strptime(startDate,'%Y%m%d').strftime('%Y%m%d_%H:%M')
+        endTime = self.endDateTime.strftime('%Y%m%d_%H:%M')
+        fileOffsets = getattr(self,'fileOffsets',{})
+        path = getattr(self,'path','verif_data/')
+        data = []
+        rowsScanned = 0
+        loadStart = time.time()
+        for year in range(int(lastTime[:4]),self.endDateTime.year + 1):
+            filename = asosFilename(path,self.site,year)
+            if not os.path.exists(filename):
+                continue
+            offset = fileOffsets.get(filename,0)
+            if offset > 0:
+                header,records,offset,nrows = readASOSFile(filename,self.startDateTime.strftime('%Y%m%d_%H:%M'),endTime,
+                    header=self.header,offset=offset,holdPartial=True)
+            else:
+                header,records,offset,nrows = readASOSFile(filename,lastTime,endTime)
+                records = records[records['time'] > lastTime]
+            fileOffsets[filename] = offset
+            data.append(records)
+            rowsScanned += nrows
+        self.fileOffsets = fileOffsets
+        self.path = path
+        records,epoch = self.buildTimeIndex(np.concatenate(data + [np.zeros((0,),dtype=asosDatatype(self.header))]))
+        if self.store is not None:
+            if len(epoch) > 0:
+                columns = storeColumns(records)
+                for name in self.data.keys():
+                    appendArray(os.path.join(self.store,name + '.npy'),columns[name])
+                appendArray(os.path.join(self.store,'epoch.npy'),epoch)
+            self.writeStore(self.store)
+            self.data = dict([(name,np.load(os.path.join(self.store,name + '.npy'),mmap_mode='r')) for name in self.data.keys()])
+            self.epoch = np.load(os.path.join(self.store,'epoch.npy'),mmap_mode='r')
+        else:
+            self.data = np.concatenate((self.data,records))
+            self.epoch = np.concatenate((self.epoch,epoch))
+        elapsed = max(time.time() - loadStart,1e-6)
+        print "%s: scanned %d new rows, added %d, in %.2f s (%.0f rows scanned/s)" % (self.site,rowsScanned,len(epoch),elapsed,rowsScanned / elapsed)
+
+    def buildTimeIndex(self,records):
+        """ buildTimeIndex(records)
+            Purpose:  Sort ASOS records by time and find the integer epoch minute of each one
+            Parameters:
+                records:  record array with an asosDatatype
+            Returns:
+                Tuple of (sorted records, epoch minute of each of them)
+        """
+        epoch = timeToEpoch(records['time'])
+        if np.any(epoch[1:] < epoch[:-1]):
+            order = np.argsort(epoch,kind='mergesort')
+            records = records[order]
+            epoch = epoch[order]
+        return records,epoch
+
+    def typedColumns(self):
+        """ typedColumns()
+            Purpose:  Typed columns of the observations, as kept by an ASOS store
+            Returns:
+                Dictionary mapping column names to arrays
+        """
+        if isinstance(self.data,dict):
+            return self.data
+        return storeColumns(self.data)
+
+    def getWindowIndices(self,startDates,endDates):
+        """ getWindowIndices(startDates,endDates)
+            Purpose:  Find the slice of the time index covered by each time window
+            Parameters:
+                startDates:  date string or array of date strings for the start of each window
+                endDates:  date string or array of date strings for the end of each window
+            Returns:
+                Tuple of arrays (lo,hi) such that observations lo:hi fall inside each window, endpoints included
+        """
+        lo = self.epoch.searchsorted(timeToEpoch(startDates),'left')
+        hi = self.epoch.searchsorted(timeToEpoch(endDates),'right')
+        return lo,np.maximum(lo,hi)
+
     def getDataValues(self,startDate,endDate,variable,dataFilter=True):
         """ getDataValues(startDate,endDate,variable)
             Purpose:  Retrieve values over a particular time range.
@@ -48,11 +437,55 @@ class ASOS:
                 endDate:  date string for end of period of interest
                 variable:  variable to be extracted.
         """
+        lo,hi = self.getWindowIndices(startDate,endDate)
+        values = self.data[variable][lo[0]:hi[0]]
         if dataFilter:
-            dateIdxs = np.nonzero((self.data['time'] >= startDate) & (self.data['time'] <= endDate) & (self.data[variable] > -990))
+            values = values[values > -990]
+        return values
+
+    def reduceWindows(self,variable,startDates,endDates,op,valid_range=None,missing=-998):
+        """ reduceWindows(variable,startDates,endDates,op)
+            Purpose:  Reduce a variable over many time windows at once.  Counts and sums come from prefix sums
+                over the time index and maxima and minima from a single segment reduction, so the cost does not
+                depend on a Python loop over the windows.
+            Parameters:
+                variable:  variable to be reduced, or an array of values derived from the observations in time order
+                startDates:  array of starting date strings for each window
+                endDates:  array of ending date strings for each window
+                op:  'max', 'min', 'sum' or 'count'
+                valid_range:  optional (low,high) tuple.  Values outside of it are left out of the reduction.
+                missing:  value returned for windows without any valid observations
+            Returns:
+                Array with the reduced value for each window
+        """
+        lo,hi = self.getWindowIndices(startDates,endDates)
+        if isinstance(variable,str):
+            variable = self.data[variable]
+        values = np.asarray(variable,dtype=float)
+        valid = values > -990
+        if valid_range is not None:
+            valid &= (values >= valid_range[0]) & (values <= valid_range[1])
+        validCount = np.concatenate(([0],np.cumsum(valid)))
+        counts = validCount[hi] - validCount[lo]
+        if op == 'count':
+            return counts.astype(float)
+        elif op == 'sum':
+            validSum = np.concatenate(([0.0],np.cumsum(np.where(valid,values,0.0))))
+            reduced = validSum[hi] - validSum[lo]
+        elif op in ['max','min']:
+            if op == 'max':
+                ufunc,fillValue = np.maximum,-np.inf
+            else:
+                ufunc,fillValue = np.minimum,np.inf
+            filled = np.append(np.where(valid,values,fillValue),fillValue)
+            if len(lo) > 0:
+                # Each (lo,hi) pair reduces filled[lo:hi]; the hi:lo segments in between are discarded
+                reduced = ufunc.reduceat(filled,np.column_stack((lo,hi)).ravel())[::2]
+            else:
+                reduced = np.zeros((0,),dtype=float)
         else:
-            dateIdxs = np.nonzero((self.data['time'] >= startDate) & (self.data['time'] <= endDate))
-        return self.data[variable][dateIdxs]
+            raise ValueError('Unknown window reduction ' + str(op))
+        return np.where(counts > 0,reduced,missing)
 
     def getHighTemps(self,startDates,endDates,valid_range = (-40,140)):
         """ getHighTemps(startDates,endDates)
@@ -63,20 +496,7 @@ class ASOS:
             Returns:
                 Array of high temperatures corresponding to the periods in startDates and endDates 
             """
-        #highTemps = []
-        highTemps = np.zeros((len(startDates),),dtype=float)
-        for idx in xrange(len(startDates)):
-            temps = self.getDataValues(startDates[idx],endDates[idx],'tmpf')
-             
-            if len(temps) > 0:
-                valid_idxs = np.nonzero((temps >= valid_range[0]) & (temps <= valid_range[1]))
-                #highTemps.append(np.max(temps[valid_idxs]))
-                highTemps[idx] = np.max(temps[valid_idxs])
-            else:
-                #highTemps.append(-998)
-                highTemps[idx] = -998
-        #return np.array(highTemps,dtype=float)
-        return highTemps
+        return self.reduceWindows('tmpf',startDates,endDates,'max',valid_range)
 
     def getLowTemps(self,startDates,endDates, valid_range = (-40,140)):
         """ getLowTemps(startDates,endDates)
@@ -87,19 +507,7 @@ class ASOS:
             Returns:
                 Array of low temperatures corresponding to the periods in startDates and endDates
         """
-        #lowTemps = []
-        lowTemps = np.zeros((len(startDates),),dtype=float)
-        for idx in xrange(len(startDates)):
-            temps = self.getDataValues(startDates[idx],endDates[idx],'tmpf')
-            if len(temps) > 0:
-                valid_idxs = np.nonzero((temps >= valid_range[0]) & (temps <= valid_range[1]))
-                #lowTemps.append(np.min(temps))
-                lowTemps[idx] = np.min(temps[valid_idxs])
-            else:
-                #lowTemps.append(-998)
-                lowTemps[idx] = -998
-        #return np.array(lowTemps,dtype=float)
-        return lowTemps
+        return self.reduceWindows('tmpf',startDates,endDates,'min',valid_range)
     
     def getMaxWinds(self,startDates,endDates):
         """ getMaxWinds(startDates,endDates)
@@ -110,15 +518,8 @@ class ASOS:
             Returns:
                 Array of max wind speeds corresponding to the periods in startDates and endDates
             """
-        maxWinds = []
-        for idx in xrange(len(startDates)):
-            winds = self.getDataValues(startDates[idx],endDates[idx],'sknt')
-            if len(winds) > 0:
-                #print np.max(winds)*1.15077945
-                maxWinds.append(np.max(winds)*1.15077945)
-            else:
-                maxWinds.append(-998)
-        return np.array(maxWinds,dtype=float)
+        maxWinds = self.reduceWindows('sknt',startDates,endDates,'max')
+        return np.where(maxWinds > -990,maxWinds * 1.15077945,maxWinds)
 
     def getMinWinds(self,startDates,endDates):
         """ getMinWinds(startDates,endDates)
@@ -129,15 +530,8 @@ class ASOS:
             Returns:
                 Array of min wind speeds corresponding to the periods in startDates and endDates
             """
-        minWinds = []
-        for idx in xrange(len(startDates)):
-            winds = self.getDataValues(startDates[idx],endDates[idx],'sknt')
-            if len(winds) > 0:
-                minWinds.append(np.min(winds)*1.15077945)
-                #print np.min(winds)*1.15077945
-            else:
-                minWinds.append(-998)
-        return np.array(minWinds,dtype=float)
+        minWinds = self.reduceWindows('sknt',startDates,endDates,'min')
+        return np.where(minWinds > -990,minWinds * 1.15077945,minWinds)
 
 
     def getPrecip(self, startDates, endDates):
@@ -147,19 +541,33 @@ class ASOS:
                 startDates [type=list,tuple,np.array]:  Array of starting date strings (format is 'YYYYMMDD_HH:MM') for each forecast period.
                 endDates [type=list,tuple,np.array]:  Array of starting date strings (format is 'YYYYMMDD_HH:MM', same as in startDates) for each forecast period.
             Returns:
-                A boolean array of precipitation occurrence corresponding to the periods in startDates and endDates.
+                An array of precipitation totals corresponding to the periods in startDates and endDates.  Windows with no rain sum to exactly 0.
         """
-        precip = []
-        for idx in xrange(len(startDates)):
-            precip1hr = self.getDataValues(startDates[idx], endDates[idx], 'p01m')
-#           if self.site == "ADM" and startDates[idx][-5:] == "10:00" and endDates[idx][-5:] == "18:00":
-#               print startDates[idx], endDates[idx], precip1hr
-            if len(precip1hr) > 0:
-                precip.append(precip1hr.sum())
-            else:
-                precip.append(-998)
-        return np.array(precip, dtype=float)
+        return self.reduceWindows('p01m',startDates,endDates,'sum')
+
+
+    def getCloudLayers(self):
+        """ getCloudLayers()
+            Purpose:  Find the greatest cloud cover reported in any layer of each observation
+            Returns:
+                int8 array of indices into cloudCategories for each observation, with missingCloud where no layer is reported
+        """
+        layers = [encodeClouds(self.data[name]) for name in ['skyc1','skyc2','skyc3','skyc4'] if name in self.header]
+        if len(layers) == 0:
+            return np.zeros(self.epoch.shape,dtype=np.int8) + missingCloud
+        return np.max(layers,axis=0)
 
+    def getSkyCover(self,startDates,endDates):
+        """ getSkyCover(startDates,endDates)
+            Purpose:  Retrieve the greatest cloud cover observed in any layer for given start and end dates
+            Parameters:
+                startDates:  array of starting date strings for each forecast period
+                endDates:  array of ending date strings for each forecast period
+            Returns:
+                Array of indices into cloudCategories for the periods in startDates and endDates, -998 if no layer was reported
+        """
+        layers = self.getCloudLayers()
+        return self.reduceWindows(np.where(layers != missingCloud,layers,-999),startDates,endDates,'max')
 
     def getCloudCover(self,startDates,endDates):
         """getCloudCover(startDates,endDates)
@@ -170,20 +578,10 @@ class ASOS:
            Returns:
                Array of cloud cover corresponding to the periods in startDates and endDates.
         """
-        cloudToValue = {"CLR":0,"FEW":1,"SCT":2,"BKN":3,"OVC":4,"VV ":4,"M":-998,"   ":-998,"Non":-998}
-        valueToCloud = {0:"CLR",1:"FEW",2:"SCT",3:"BKN",4:"OVC",-998:"M"}
-        CloudCover = []
-        for idx in xrange(len(startDates)):
-            level1 = np.array([cloudToValue[x] for x in self.getDataValues(startDates[idx],endDates[idx],'skyc1')])
-            level2 = np.array([cloudToValue[x] for x in self.getDataValues(startDates[idx],endDates[idx],'skyc2')])
-            level3 = np.array([cloudToValue[x] for x in self.getDataValues(startDates[idx],endDates[idx],'skyc3')])
-            level4 = np.array([cloudToValue[x] for x in self.getDataValues(startDates[idx],endDates[idx],'skyc4')])
-            allLevels = np.hstack((level1,level2,level3,level4))
-            if len(allLevels) > 0:
-                CloudCover.append(np.max(allLevels))
-            else:
-                CloudCover.append(-998)
-        return np.array([valueToCloud[cc] for cc in CloudCover],dtype='S3')
+        # missingCloud (-1) picks the trailing 'M'
+        valueToCloud = np.array(cloudCategories + ['M'],dtype='S3')
+        cover = self.getSkyCover(startDates,endDates)
+        return valueToCloud[np.where(cover > -990,cover,missingCloud).astype(int)]
     
 def main():
     for site in ['adm','clk','end','eyw','guy','prx','law','lts','mlc','okc','oun','prx','tul','wwr']:
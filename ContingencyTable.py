@@ -2,6 +2,75 @@
 import numpy as np
 from copy import copy
 
+def bootstrapWeights(numBlocks, samples, randomState=None):
+    """
+    bootstrapWeights()
+    Purpose:    Draw bootstrap resamples of numBlocks blocks of pairs as one (samples, numBlocks) index matrix and count how
+                often each block is drawn in each resample.  A score built from sums over pairs is then scored for every
+                resample at once as a matrix product of these counts with the sums of each block.
+    Parameters: numBlocks [type=int]: Number of blocks, such as pairs or forecast dates.
+                samples [type=int]: Number of resamples.
+                randomState [type=np.random.RandomState]: Source of random numbers.  Defaults to np.random.
+    Returns:    Array of shape (samples, numBlocks) of the number of times each block is drawn.
+    """
+    if randomState is None:
+        randomState = np.random
+    if numBlocks == 0:
+        return np.zeros((samples, 0), dtype=int)
+    draws = randomState.randint(0, numBlocks, size=(samples, numBlocks))
+    draws += numBlocks * np.arange(samples)[:, np.newaxis]
+    return np.bincount(draws.ravel(), minlength=samples * numBlocks).reshape((samples, numBlocks))
+
+def brierScores(tables, labels):
+    """
+    brierScores()
+    Purpose:    Compute the Brier score and its components for a stack of 2 x n probability contingency tables at once.
+    Parameters: tables [type=np.array]: Tables of shape (..., 2, n).
+                labels [type=np.array]: Probability of each column.
+    Returns:    A tuple of (BrierScore, reliability, resolution, uncertainty) arrays, one value for each table.
+    """
+    tables = np.asarray(tables, dtype=float)
+    N = tables.sum(axis=(-2, -1))
+    num_forecasts = tables.sum(axis=-2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        obs_freq = np.where(num_forecasts > 0, tables[..., 1, :] / num_forecasts, 0)
+        climo = tables[..., 1, :].sum(axis=-1) / N
+        reliability = (num_forecasts * (labels - obs_freq) ** 2).sum(axis=-1) / N
+        resolution = (num_forecasts * (obs_freq - climo[..., np.newaxis]) ** 2).sum(axis=-1) / N
+    uncertainty = climo * (1 - climo)
+    return reliability - resolution + uncertainty, reliability, resolution, uncertainty
+
+def heidkeSkillScores(tables):
+    """
+    heidkeSkillScores()
+    Purpose:    Compute the multiclass Heidke Skill Score for a stack of n x n contingency tables at once.
+    Parameters: tables [type=np.array]: Tables of shape (..., n, n) with the forecast categories as rows.
+    Returns:    Array of the Heidke Skill Score of each table.
+    """
+    N, hits, chance, observed = _multiclassSums(tables)
+    return (hits / N - chance / N**2) / (1 - chance / N**2)
+
+def peirceSkillScores(tables):
+    """
+    peirceSkillScores()
+    Purpose:    Compute the multiclass Peirce Skill Score for a stack of n x n contingency tables at once.
+    Parameters: tables [type=np.array]: Tables of shape (..., n, n) with the forecast categories as rows.
+    Returns:    Array of the Peirce Skill Score of each table.
+    """
+    N, hits, chance, observed = _multiclassSums(tables)
+    return (hits / N - chance / N**2) / (1 - observed / N**2)
+
+def _multiclassSums(tables):
+    """
+    _multiclassSums() [private]
+    Purpose:    Sums shared by the multiclass skill scores: the number of pairs, the correct forecasts, the sum over
+                categories of forecast count times observed count, and the sum of the squared observed counts.
+    """
+    tables = np.asarray(tables, dtype=float)
+    NO = tables.sum(axis=-2)
+    NF = tables.sum(axis=-1)
+    return tables.sum(axis=(-2, -1)), np.trace(tables, axis1=-2, axis2=-1), (NO * NF).sum(axis=-1), (NO**2).sum(axis=-1)
+
 """
 ContingencyTable
 Purpose:    Base class for the contingency tables.  Handles things like getting and setting individual items in the table and converting tables to strings.
@@ -50,7 +119,7 @@ class ContingencyTable(object):
             print "Error!"
 
         result = copy(self)
-        result.ct += other.ct       
+        result.ct = self.ct + other.ct
         return result
 
     def __iadd__(self, other):
@@ -104,6 +173,76 @@ class ProbContingencyTable(ContingencyTable):
             self.ct = data
         return
 
+    def accumulate(self, probs, outcomes, bins=None, missing=-990):
+        """
+        accumulate() [public]
+        Purpose:    Count arrays of probability forecasts and their outcomes into the table with a single bincount.
+        Parameters: probs, outcomes, bins, missing:  as in cells()
+        Returns:    The number of pairs counted.
+        """
+        cells, counted = self.cells(probs, outcomes, bins, missing)
+        self.ct += np.bincount(cells, minlength=self.ct.size).reshape(self.ct.shape)
+        return len(cells)
+
+    def cells(self, probs, outcomes, bins=None, missing=-990):
+        """
+        cells() [public]
+        Purpose:    Find the table cell of each pair of a probability forecast and its outcome.
+        Parameters: probs [type=np.array]: Forecast probabilities, in the units of bins.
+                    outcomes [type=np.array]: Whether each event was observed (True or greater than 0).
+                    bins [type=np.array]: Edges of the table columns.  Column i counts probabilities in [bins[i], bins[i+1]),
+                        and the last column also counts bins[-1].  By default each probability is counted in the column
+                        whose label is nearest to it.
+                    missing [type=float]: Probabilities and outcomes at or below this value are missing, as are NaNs.
+                        Missing pairs and probabilities outside the bins are not counted.
+        Returns:    A tuple of (flat index into self.ct of each counted pair, boolean array marking the pairs counted).
+        """
+        probs = np.asarray(probs, dtype=float)
+        outcomes = np.asarray(outcomes)
+        if bins is None:
+            bins = np.concatenate(([-np.inf], (self.labels[1:] + self.labels[:-1]) / 2, [np.inf]))
+        bins = np.asarray(bins, dtype=float)
+        if len(bins) != self.ct.shape[1] + 1:
+            raise ValueError('Expected %d bin edges, got %d' % (self.ct.shape[1] + 1, len(bins)))
+        with np.errstate(invalid='ignore'):
+            counted = probs > missing
+            if outcomes.dtype != bool:
+                counted &= outcomes > missing
+        columns = bins.searchsorted(probs, 'right') - 1
+        columns[probs == bins[-1]] = len(bins) - 2
+        counted &= (columns >= 0) & (columns < len(bins) - 1)
+        rows = (outcomes[counted] > 0).astype(int)
+        return rows * self.ct.shape[1] + columns[counted], counted
+
+    def bootstrap(self, samples=1000, blockTables=None, randomState=None, weights=None):
+        """
+        bootstrap() [public]
+        Purpose:    Score resamples of the forecasts in the table all at once.  Without blockTables, each resample is
+                    a multinomial draw of the table's pairs.  With blockTables, whole blocks of pairs, such as all of
+                    the forecasts for one date, are resampled together.
+        Parameters: samples [type=int]: Number of resamples.
+                    blockTables [type=np.array]: Tables of shape (blocks, 2, n) with the counts of each block.
+                    randomState [type=np.random.RandomState]: Source of random numbers.  Defaults to np.random.
+                    weights [type=np.array]: Counts of each block in each resample from bootstrapWeights(), used instead
+                        of new resamples so that several tables are scored on the same resamples.
+        Returns:    Dictionary mapping BS and BSS to arrays of the score of each resample.
+        """
+        if randomState is None:
+            randomState = np.random
+        if blockTables is None:
+            N = int(self.ct.sum())
+            if N == 0:
+                return dict(BS=np.zeros((samples,)) + np.nan, BSS=np.zeros((samples,)) + np.nan)
+            tables = randomState.multinomial(N, self.ct.ravel() / float(N), size=samples)
+        else:
+            if weights is None:
+                weights = bootstrapWeights(len(blockTables), samples, randomState)
+            tables = weights.dot(blockTables.reshape((len(blockTables), -1)))
+        BS, reliability, resolution, uncertainty = brierScores(tables.reshape((len(tables),) + self.ct.shape), self.labels)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            BSS = (resolution - reliability) / uncertainty
+        return dict(BS=BS, BSS=BSS)
+
     def getReliability(self):
         """
         getReliability() [public]
@@ -119,15 +258,7 @@ class ProbContingencyTable(ContingencyTable):
         Purpose:  Compute the Brier Score and its components: reliability, resolution, and uncertainty
         Returns:  If components==False, returns Brier Score.  If components==True, returns a tuple of (BrierScore,reliability,resolution,uncertainty).
         """
-        N = self.ct.sum(dtype=float)
-        num_forecasts = self.ct.sum(axis=0,dtype=float)
-        obs_freq = self.ct[1] / num_forecasts
-        obs_freq[np.nonzero(np.isnan(obs_freq))] = 0
-        climo = np.sum(self.ct[1]) / N
-        reliability = 1/N * np.sum(num_forecasts * (self.labels- obs_freq) ** 2)
-        resolution = 1/N * np.sum(num_forecasts * (obs_freq - climo) ** 2)
-        uncertainty = climo * ( 1 - climo)
-        BS = reliability - resolution + uncertainty
+        BS,reliability,resolution,uncertainty = brierScores(self.ct, self.labels)
         if components:
             return BS,reliability,resolution,uncertainty
         else:
@@ -173,20 +304,30 @@ class MultiContingencyTable(ContingencyTable):
             self.ct = data
         return
 
+    def accumulate(self, forecasts, observations):
+        """
+        accumulate() [public]
+        Purpose:    Count arrays of forecast and observed categories into the table with a single 2-D bincount.
+        Parameters: forecasts [type=np.array]: Forecast category of each pair, an index into labels.
+                    observations [type=np.array]: Observed category of each pair, an index into labels.
+                    Pairs with either category outside of the table, such as a negative missing value, are not counted.
+        Returns:    The number of pairs counted.
+        """
+        forecasts = np.asarray(forecasts).astype(int)
+        observations = np.asarray(observations).astype(int)
+        size = self.ct.shape[0]
+        counted = (forecasts >= 0) & (forecasts < size) & (observations >= 0) & (observations < size)
+        cells = forecasts[counted] * size + observations[counted]
+        self.ct += np.bincount(cells, minlength=self.ct.size).reshape(self.ct.shape)
+        return len(cells)
+
     def HeidkeSkillScore(self):
         """
         HeidkeSkillScore() [public]
         Purpose:  Calculate the multiclass Heidke Skill Score
         Returns:  the Heidke Skill Score
         """
-        N = self.ct.sum(dtype=float)
-        NO = self.ct.sum(axis=0)
-        NF = self.ct.sum(axis=1)
-        n_diag = 0
-        for i in xrange(self.ct.shape[0]):
-            n_diag += self.ct[i,i]
-        HSS = (1/N * n_diag - 1/N**2 * np.sum(NO * NF)) / ( 1 - 1/N**2 * np.sum(NF * NO))
-        return HSS
+        return heidkeSkillScores(self.ct)
     
     def PeirceSkillScore(self):
         """
@@ -194,36 +335,161 @@ class MultiContingencyTable(ContingencyTable):
         Purpose:  Calculate the multiclass Peirce (a.k.a. Hanssen and Kuipers, true skill statistic)
         Returns:  The Peirce Skill Score
         """
-        N = self.ct.sum(dtype=float)
-        NO = self.ct.sum(axis=0)
-        NF = self.ct.sum(axis=1)
-        n_diag = 0
-        for i in xrange(self.ct.shape[0]):
-            n_diag += self.ct[i,i]
-        PSS = (1/N * n_diag - 1/N**2 * np.sum(NO * NF)) / ( 1 - 1/N**2 * np.sum(NO**2))
-        return PSS
+        return peirceSkillScores(self.ct)
+
+"""
+StackedContingencyTable
+Purpose:    Holds many contingency tables of the same size in one array of shape (..., rows, cols), for example one table
+            per station, period and shift.  Every score is computed for all of the tables in one vectorized call, and
+            tables are pooled over stations, shifts or any other leading axis by summing over that axis.
+"""
+
+class StackedContingencyTable(ContingencyTable):
+    def __init__(self, labels, axes, keys, size, data=None):
+        """
+        __init__()
+        Purpose:    Constructor for the StackedContingencyTable class.  Either initializes every table as a blank
+                    size[0] x size[1] table or fills the stack with the data provided.
+        Parameters: labels [type=np.array]:  Probability of each column for 2 x n probability tables, or the label of each
+                        category for n x n multiclass tables.
+                    axes [type=tuple]:  Name of each leading axis, such as ('station', 'period').
+                    keys [type=list]:  List of the key values along each leading axis, such as the station names.
+                    size [type=tuple]:  (rows, cols) of each table.
+                    data [type=np.array]:  Tables of shape (len(keys[0]), ..., rows, cols) to fill the stack with.
+        """
+        self.labels = labels
+        self.axes = tuple(axes)
+        self.keys = [list(key) for key in keys]
+        shape = tuple([len(key) for key in self.keys]) + tuple(size)
+        if data is None:
+            self.ct = np.zeros(shape)
+        else:
+            if data.shape != shape:
+                raise ValueError('Expected tables of shape %s, got %s' % (shape, data.shape))
+            self.ct = data
+        return
+
+    def accumulate(self, indices, rows, columns):
+        """
+        accumulate() [public]
+        Purpose:    Count pairs into their tables with a single bincount.
+        Parameters: indices [type=tuple]:  One array per leading axis with the position of each pair's table along it.
+                    rows [type=np.array]:  Table row of each pair.
+                    columns [type=np.array]:  Table column of each pair.
+        Returns:    The number of pairs counted.
+        """
+        cells = np.ravel_multi_index(tuple(indices) + (rows, columns), self.ct.shape)
+        self.ct += np.bincount(cells, minlength=self.ct.size).reshape(self.ct.shape)
+        return len(cells)
+
+    def index(self, **keys):
+        """
+        index() [public]
+        Purpose:    Find the position of a table in the stack from its key values.
+        Parameters: keys:  The key value along each leading axis, such as station='OUN', period='1A'.
+        Returns:    Tuple index into self.ct.
+        """
+        return tuple([self.keys[i].index(keys[axis]) for i, axis in enumerate(self.axes)])
+
+    def pool(self, *axes):
+        """
+        pool() [public]
+        Purpose:    Pool the tables over one or more leading axes, for example all stations.
+        Parameters: axes [type=string]:  Names of the axes to pool.
+        Returns:    StackedContingencyTable without the pooled axes.
+        """
+        pooled = tuple([self.axes.index(axis) for axis in axes])
+        kept = [i for i in range(len(self.axes)) if i not in pooled]
+        return StackedContingencyTable(self.labels, [self.axes[i] for i in kept], [self.keys[i] for i in kept],
+            self.ct.shape[-2:], self.ct.sum(axis=pooled))
+
+    def getReliability(self):
+        """
+        getReliability() [public]
+        Purpose:    Compute the reliability diagram data of every 2 x n probability table.
+        Returns:    Array of shape (..., n) of the observed frequency in each column.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.ct[..., 1, :] / self.ct.sum(axis=-2, dtype=float)
+
+    def BrierScore(self, components=False):
+        """
+        BrierScore(components=False) [public]
+        Purpose:  Compute the Brier Score and its components for every 2 x n probability table.
+        Returns:  Array of Brier Scores, or a tuple of (BrierScore,reliability,resolution,uncertainty) arrays if components==True.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = brierScores(self.ct, self.labels)
+        if components:
+            return scores
+        return scores[0]
+
+    def BrierSkillScore(self):
+        """
+        BrierSkillScore() [public]
+        Purpose:  Calculate the Brier Skill Score of every 2 x n probability table.
+        Returns:  Array of Brier Skill Scores.
+        """
+        BS, reliability, resolution, uncertainty = self.BrierScore(components=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (resolution - reliability) / uncertainty
+
+    def HeidkeSkillScore(self):
+        """
+        HeidkeSkillScore() [public]
+        Purpose:  Calculate the multiclass Heidke Skill Score of every n x n table.
+        Returns:  Array of Heidke Skill Scores.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return heidkeSkillScores(self.ct)
+
+    def PeirceSkillScore(self):
+        """
+        PeirceSkillScore() [public]
+        Purpose:  Calculate the multiclass Peirce Skill Score of every n x n table.
+        Returns:  Array of Peirce Skill Scores.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return peirceSkillScores(self.ct)
+
+    def __str__(self):
+        string = ""
+        for index in np.ndindex(*self.ct.shape[:-2]):
+            string += " ".join([str(self.keys[i][j]) for i, j in enumerate(index)]) + "\n"
+            for row in self.ct[index]:
+                string += "".join(["%8.2f " % value for value in row]) + "\n"
+        return string + "\n"
+
 """
 ContinuousContingencyTable
-Purpose:  Stores forecast and observed values for continuous variables.
+Purpose:  Stores forecast and observed values for continuous variables.  Scores come from running sums of the errors,
+          so adding pairs costs O(number of new pairs) and the scores are O(1).
 """
 class ContinuousContingencyTable(ContingencyTable):
 
-    def __init__(self,forecasts,observations,valid_range=(-50.0,120.0)):
+    def __init__(self,forecasts,observations,valid_range=(-50.0,120.0),keepPairs=True):
         """
         __init__()
         Purpose:  Constructor for ContinuousContingencyTable class
         Parameters:
             forecasts [type=np.array]:  Array of forecast values
             observations [type=np.array]:  Array of observed values.  Must be same size as forecasts.
+            valid_range [type=tuple]:  Pairs are only scored when the observation is within this range.
+            keepPairs [type=bool]:  If True, keep every pair in the forecasts, observations and errors arrays.
+                                    If False, only the running sums are kept.
         """
-        self.forecasts = forecasts
-        self.observations = observations
         self.valid_range = valid_range
-        if self.forecasts.shape != self.observations.shape:
+        self.keepPairs = keepPairs
+        self.n = 0
+        self.sumError = 0.0
+        self.sumAbsError = 0.0
+        self.sumSquaredError = 0.0
+        self._chunks = []
+        if forecasts.shape != observations.shape:
             print "Error!"
-        goodIdxs = np.nonzero((self.observations>=self.valid_range[0]) & (self.observations <= self.valid_range[1]))
-        self.errors = self.forecasts[goodIdxs] - self.observations[goodIdxs]
-    
+        else:
+            self.addPairs(forecasts,observations)
+
     def addPairs(self,forecasts,observations):
         """
         addPairs() [public]
@@ -234,22 +500,107 @@ class ContinuousContingencyTable(ContingencyTable):
         Returns:  None
         """
         if forecasts.shape == observations.shape:
-            self.forecasts = np.append(self.forecasts,forecasts)
-            self.observations = np.append(self.observations,observations)
-            goodIdxs = np.nonzero((self.observations>=self.valid_range[0]) & (self.observations <= self.valid_range[1]))
-            self.errors = self.forecasts[goodIdxs] - self.observations[goodIdxs]
+            goodIdxs = np.nonzero((observations >= self.valid_range[0]) & (observations <= self.valid_range[1]))
+            errors = forecasts[goodIdxs] - observations[goodIdxs]
+            self.n += len(errors)
+            self.sumError += errors.sum()
+            self.sumAbsError += np.abs(errors).sum()
+            self.sumSquaredError += np.power(errors,2).sum()
+            if self.keepPairs:
+                self._chunks.append((forecasts,observations,errors))
         else:
             print "Error!  Forecasts and observations do not match."
-    
+
+    def _pairs(self,item):
+        """Join the stored chunks of pairs into single arrays and return the forecasts (0), observations (1) or errors (2)."""
+        if len(self._chunks) != 1:
+            empty = np.zeros((0,))
+            self._chunks = [tuple([np.concatenate([chunk[i] for chunk in self._chunks] + [empty]) for i in xrange(3)])]
+        return self._chunks[0][item]
+
+    forecasts = property(lambda self: self._pairs(0),doc="All forecasts, if the table keeps its pairs")
+    observations = property(lambda self: self._pairs(1),doc="All observations, if the table keeps its pairs")
+    errors = property(lambda self: self._pairs(2),doc="Errors of the pairs with valid observations, if the table keeps its pairs")
+
+    def __add__(self, other):
+        """
+        __add__() [public]
+        Purpose:  Combine the pairs of two tables into a new table (called as table1 + table2)
+        Returns:  The combined table.  It keeps its pairs only if both tables do.
+        """
+        result = ContinuousContingencyTable(np.zeros((0,)),np.zeros((0,)),self.valid_range,self.keepPairs)
+        result += self
+        result += other
+        return result
+
+    def __iadd__(self, other):
+        """
+        __iadd__() [public]
+        Purpose:  Add the pairs of another table to this one (called as table1 += table2)
+        Returns:  This table.  It stops keeping its pairs if the other table does not keep them.
+        """
+        if type(self) != type(other):
+            print "Error!"
+
+        self.n += other.n
+        self.sumError += other.sumError
+        self.sumAbsError += other.sumAbsError
+        self.sumSquaredError += other.sumSquaredError
+        if self.keepPairs and other.keepPairs:
+            self._chunks.extend(other._chunks)
+        else:
+            self.keepPairs = False
+            self._chunks = []
+        return self
+
+    def bootstrap(self, samples=1000, blocks=None, randomState=None, weights=None):
+        """
+        bootstrap() [public]
+        Purpose:  Score resamples of the pairs all at once.  The errors are summed per block, and every resample is a
+            weighted sum of the blocks, so no resample is built in Python.  Only tables that keep their pairs can be
+            resampled.
+        Parameters:
+            samples [type=int]:  Number of resamples.
+            blocks [type=np.array]:  Block number (0 to number of blocks - 1) of each pair in self.forecasts, such as an
+                index of the forecast date, so that correlated pairs are resampled together.  By default each valid
+                pair is its own block.
+            randomState [type=np.random.RandomState]:  Source of random numbers.  Defaults to np.random.
+            weights [type=np.array]:  Counts of each block in each resample from bootstrapWeights(), used instead of new
+                resamples so that several tables are scored on the same resamples.
+        Returns:  Dictionary mapping ME, MAE and RMSE to arrays of the score of each resample.
+        """
+        if not self.keepPairs:
+            raise ValueError('bootstrap() needs a table that keeps its pairs')
+        observations = self.observations
+        valid = (observations >= self.valid_range[0]) & (observations <= self.valid_range[1])
+        if blocks is None:
+            blocks = np.arange(np.count_nonzero(valid))
+        else:
+            blocks = np.asarray(blocks)[valid]
+        if weights is None:
+            weights = bootstrapWeights(blocks.max() + 1 if len(blocks) > 0 else 0, samples, randomState)
+        errors = self.errors
+        numBlocks = weights.shape[1]
+        blockSums = np.column_stack([np.bincount(blocks, minlength=numBlocks)] +
+            [np.bincount(blocks, values, minlength=numBlocks) for values in (errors, np.abs(errors), np.power(errors, 2))])
+        n, sumError, sumAbsError, sumSquaredError = weights.dot(blockSums).T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return dict(ME=sumError / n, MAE=sumAbsError / n, RMSE=np.sqrt(sumSquaredError / n))
+
+    def __str__(self):
+        return "%d pairs: ME %s, MAE %s, RMSE %s\n" % (self.n,self.MeanError(),self.MeanAbsoluteError(),self.RootMeanSquareError())
+
     def MeanError(self):
         """
         MeanError() [public]
         Purpose:  Calculate the mean error, aka bias.
         Parameters:
             None
-        Returns:  the mean error
+        Returns:  the mean error, NaN if there are no valid pairs
         """
-        return self.errors.mean()
+        if self.n == 0:
+            return np.nan
+        return self.sumError / self.n
     
     def MeanAbsoluteError(self):
         """
@@ -257,17 +608,21 @@ class ContinuousContingencyTable(ContingencyTable):
         Purpose:  Calculate the mean absolute error.
         Parameters:
             None
-        Returns:  the mean absolute error
+        Returns:  the mean absolute error, NaN if there are no valid pairs
         """
-        return np.abs(self.errors).mean()
+        if self.n == 0:
+            return np.nan
+        return self.sumAbsError / self.n
 
     def RootMeanSquareError(self):
         """
         RootMeanSquareError() [public]
         Purpose:  Calculate the root mean square error
-        Returns:  the root mean square error
+        Returns:  the root mean square error, NaN if there are no valid pairs
         """
-        return np.sqrt(np.power(self.errors,2).mean())
+        if self.n == 0:
+            return np.nan
+        return np.sqrt(self.sumSquaredError / self.n)
 if __name__ == "__main__":
     # Create a probability contingency table
     labels = np.arange(0,1.1,0.1)
@@ -281,6 +636,8 @@ if __name__ == "__main__":
     print prob_ct.getReliability()
     print prob_ct.BrierScore(components=True)
     print prob_ct.BrierSkillScore()
+    prob_ct.accumulate(np.array([0.0, 0.3, 0.3, 1.0, -999]), np.array([0, 1, 0, 1, 1]))
+    print prob_ct
     # Create a multicategory contingency table (improper size: will fail)
     labels = np.array(['Yes','No','Maybe'],dtype='S6')
     mult_ct = MultiContingencyTable(labels,data=np.array([0]*9).reshape(3, 3))
@@ -293,3 +650,4 @@ if __name__ == "__main__":
     print cont_ct.forecasts,cont_ct.observations,cont_ct.errors
     cont_ct.addPairs(np.array([8,4]),np.array([7,3]))
     print cont_ct.errors
+    print cont_ct + ContinuousContingencyTable(np.array([70.]),np.array([72.]),keepPairs=False)
@@ -1,55 +1,253 @@
 import numpy as np
 from datetime import datetime,timedelta
+from ASOS import timeToEpoch,cloudToValue
+
+# Fixed-width layout of each MOS product: (first data column, field width, number of fields, row label giving the lead times)
+mosLayouts = dict(mex=(5,4,15,'FHR'),mav=(5,3,21,'HR'))
+# Row labels that differ between products, mapped to one element name
+elementAliases = {'N/X':'X/N','WND':'WSP'}
+# MOS cloud cover abbreviations mapped to the codes ASOS uses for skyc layers
+mosCloudToValue = {'CL':cloudToValue['CLR'],'FW':cloudToValue['FEW'],'SC':cloudToValue['SCT'],'PC':cloudToValue['SCT'],'BK':cloudToValue['BKN'],'OV':cloudToValue['OVC']}
+
+def localToUTC(times,timezone):
+    """
+    localToUTC()
+    Purpose:  Convert local date strings to UTC minutes since 1970-01-01 00:00, with daylight saving time.
+    Parameters:  times [array] - local 'YYYYMMDD_HH:MM' or 'YYYYMMDD' strings
+                timezone [string] - time zone name, such as America/Chicago
+    Returns:  array of int64 minutes in the index used by timeToEpoch and MOS.issueTimes
+    """
+    # pytz is only needed for MOS baselines with time zones, so runs without them do not require it
+    import pytz
+    zone = pytz.timezone(timezone)
+    epoch = timeToEpoch(times)
+    # The offset only changes on the hour, so look it up once for each distinct hour
+    hours,inverse = np.unique(epoch // 60,return_inverse=True)
+    offsets = np.array([zone.utcoffset(datetime(1970,1,1) + timedelta(hours=int(hour)),is_dst=False).total_seconds() // 60
+        for hour in hours],dtype=np.int64)
+    return epoch - offsets[inverse]
+
 class MOS:
-    def __init__(self,sites,startDate,endDate,mosHour,type='mex',path='mos/gfsmex/'):
+    def __init__(self,sites,startDate,endDate,mosHour,type='mex',path='mos/gfsmex/',elements=['X/N','TMP','DPT','CLD','WSP','P06','P12']):
         """
         MOS()
-        Purpose:  Initialize MOS object that will store forecasts for specified sites over a specified period
+        Purpose:  Initialize MOS object that will store forecasts for specified sites over a specified period.
+            The forecasts are kept in self.forecasts, an array of shape (site, issue time, lead hour, element) indexed by
+            self.siteIndex, self.issueTimes, self.leadHours and self.elements.  Missing values are -999.
         Parameters:  sites (iterable) - list of MOS sites
                     startDate 'YYYYMMDD' - date string for first date of MOS forecasts
                     endDate 'YYYYMMDD' - date string for last date of MOS forecasts
+                    mosHour [int or list] - issue hour of the MOS runs, or a list of issue hours read in the same pass
                     type [string] - MOS type used, such as gfsmex,gfsmav
+                    elements [list] - elements to keep.  WSP and X/N also match the MEX WND and MAV N/X rows.
         """
         self.sites = ['K' + s if len(s) == 3 else s for s in sites]
+        self.siteIndex = dict([(site,i) for i,site in enumerate(self.sites)])
         self.startDateTime = datetime.strptime(startDate,'%Y%m%d')
         self.endDateTime = datetime.strptime(endDate,'%Y%m%d')
-        self.mosHour = str(mosHour).zfill(2)
+        if not hasattr(mosHour,'__iter__'):
+            mosHour = [mosHour]
+        self.mosHours = [str(hour).zfill(2) for hour in mosHour]
+        self.mosHour = self.mosHours[0]
         self.type = type
         self.filepath = path
-        self.forecasts = []
-        currDateTime = datetime.strptime(startDate,'%Y%m%d')
-        currfile = open(path + type + currDateTime.strftime('%Y%m') + '.t' + self.mosHour + 'z','r')
-        mosData = currfile.readlines()
-        currfile.close()
-        l = 0
-        while currDateTime <= self.endDateTime:
-            if l < len(mosData):
-                if 'MOS GUIDANCE' in mosData[l]:
-                    header = mosData[l].split()
-                    if header[0] in self.sites:
-                        print header
-                        fDateTime = datetime.strptime(header[4],'%m/%d/%Y')
-                        if currDateTime < fDateTime:
-                            currDateTime = fDateTime 
-                        self.parseSingleForecast(mosData,l)
-                    l += 12 
-                else:
-                    l += 1
-            
+        self.elements = list(elements)
+        # (site, issue datetime) -> (filename, byte offset of the block header)
+        self.blockIndex = {}
+        self._blocks = []
+        for hour in self.mosHours:
+            monthDateTime = datetime(self.startDateTime.year,self.startDateTime.month,1)
+            while monthDateTime <= self.endDateTime:
+                self.readFile(path + type + monthDateTime.strftime('%Y%m') + '.t' + hour + 'z')
+                monthDateTime = datetime(monthDateTime.year + monthDateTime.month / 12,monthDateTime.month % 12 + 1,1)
+        self.buildForecasts(self._blocks)
+        del self._blocks
+
+    def readFile(self,filename):
+        """
+        readFile()
+        Purpose:  Walk a monthly MOS file once.  The byte offset of every forecast block is added to self.blockIndex,
+            and the lines of the blocks for the requested sites and dates are collected for buildForecasts.
+        Parameters:  filename [string] - name of the monthly MOS file
+        """
+        try:
+            mosFile = open(filename,'r')
+        except IOError:
+            print "MOS file %s not found" % filename
+            return
+        offset = 0
+        block = None
+        for line in mosFile:
+            lineStart = offset
+            offset += len(line)
+            if block is not None:
+                if len(line.split()) > 1:
+                    block[2][line[1:5].strip()] = line
+                    continue
+                self._blocks.append(block)
+                block = None
+            if 'MOS GUIDANCE' in line:
+                header = line.split()
+                issueDateTime = datetime.strptime(header[4] + header[5],'%m/%d/%Y%H%M')
+                self.blockIndex[(header[0],issueDateTime)] = (filename,lineStart)
+                if header[0] in self.siteIndex and self.startDateTime <= issueDateTime < self.endDateTime + timedelta(days=1):
+                    block = (header[0],issueDateTime,{})
+        if block is not None:
+            self._blocks.append(block)
+        mosFile.close()
+
+    def decodeRows(self,lines):
+        """
+        decodeRows()
+        Purpose:  Slice the fixed-width data fields out of many MOS rows at once.
+        Parameters:  lines [list] - rows with the same label, one per forecast block.  Empty strings stand for missing rows.
+        Returns:  array of stripped field strings with shape (number of rows, number of fields)
+        """
+        first,width,nfields,leadLabel = mosLayouts[self.type]
+        fields = np.array([line[first:first + width * nfields] for line in lines],dtype='S%d' % (width * nfields))
+        chars = fields.view(np.uint8).reshape(len(lines),width * nfields).copy()
+        chars[(chars == ord('|')) | (chars == 0) | (chars == ord('\n'))] = ord(' ')
+        return np.char.strip(chars.view('S%d' % width))
+
+    def buildForecasts(self,blocks):
+        """
+        buildForecasts()
+        Purpose:  Decode collected forecast blocks into the typed forecast array.  Every element row is decoded for all
+            blocks in one pass.
+        Parameters:  blocks [list] - (site, issue datetime, dictionary of row label to line) tuples
+        """
+        first,width,nfields,leadLabel = mosLayouts[self.type]
+        blocks = [block for block in blocks if leadLabel in block[2]]
+        issueDateTimes = [issueDateTime for site,issueDateTime,rows in blocks]
+        issueEpochs = timeToEpoch([issueDateTime.strftime('%Y%m%d_%H:%M') for issueDateTime in issueDateTimes]) if len(blocks) > 0 else np.zeros((0,),dtype=np.int64)
+        leadFields = self.decodeRows([rows[leadLabel] for site,issueDateTime,rows in blocks])
+        leadFields[leadFields == ''] = '-999'
+        leads = leadFields.astype(int)
+        if leadLabel == 'HR':
+            # MAV rows give the hour of day, so count the day rollovers to turn them into lead hours
+            issueHours = np.array([issueDateTime.hour for issueDateTime in issueDateTimes],dtype=int)
+            rollovers = np.concatenate((np.zeros((len(blocks),1),dtype=int),np.cumsum(np.diff(leads,axis=1) <= 0,axis=1)),axis=1)
+            leads = leads + 24 * rollovers - issueHours[:,np.newaxis]
+            leads[leads[:,0] <= 0] += 24
+        self.leadHours = np.unique(leads[leads >= 0])
+        self.issueTimes = np.unique(issueEpochs)
+        self.forecasts = np.zeros((len(self.sites),len(self.issueTimes),len(self.leadHours),len(self.elements)),dtype=float) - 999
+        siteIdxs = np.array([self.siteIndex[site] for site,issueDateTime,rows in blocks],dtype=int)[:,np.newaxis]
+        issueIdxs = self.issueTimes.searchsorted(issueEpochs)[:,np.newaxis]
+        leadIdxs = self.leadHours.searchsorted(leads)
+        validLeads = leads >= 0
+        for e,element in enumerate(self.elements):
+            labels = [element] + [label for label,alias in elementAliases.iteritems() if alias == element]
+            lines = []
+            for site,issueDateTime,rows in blocks:
+                line = ''
+                for label in labels:
+                    line = rows.get(label,line)
+                lines.append(line)
+            fields = self.decodeRows(lines)
+            if element == 'CLD':
+                values = np.zeros(fields.shape,dtype=float) - 999
+                for cloud,value in mosCloudToValue.iteritems():
+                    values[fields == cloud] = value
             else:
-                l = 0
-                currDateTime = currDateTime + timedelta(days=1)
-                currfile = open(path + type + currDateTime.strftime('%Y%m') + '.t' + self.mosHour + 'z','r')
-                mosData = currfile.readlines()
-                currfile.close()
+                numeric = np.char.isdigit(np.char.lstrip(fields,'-'))
+                values = np.where(numeric,fields,'-999').astype(float)
+            # Blank lead fields are not stored, so they can not overwrite the guidance of a real lead hour
+            self.forecasts[np.broadcast_to(siteIdxs,leads.shape)[validLeads],np.broadcast_to(issueIdxs,leads.shape)[validLeads],
+                leadIdxs[validLeads],e] = values[validLeads]
+
+    def getValidTimes(self,utcOffset=0):
+        """
+        getValidTimes()
+        Purpose:  Compute the valid time of every issue time and lead hour in the same integer minute index that ASOS uses.
+        Parameters:  utcOffset [int] - hours added to the UTC times, such as -6 for CST
+        Returns:  array of shape (issue time, lead hour) of minutes since 1970-01-01 00:00
+        """
+        return self.issueTimes[:,np.newaxis] + 60 * (self.leadHours[np.newaxis,:] + utcOffset)
+
+    def reduceWindows(self,site,element,startDates,endDates,op,issuedBefore=None,utcOffset=-6,periodHours=0,missing=-998,timezone=None):
+        """
+        reduceWindows()
+        Purpose:  Reduce the guidance of the latest run issued before each window over the valid times in that window.
+            Every window is handled at once with array operations.
+        Parameters:  site [string] - MOS site, such as KOUN
+                    element [string] - element to reduce, such as X/N, WSP or P12
+                    startDates, endDates [array] - local 'YYYYMMDD_HH:MM' strings bounding each window
+                    op [string] - 'max', 'min', 'sum' or 'count'
+                    issuedBefore [array] - local date strings; the run used for a window is the latest run of the site
+                        issued at or before it.  Defaults to startDates.
+                    utcOffset [int] - hours from UTC to the local time of the windows.  Only used without timezone.
+                    timezone [string] - time zone of the local times, such as America/Chicago.  Daylight saving time is
+                        taken into account.
+                    periodHours [int] - length of the period a value covers, ending at its valid time, such as 12 for P12.
+                        Such values are used when their period overlaps the window.  0 means the value is valid at an instant.
+                    missing - value returned for windows without guidance
+        Returns:  array with the reduced value for each window
+        """
+        if issuedBefore is None:
+            issuedBefore = startDates
+        if timezone is not None:
+            toEpoch = lambda times: localToUTC(times,timezone)
+            utcOffset = 0
+        else:
+            toEpoch = timeToEpoch
+        starts = toEpoch(startDates)[:,np.newaxis]
+        ends = toEpoch(endDates)[:,np.newaxis]
+        if len(self.issueTimes) == 0 or site not in self.siteIndex:
+            return np.zeros((len(starts),),dtype=float) + missing
+        siteForecasts = self.forecasts[self.siteIndex[site],:,:,self.elements.index(element)]
+        # Only the runs with guidance for the site, so a missing run falls back to the one before it
+        siteRuns = np.nonzero((siteForecasts > -900).any(axis=1))[0]
+        runs = (self.issueTimes[siteRuns] + 60 * utcOffset).searchsorted(toEpoch(issuedBefore),'right') - 1
+        haveRun = runs >= 0
+        runs = siteRuns[np.maximum(runs,0)] if len(siteRuns) > 0 else np.zeros(runs.shape,dtype=int)
+        values = siteForecasts[runs]
+        validTimes = self.getValidTimes(utcOffset)[runs]
+        if periodHours > 0:
+            inWindow = (validTimes > starts) & (validTimes - 60 * periodHours < ends)
+        else:
+            inWindow = (validTimes >= starts) & (validTimes <= ends)
+        inWindow &= (values > -900) & haveRun[:,np.newaxis]
+        counts = inWindow.sum(axis=1)
+        if op == 'count':
+            return counts.astype(float)
+        elif op == 'sum':
+            reduced = np.where(inWindow,values,0).sum(axis=1)
+        elif op == 'max':
+            reduced = np.where(inWindow,values,-np.inf).max(axis=1)
+        elif op == 'min':
+            reduced = np.where(inWindow,values,np.inf).min(axis=1)
+        else:
+            raise ValueError('Unknown window reduction ' + str(op))
+        return np.where(counts > 0,reduced,missing)
+
+    def readBlock(self,site,issueDateTime):
+        """
+        readBlock()
+        Purpose:  Read the lines of a single forecast block through self.blockIndex, without scanning its file.
+        Parameters:  site [string] - MOS site, such as KOUN
+                    issueDateTime [datetime] - issue date and time of the forecast
+        Returns:  list of the lines in the block, starting with the MOS GUIDANCE header
+        """
+        filename,offset = self.blockIndex[(site,issueDateTime)]
+        mosFile = open(filename,'r')
+        mosFile.seek(offset)
+        block = [mosFile.readline()]
+        for line in mosFile:
+            if len(line.split()) <= 1:
+                break
+            block.append(line)
+        mosFile.close()
+        return block
 
     def parseSingleForecast(self,mosData,l):
         """
         parseSingleForecast()
         Purpose:  read lines containing MOS forecast information and break the information down into 
             individual forecasts for each lead time in the file.
+        Returns:  dictionary with the site, model, issue date and hour and a list of values for each row label
         """
-        mosWidths = dict(mex=65)
+        first,width,nfields,leadLabel = mosLayouts[self.type]
         header = mosData[l].split()
         singleForecast = {}
         singleForecast['site'] = header[0]
@@ -57,20 +255,16 @@ class MOS:
         singleForecast['date'] = datetime.strptime(header[4],'%m/%d/%Y')
         singleForecast['hour'] = header[5]
         l += 1
-        while len(mosData[l].split()) > 1:
-            cleanLine = mosData[l][:mosWidths[self.type]].replace('|',' ')
+        while l < len(mosData) and len(mosData[l].split()) > 1:
+            cleanLine = mosData[l][:first + width * nfields].replace('|',' ')
             dataList = cleanLine.split()
             singleForecast[dataList[0]] = dataList[1:]
             l+= 1
-        for k,v in singleForecast.iteritems():
-            print k,v
-            
+        return singleForecast
         
         
 
 if __name__ == "__main__":
     sites = ['OKC','OUN','TUL','GUY','WWR','LAW','LTS','END','ADM','PRX','MLC','EYW','CLK']
-    mos = MOS(sites,'20090901','20091031',0)
-      
-                
-            
\ No newline at end of file
+    mos = MOS(sites,'20090901','20091031',[0,12])
+    print mos.forecasts.shape,mos.leadHours
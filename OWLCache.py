@@ -0,0 +1,136 @@
+import numpy as np
+import json
+import os
+from OWLShift import OWLShift
+from ASOS import openASOSStore
+
+class OWLCache:
+    # Version of the on-disk layout.  A cache written with a different version is treated as out of date.
+    version = 5
+
+    def __init__(self,path='owl_cache/',forecastDir='fcst/',asosDir='verif_data/'):
+        """
+        OWLCache()
+        Purpose:  Columnar on-disk cache of OWL shift forecasts and ASOS observations.  Every shift period and every
+            ASOS site is stored as its own .npy files and opened with memory mapping, so loading the cache only reads
+            the pages that are used.  manifest.json records the layout version, the verification dates and the name,
+            modification time and size of every source file, and the cache is out of date when any of them change.
+            It also records the modification time and size of each forecast file loaded into the shifts, so that an
+            update only loads new or changed files.
+        Parameters:
+            path:  directory holding the cache
+            forecastDir:  directory of the OWL .fcst files the cache was built from
+            asosDir:  directory of the IEM ASOS files the cache was built from
+        """
+        self.path = path
+        self.forecastDir = forecastDir
+        self.asosDir = asosDir
+        self.manifest = None
+        if os.path.exists(os.path.join(path,'manifest.json')):
+            manifestFile = open(os.path.join(path,'manifest.json'))
+            self.manifest = json.load(manifestFile)
+            manifestFile.close()
+
+    def sourceFiles(self,directory):
+        """
+        sourceFiles() [public]
+        Purpose:  Describe the files in a source directory
+        Parameters:
+            directory:  directory to list
+        Returns:  dictionary mapping file names to [modification time, size]
+        """
+        files = {}
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                info = os.stat(os.path.join(directory,name))
+                files[name] = [info.st_mtime,info.st_size]
+        return files
+
+    def exists(self):
+        """
+        exists() [public]
+        Returns:  True if the cache holds data written with the current layout version
+        """
+        return self.manifest is not None and self.manifest['version'] == self.version
+
+    def ingestedForecasts(self):
+        """
+        ingestedForecasts() [public]
+        Returns:  dictionary mapping the names of the forecast files held in the cache to [modification time, size]
+        """
+        if not self.exists():
+            return {}
+        return dict([(str(name),stamp) for name,stamp in self.manifest['forecastFiles'].iteritems()])
+
+    def isValid(self,startDate,endDate):
+        """
+        isValid() [public]
+        Purpose:  Check that the cache covers the requested dates and that no source file has changed since it was written
+        Parameters:
+            startDate,endDate:  YYYYMMDD strings of the verification period
+        Returns:  True if the cache can be used as is
+        """
+        return (self.exists() and
+            self.manifest['start'] == startDate and self.manifest['end'] == endDate and
+            self.manifest['sources']['fcst'] == self.sourceFiles(self.forecastDir) and
+            self.manifest['sources']['asos'] == self.sourceFiles(self.asosDir))
+
+    def save(self,shifts,asos_sites,startDate,endDate,forecastFiles=None):
+        """
+        save() [public]
+        Purpose:  Write forecasts and observations to the cache
+        Parameters:
+            shifts:  dictionary of OWLShift objects
+            asos_sites:  dictionary of ASOS objects
+            startDate,endDate:  YYYYMMDD strings of the verification period
+            forecastFiles:  dictionary mapping the names of the forecast files loaded into shifts to [modification time, size]
+        """
+        if forecastFiles is None:
+            forecastFiles = {}
+        for directory in [self.path,os.path.join(self.path,'shifts'),os.path.join(self.path,'asos')]:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        manifest = dict(version=self.version,start=startDate,end=endDate,shifts={},asos={},forecastFiles=forecastFiles,
+            sources=dict(fcst=self.sourceFiles(self.forecastDir),asos=self.sourceFiles(self.asosDir)))
+        for name,shift in shifts.iteritems():
+            manifest['shifts'][name] = [shift.day,shift.period]
+            for period in OWLShift._forecast_days:
+                forecasts = getattr(shift,'day' + period)
+                if len(forecasts) == 0:
+                    forecasts = np.zeros((0,),dtype=shift.perDtype)
+                self._write(os.path.join('shifts','%s_%s.npy' % (name,period)),forecasts)
+        for site,asos in asos_sites.iteritems():
+            manifest['asos'][site] = 'asos/%s/' % site
+            asos.writeStore(os.path.join(self.path,manifest['asos'][site]))
+        self._write('manifest.json',manifest)
+        self.manifest = manifest
+
+    def load(self):
+        """
+        load() [public]
+        Purpose:  Open the cached forecasts and observations with memory mapping
+        Returns:  tuple of (dictionary of OWLShift objects, dictionary of ASOS objects)
+        """
+        shifts = {}
+        for name,(day,time) in self.manifest['shifts'].iteritems():
+            shift = OWLShift(str(day),str(time))
+            for period in OWLShift._forecast_days:
+                shift.setForecasts('day' + period,np.load(os.path.join(self.path,'shifts','%s_%s.npy' % (name,period)),mmap_mode='r'))
+            shifts[str(name)] = shift
+        asos_sites = {}
+        for site,store in self.manifest['asos'].iteritems():
+            asos_sites[str(site)] = openASOSStore(os.path.join(self.path,store))
+        return shifts,asos_sites
+
+    def _write(self,name,contents):
+        """Write a cache file next to its final name and rename it into place, so arrays that are still
+           memory mapped from the previous version of the file stay valid."""
+        filename = os.path.join(self.path,name)
+        tmpName = filename + '.tmp'
+        outfile = open(tmpName,'wb')
+        if name.endswith('.json'):
+            json.dump(contents,outfile)
+        else:
+            np.save(outfile,np.asarray(contents))
+        outfile.close()
+        os.rename(tmpName,filename)
@@ -1,3 +1,17 @@
+import numpy as np
+import os
+import struct
+
+def toFloat(value):
+    """
+    toFloat()
+    Purpose:  Convert a score read from a csv file to a float, or NaN if it is not a number
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
 class OWLOutput:
     def __init__(self,header=['ME','MAE','RMSE','BS','BSS','PSS','HSS']):
         """
@@ -10,6 +24,8 @@ class OWLOutput:
         self.header = [x for x in self.metaheader]
         self.header.extend(header)
         self.data = []
+        self.stream = None
+        self.buffer = []
 
     def addEntry(self,*args):
         """
@@ -19,47 +35,305 @@ class OWLOutput:
 
         """
         if len(args) == len(self.header):
-            self.data.append(args)
+            if self.stream is None:
+                self.data.append(args)
+            else:
+                self.buffer.append(self.delimiter.join([str(x) for x in args]))
+                if len(self.buffer) >= self.bufferRows:
+                    self.flush()
         else:
             print "Error:  entry not correct length"
-    
-    def toCSV(self,filename,delimiter=',',newline='\n'):
+
+    def open(self,filename,append=False,bufferRows=10000,delimiter=',',newline='\n'):
+        """
+        open() [public]
+        Purpose:  Stream entries to a csv file.  The header line is written now, and entries added afterwards are
+            written in chunks of bufferRows lines instead of being kept in self.data.  Call close() when done.
+        Parameters:
+        filename:  name of csv file being written
+        append:  if True, add a block with its own header line to the end of the file instead of replacing it
+        bufferRows:  number of entries held before they are written
+        delimiter:  character that separates entries in row
+        newline:  character that separates lines
+        """
+        self.close()
+        self.stream = open(filename,'a' if append else 'w')
+        self.bufferRows = bufferRows
+        self.delimiter = delimiter
+        self.newline = newline
+        self.stream.write(delimiter.join(self.header) + newline)
+
+    def flush(self):
+        """
+        flush() [public]
+        Purpose:  Write the buffered entries of a stream opened with open()
+        """
+        if self.stream is not None and len(self.buffer) > 0:
+            self.stream.write(self.newline.join(self.buffer) + self.newline)
+            self.buffer = []
+
+    def close(self):
+        """
+        close() [public]
+        Purpose:  Write any buffered entries and close the stream opened with open().  Does nothing if no stream is open.
+        """
+        if self.stream is not None:
+            self.flush()
+            self.stream.close()
+            self.stream = None
+
+    def toCSV(self,filename,delimiter=',',newline='\n',append=False):
         """
         toCSV() [public]
         Parameters:
         filename:  name of csv file being written
         delimiter:  character that separates entries in row
         newline:  character that separates lines
+        append:  if True, add the entries as a block with its own header line to the end of the file
         """
-        outfile = open(filename,'w')
-        outfile.write(delimiter.join(self.header) + newline)
-        for entry in self.data:
-            outfile.write(delimiter.join([str(x) for x in entry]) + newline)
+        lines = [delimiter.join(self.header)]
+        lines.extend([delimiter.join([str(x) for x in entry]) for entry in self.data])
+        outfile = open(filename,'a' if append else 'w')
+        outfile.write(newline.join(lines) + newline)
         outfile.close()
 
     def fromCSV(self,filename,delimiter=',',newline='\n',overwrite=False):
         """
         fromCSV() [public]
+        Purpose:  Add the entries of every block of a csv file whose header line matches this object's header
+        Parameters:
+        filename:  name of csv file being read
+        delimiter:  character that separates entries in row
+        newline:  character that separates lines
+        overwrite:  if True, replace the entries already in self.data
+        """
+        blocks = self.readBlocks(filename,delimiter,newline)
+        if len(blocks) == 0:
+            return
+        if overwrite:
+            self.data = []
+        for fields in blocks:
+            self.data.extend([tuple(row) for row in fields])
+
+    def readBlocks(self,filename,delimiter=',',newline='\n'):
+        """
+        readBlocks() [public]
+        Purpose:  Split the blocks of a csv file whose header line matches this object's header into fields.  A file
+            written with open(append=True) holds one block per header line.  Lines with the wrong number of fields
+            are skipped.
         Parameters:
         filename:  name of csv file being read
         delimiter:  character that separates entries in row
         newline:  character that separates lines
+        Returns:  list of string arrays of shape (rows, len(header)), one for each matching block
         """
         infile = open(filename)
-        fullfile = infile.read()
+        lines = infile.read().split(newline)
         infile.close()
-        filelists = fullfile.split(newline)
-        
-        if self.header == filelists[0].split(delimiter):
-            if overwrite:
-                self.data = []
-            for entry in filelists[1:]:
-                if len(entry) > 1:
-                    self.addEntry(*entry.split(delimiter))
+        headerLine = delimiter.join(self.header)
+        starts = [i for i,line in enumerate(lines) if line.startswith(self.metaheader[0] + delimiter)]
+        blocks = []
+        for start,end in zip(starts,starts[1:] + [len(lines)]):
+            if lines[start] != headerLine:
+                continue
+            rows = [line for line in lines[start + 1:end] if len(line) > 1]
+            fields = delimiter.join(rows).split(delimiter)
+            if len(fields) != len(rows) * len(self.header):
+                rows = [line for line in rows if line.count(delimiter) == len(self.header) - 1]
+                fields = delimiter.join(rows).split(delimiter)
+            blocks.append(np.array(fields,dtype=str).reshape((len(rows),len(self.header))))
+        if len(blocks) == 0:
+            print "No block with header %s in %s" % (headerLine,filename)
+        return blocks
+
+    def loadColumns(self,filenames,delimiter=',',newline='\n'):
+        """
+        loadColumns() [public]
+        Purpose:  Load the matching blocks of one or more csv files into typed columns, for example to merge many
+            historical output files.  The columns are kept in self.columns.  Variable, ForecastDay, Station,
+            ShiftPeriod and ShiftDay are categorical: an array of integer codes into the values in
+            self.categories[name].  StartDate and EndDate are strings, and the scores are floats, NaN if not a number.
+            The index used by query() is rebuilt.
+        Parameters:
+        filenames:  name of a csv file or a list of names
+        delimiter:  character that separates entries in row
+        newline:  character that separates lines
+        Returns:  number of rows loaded
+        """
+        if isinstance(filenames,str):
+            filenames = [filenames]
+        blocks = []
+        for filename in filenames:
+            blocks.extend(self.readBlocks(filename,delimiter,newline))
+        fields = np.concatenate(blocks + [np.zeros((0,len(self.header)),dtype='S1')])
+        self.columns = {}
+        self.categories = {}
+        for j,name in enumerate(self.header):
+            column = fields[:,j]
+            if name in ['StartDate','EndDate']:
+                self.columns[name] = column
+            elif name in self.metaheader:
+                self.categories[name],self.columns[name] = np.unique(column,return_inverse=True)
+            else:
+                try:
+                    self.columns[name] = column.astype(float)
+                except ValueError:
+                    self.columns[name] = np.array([toFloat(value) for value in column],dtype=float)
+        self.buildIndex()
+        return len(fields)
+
+    def buildIndex(self):
+        """
+        buildIndex() [public]
+        Purpose:  Index the rows of self.columns by (Variable, Station, ForecastDay).  The rows of each key are sorted
+            by StartDate, so query() finds a key in constant time and a date range with a binary search.
+        """
+        keys = [self.columns[name] for name in ['Variable','Station','ForecastDay']]
+        order = np.lexsort([self.columns['StartDate']] + keys[::-1])
+        sortedKeys = [key[order] for key in keys]
+        breaks = np.zeros((len(order),),dtype=bool)
+        breaks[:1] = True
+        for key in sortedKeys:
+            breaks[1:] |= key[1:] != key[:-1]
+        starts = np.nonzero(breaks)[0]
+        ends = np.append(starts[1:],len(order))
+        self.index = {}
+        for start,end in zip(starts,ends):
+            rows = order[start:end]
+            key = tuple([self.categories[name][sortedKeys[k][start]] for k,name in enumerate(['Variable','Station','ForecastDay'])])
+            self.index[key] = (rows,self.columns['StartDate'][rows])
+
+    def query(self,variable=None,station=None,forecastDay=None,startDate=None,endDate=None):
+        """
+        query() [public]
+        Purpose:  Look up rows loaded by loadColumns().  Arguments left as None match every value.
+        Parameters:
+        variable, station, forecastDay:  values of the Variable, Station and ForecastDay columns
+        startDate, endDate:  strings in the format of the StartDate/EndDate columns.  Rows are kept when their StartDate
+            is at or after startDate and their EndDate at or before endDate.
+        Returns:  dictionary mapping each column name to an array of the values of the matching rows.  Categorical
+            columns are decoded to their values.
+        """
+        if None not in (variable,station,forecastDay):
+            keys = [(variable,station,forecastDay)]
         else:
-            print filelists[0]
+            keys = [key for key in sorted(self.index.keys()) if (variable is None or key[0] == variable) and
+                (station is None or key[1] == station) and (forecastDay is None or key[2] == forecastDay)]
+        found = []
+        for key in keys:
+            if key not in self.index:
+                continue
+            rows,startDates = self.index[key]
+            first = 0 if startDate is None else startDates.searchsorted(startDate,'left')
+            rows = rows[first:]
+            if endDate is not None:
+                rows = rows[:startDates[first:].searchsorted(endDate,'right')]
+                rows = rows[self.columns['EndDate'][rows] <= endDate]
+            found.append(rows)
+        rows = np.concatenate(found + [np.zeros((0,),dtype=int)])
+        result = {}
+        for name,column in self.columns.iteritems():
+            if name in self.categories:
+                result[name] = self.categories[name][column[rows]]
+            else:
+                result[name] = column[rows]
+        return result
+
+class BinaryOutput:
+    # The .npy header is padded to a multiple of this many bytes, with room for a row count of up to 20 digits
+    headerAlignment = 64
+
+    def __init__(self,filename,dtype,bufferRows=100000,append=False):
+        """
+        BinaryOutput()
+        Purpose:  Stream typed records, such as matched forecast and observation pairs, to a .npy file without holding
+            them all in memory.  Records are written in chunks of bufferRows, and the row count in the .npy header is
+            filled in by close().  The file can be read with np.load, including with mmap_mode='r'.
+        Parameters:
+        filename:  name of .npy file being written
+        dtype:  numpy dtype of the records
+        bufferRows:  number of records held before they are written
+        append:  if True, add the records to the end of a file written by BinaryOutput.  The records already in the file
+            are not read or copied.
+        """
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.bufferRows = bufferRows
+        self.buffer = []
+        self.buffered = 0
+        self.rows = 0
+        if append and os.path.exists(filename):
+            self.outfile = open(filename,'r+b')
+            self.rows = self.readRows()
+            self.outfile.seek(0,os.SEEK_END)
+        else:
+            self.outfile = open(filename,'wb')
+            self.outfile.write(self.npyHeader(0))
+
+    def readRows(self):
+        """
+        readRows() [public]
+        Purpose:  Check that the open file was written by BinaryOutput with the same dtype and read its row count
+        Returns:  the number of records in the file
+        """
+        self.outfile.seek(0)
+        if np.lib.format.read_magic(self.outfile) != (1,0):
+            raise ValueError('%s is not a version 1.0 .npy file' % self.filename)
+        shape,fortranOrder,dtype = np.lib.format.read_array_header_1_0(self.outfile)
+        if self.outfile.tell() != len(self.npyHeader(0)) or dtype != self.dtype or len(shape) != 1:
+            raise ValueError('%s was not written by BinaryOutput with dtype %s and can not be appended to' % (self.filename,self.dtype))
+        return shape[0]
+
+    def npyHeader(self,rows):
+        """
+        npyHeader() [public]
+        Purpose:  Make a version 1.0 .npy header for a number of records.  The header has the same length for every row
+            count, so it can be rewritten in place.
+        Returns:  the header as a string
+        """
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(self.dtype),rows)
+        fixed = "{'descr': %r, 'fortran_order': False, 'shape': (%s,), }" % (np.lib.format.dtype_to_descr(self.dtype),'9' * 20)
+        length = 10 + len(fixed) + 1
+        length += -length % self.headerAlignment
+        header = header.ljust(length - 11) + '\n'
+        return '\x93NUMPY\x01\x00' + struct.pack('<H',len(header)) + header
+
+    def write(self,records):
+        """
+        write() [public]
+        Purpose:  Add records to the file
+        Parameters:
+        records:  structured array with the fields of dtype
+        """
+        records = np.asarray(records)
+        if records.dtype != self.dtype:
+            records = records.astype(self.dtype)
+        self.buffer.append(records)
+        self.buffered += len(records)
+        if self.buffered >= self.bufferRows:
+            self.flush()
 
-            
+    def flush(self):
+        """
+        flush() [public]
+        Purpose:  Write the buffered records
+        """
+        if self.buffered > 0:
+            for records in self.buffer:
+                records.tofile(self.outfile)
+            self.rows += self.buffered
+            self.buffer = []
+            self.buffered = 0
+
+    def close(self):
+        """
+        close() [public]
+        Purpose:  Write the buffered records and the final row count, and close the file
+        """
+        self.flush()
+        self.outfile.seek(0)
+        self.outfile.write(self.npyHeader(self.rows))
+        self.outfile.close()
 
 if __name__=="__main__":
     o = OWLOutput(header=['ME','MAE'])
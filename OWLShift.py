@@ -1,5 +1,4 @@
 import numpy as np
-import sys,traceback
 class OWLShift:
     
     # Static public list of all the possible forecast periods for an OWL shift
@@ -17,27 +16,139 @@ class OWLShift:
         self.day3 = []
         self.day4 = []
         self.perDtype = [('SDATE','S15'),('EDATE','S15'),('SITE','S4'),('TMPH',float),('TIMH','S3'),('TMPL',float),('TIML','S3'),('WDRI','S2'),('WDRF','S2'),('WSHI',float),('WSLO',float),('WGST',float),('SKYC','S3'),('PPRB',float),('PTYP','S2'),('PINT','S3')]
+        self.badForecasts = []
+        self._buffers = {}
+        self._index = {}
 
-    
-    def addForecast(self,fcst,period):
+    def __getstate__(self):
+        """Leave the spare capacity of the forecast buffers and the site index out of pickles.  The dayN arrays hold every forecast."""
+        state = self.__dict__.copy()
+        state.pop('_buffers',None)
+        state.pop('_index',None)
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('badForecasts',[])
+        self._buffers = {}
+        self._index = {}
+
+    def _reserve(self,period,count):
+        """Purpose:  Make room for count more forecasts in a period and return the period's buffer.
+            The buffer doubles in size when it fills, so adding n forecasts costs O(n) overall.
+            getattr(self,period) is always a view of the filled part of the buffer."""
+        current = getattr(self,period)
+        filled = len(current)
+        buf = self._buffers.get(period)
+        if buf is None or filled > 0 and not np.may_share_memory(buf,current):
+            buf = np.empty((max(64,2 * filled),),dtype=self.perDtype)
+            if filled > 0:
+                buf[:filled] = current
+        if filled + count > len(buf):
+            grown = np.empty((max(2 * len(buf),filled + count),),dtype=self.perDtype)
+            grown[:filled] = buf[:filled]
+            buf = grown
+        self._buffers[period] = buf
+        return buf
+
+    def addForecast(self,fcst,period,source=None):
         """Purpose:  Add a forecast to a specified period.
             Parameters:
                 fcst - list of forecast parameters taken from a forecast file
-                period - day1A,day1B,day2,day3,day4 - name of day forecast goes in""" 
+                period - day1A,day1B,day2,day3,day4 - name of day forecast goes in
+                source - optional description of where the forecast came from, such as file and line number
+            Returns:
+                True if the forecast was added.  Malformed forecasts are recorded in self.badForecasts as
+                (shift day, shift time, period, source, fields, error message) and False is returned.""" 
         for i in xrange(len(fcst)):
             if fcst[i] == '':
                 fcst[i] = '-999'
+        filled = len(getattr(self,period))
+        buf = self._reserve(period,1)
         try:
-            inForecast = np.array(tuple(fcst),dtype=self.perDtype)
-            if getattr(self,period) == []:
-                setattr(self,period,inForecast)
-            else:
-                setattr(self,period,np.hstack((getattr(self,period),inForecast)))
-        except:
-            print self.day,self.period,period
-            print fcst
-            print getattr(self,period)
-            print traceback.print_exc()
+            buf[filled] = tuple(fcst)
+        except ValueError, e:
+            self.recordBadForecast(period,source,list(fcst),str(e))
+            return False
+        setattr(self,period,buf[:filled + 1])
+        self._index.pop(period,None)
+        return True
+
+    def addForecasts(self,period,forecasts):
+        """Purpose:  Add an array of forecasts to a specified period at once.
+            Parameters:
+                forecasts - structured array of perDtype records
+                period - day1A,day1B,day2,day3,day4 - name of day forecasts go in"""
+        if len(forecasts) == 0:
+            return
+        filled = len(getattr(self,period))
+        buf = self._reserve(period,len(forecasts))
+        buf[filled:filled + len(forecasts)] = forecasts
+        setattr(self,period,buf[:filled + len(forecasts)])
+        self._index.pop(period,None)
+
+    def recordBadForecast(self,period,source,fields,message):
+        """Purpose:  Record a forecast that could not be read in self.badForecasts and report it on one line.
+            Parameters:
+                period - day1A,day1B,day2,day3,day4, or None if the forecast is not in a known period
+                source - description of where the forecast came from, such as file and line number
+                fields - list of the forecast's fields
+                message - why the forecast could not be read"""
+        self.badForecasts.append((self.day,self.period,period,source,fields,message))
+        print "Skipped malformed %s %s %s forecast from %s: %s" % (self.day,self.period,period,source,message)
+
+    def setForecasts(self,period,forecasts):
+        """Purpose:  Replace all forecasts of a period with an array of perDtype records.
+            Parameters:
+                period - day1A,day1B,day2,day3,day4
+                forecasts - structured array of forecasts"""
+        setattr(self,period,forecasts)
+        self._buffers.pop(period,None)
+        self._index.pop(period,None)
+
+    def removeForecasts(self,period,startDate):
+        """Purpose:  Remove the forecasts of a period whose verifying window starts at a given time, such as every
+                forecast of that period from one forecast file.
+            Parameters:
+                period - day1A,day1B,day2,day3,day4
+                startDate - 'YYYYMMDD_HH:MM' start of the verifying window
+            Returns:
+                The number of forecasts removed."""
+        forecasts = getattr(self,period)
+        if len(forecasts) == 0:
+            return 0
+        keep = forecasts['SDATE'] != startDate
+        removed = len(keep) - np.count_nonzero(keep)
+        if removed > 0:
+            self.setForecasts(period,forecasts[keep])
+        return removed
+
+    def getSiteIndex(self,period):
+        """getSiteIndex
+            Purpose:  Group the forecasts of a period by site, sorted by start date.  The index is built on first
+                use and rebuilt after forecasts are added or replaced.
+            Parameters:
+                period - day1A,day1B,day2,day3,day4
+            Returns:
+                Dictionary mapping each site to a (forecasts,validMasks) tuple.  validMasks maps each float variable
+                to a boolean array marking forecasts where that variable and at least one of TMPH/TMPL are present.
+        """
+        if period not in self._index:
+            forecasts = getattr(self,period)
+            index = {}
+            if len(forecasts) > 0:
+                order = np.lexsort((forecasts['SDATE'],forecasts['SITE']))
+                forecasts = forecasts[order]
+                anyTemp = (forecasts['TMPH'] > -900) | (forecasts['TMPL'] > -900)
+                validMasks = {}
+                for name,dtype in self.perDtype:
+                    if dtype == float:
+                        validMasks[name] = (forecasts[name] > -900) & anyTemp
+                breaks = np.nonzero(forecasts['SITE'][1:] != forecasts['SITE'][:-1])[0] + 1
+                for start,end in zip(np.append(0,breaks),np.append(breaks,len(forecasts))):
+                    index[forecasts['SITE'][start]] = (forecasts[start:end],dict([(name,mask[start:end]) for name,mask in validMasks.iteritems()]))
+            self._index[period] = index
+        return self._index[period]
     
     def getForecasts(self,forecastDay,startDate,endDate,variable,site,filter=True):
         """getForecasts
@@ -52,21 +163,42 @@ class OWLShift:
                 A tuple of arrays with the first array containing the start verifying dates/times, the second array containing the end verifying dates/times, and the third array containing the variable values.
         """
 
-        forecasts = getattr(self, 'day' + forecastDay)        
-
-        if filter == False:
-            siteIdxs = np.nonzero((forecasts['SDATE'] >= startDate) & (forecasts['EDATE'] <= endDate) & (forecasts['SITE']==site))
-        else:
-            siteIdxs = np.nonzero((forecasts['SDATE'] >= startDate) & (forecasts['EDATE'] <= endDate) &
-                (forecasts['SITE']   == site) &
-                (forecasts[variable] >  -900) &
-                ((forecasts['TMPH'] > -900) | (forecasts['TMPL'] > -900)))
+        forecasts,validMasks,siteIdxs = self._siteWindow(forecastDay,startDate,endDate,site)
+        if filter:
+            if variable in validMasks:
+                siteIdxs = siteIdxs[validMasks[variable][siteIdxs]]
+            else:
+                siteIdxs = siteIdxs[(forecasts[variable][siteIdxs] >  -900) &
+                    ((forecasts['TMPH'][siteIdxs] > -900) | (forecasts['TMPL'][siteIdxs] > -900))]
 
         return (forecasts['SDATE'][siteIdxs], forecasts['EDATE'][siteIdxs], forecasts[variable][siteIdxs])
 
+    def getSiteForecasts(self,forecastDay,startDate,endDate,site):
+        """getSiteForecasts
+            Purpose:  retrieve every forecast for a site whose verifying window lies between two dates
+            Parameters:
+                forecastDay - 1A,1B,2,3,4
+                startDate,endDate - 'YYYYMMDD' or 'YYYYMMDD_HH:MM' strings that bound the verifying windows
+                site - site of the forecasts
+            Returns:
+                A tuple of the forecast records sorted by start date and a dictionary of their validity masks, as in getSiteIndex.
+        """
+        forecasts,validMasks,siteIdxs = self._siteWindow(forecastDay,startDate,endDate,site)
+        return forecasts[siteIdxs],dict([(name,mask[siteIdxs]) for name,mask in validMasks.iteritems()])
+
+    def _siteWindow(self,forecastDay,startDate,endDate,site):
+        """Purpose:  Look up the indexed forecasts of a site and the indices of the ones inside a date window."""
+        siteForecasts = self.getSiteIndex('day' + forecastDay).get(site)
+        if siteForecasts is None:
+            return np.zeros((0,),dtype=self.perDtype),{},np.zeros((0,),dtype=int)
+        forecasts,validMasks = siteForecasts
+        start = forecasts['SDATE'].searchsorted(startDate,'left')
+        end = forecasts['SDATE'].searchsorted(endDate,'right')
+        return forecasts,validMasks,np.nonzero(forecasts['EDATE'][start:end] <= endDate)[0] + start
+
 if __name__ == "__main__":
-    import cPickle as pickle
-    forecasts = pickle.load(open('owl_shift_forecasts.pkl'))
+    from OWLCache import OWLCache
+    forecasts,observations = OWLCache('owl_cache/').load()
     all_temps = forecasts['Thu_Aft'].getForecasts('2','20090910','20110510','TMPH','KOUN',filter=False)
     temps = forecasts['Thu_Aft'].getForecasts('2','20100910','20110410','TMPH','KOUN',filter=True)
     print all_temps
@@ -0,0 +1,250 @@
+import numpy as np
+import json
+import os
+from OWLShift import OWLShift
+from ASOS import cloudCategories
+from ContingencyTable import ProbContingencyTable,StackedContingencyTable
+
+# Running sums kept for each continuous variable, in the order of the last axis of its statistics
+continuousSums = ['N','sumError','sumAbsError','sumSquaredError']
+
+# Variables verified with contingency tables: (table labels, table size)
+tableVariables = {'PPRB':(np.arange(0,1.1,.1),(2,11)), 'SKYC':(cloudCategories,(len(cloudCategories),len(cloudCategories)))}
+
+# Groupings of the keys along an axis of the cube: (axis, function giving the group of a key)
+keyGroups = {'shiftDay':('shift',lambda key: key[:3]), 'shiftPeriod':('shift',lambda key: key[-3:]),
+             'year':('month',lambda key: key[:4]), 'monthOfYear':('month',lambda key: key[4:])}
+
+class VerificationCube:
+    # Version of the on-disk layout.  A cube written with a different version can not be opened.
+    version = 1
+
+    # Matched table column that makes up each axis of the cube
+    axes = ('station','period','shift','month')
+
+    def __init__(self,stations,shifts,months,variables,startDate='',endDate='',validRange=(-50.0,120.0)):
+        """
+        VerificationCube()
+        Purpose:  Sufficient statistics of the verification for every station, forecast period, shift and year-month of
+            the forecast windows.  Continuous variables keep the count and the sums of the error, absolute error and
+            squared error, and PPRB and SKYC keep their contingency table counts.  Scores for any selection of shifts,
+            stations, periods or months, such as all morning shifts, Thursday afternoons or winter only, are sums over
+            the cube, so they do not need the forecasts or observations.
+        Parameters:
+            stations:  list of verifying stations
+            shifts:  list of shift names, such as 'Thu_Aft'
+            months:  list of 'YYYYMM' months
+            variables:  list of forecast variables
+            startDate,endDate:  YYYYMMDD strings of the verification period
+            validRange:  continuous pairs are only counted when the observation is within this range, as in
+                ContinuousContingencyTable
+        """
+        self.keys = [sorted(stations),list(OWLShift._forecast_days),sorted(shifts),sorted(months)]
+        self.variables = list(variables)
+        self.startDate = startDate
+        self.endDate = endDate
+        self.validRange = tuple(validRange)
+        shape = tuple([len(keys) for keys in self.keys])
+        self.stats = {}
+        for variable in self.variables:
+            if variable in tableVariables:
+                self.stats[variable] = np.zeros(shape + tableVariables[variable][1])
+            else:
+                self.stats[variable] = np.zeros(shape + (len(continuousSums),))
+
+    def add(self,matched):
+        """
+        add() [public]
+        Purpose:  Add the pairs of a matched table to the cube.  Every statistic of a variable is summed for all cells
+            at once with np.bincount.
+        Parameters:
+            matched:  table from matchForecasts().  Its stations, shifts and months must be in the cube, or a ValueError
+                is raised.
+        """
+        shape = tuple([len(keys) for keys in self.keys])
+        columns = [matched['station'],matched['period'],matched['shift'],matched['SDATE'].astype('S6')]
+        cells = np.ravel_multi_index(tuple([self._positions(axis,column) for axis,column in enumerate(columns)]),shape)
+        size = int(np.prod(shape))
+        for variable in self.variables:
+            valid = matched[variable + '_OK']
+            forecasts = matched[variable][valid]
+            observations = matched[variable + '_OBS'][valid]
+            if variable == 'PPRB':
+                tableCells,counted = ProbContingencyTable(tableVariables[variable][0],size=11).cells(forecasts,observations,bins=np.arange(0,120,10))
+                counts = self._tableCounts(variable,cells[valid][counted],tableCells)
+            elif variable in tableVariables:
+                categories = len(tableVariables[variable][0])
+                forecasts = forecasts.astype(int)
+                observations = observations.astype(int)
+                counted = (forecasts >= 0) & (forecasts < categories) & (observations >= 0) & (observations < categories)
+                counts = self._tableCounts(variable,cells[valid][counted],forecasts[counted] * categories + observations[counted])
+            else:
+                counted = (observations >= self.validRange[0]) & (observations <= self.validRange[1])
+                errors = forecasts[counted] - observations[counted]
+                countedCells = cells[valid][counted]
+                counts = np.column_stack([np.bincount(countedCells,weights=weights,minlength=size) for weights in
+                    [None,errors,np.abs(errors),errors ** 2]])
+            self.stats[variable] += counts.reshape(self.stats[variable].shape)
+
+    def _positions(self,axis,column):
+        """Find the position of every value of a column among the sorted keys of an axis."""
+        keys = np.array(self.keys[axis])
+        if len(keys) == 0:
+            positions = np.zeros(column.shape,dtype=int)
+            missing = np.ones(column.shape,dtype=bool)
+        else:
+            positions = np.minimum(keys.searchsorted(column),len(keys) - 1)
+            missing = keys[positions] != column
+        if np.any(missing):
+            raise ValueError('%s %s is not in the cube' % (self.axes[axis],column[missing][0]))
+        return positions
+
+    def _tableCounts(self,variable,cells,tableCells):
+        """Count pairs into the contingency table of every cell of the cube with one bincount."""
+        tableSize = int(np.prod(tableVariables[variable][1]))
+        return np.bincount(cells * tableSize + tableCells,minlength=self.stats[variable].size)
+
+    def select(self,**selection):
+        """
+        select() [public]
+        Purpose:  Find the keys along each axis that are in a selection.
+        Parameters:
+            selection:  lists of the keys to keep along an axis (station, period, shift, month) or of the groups of keys
+                to keep (shiftDay such as 'Thu', shiftPeriod such as 'Mor', year such as '2010', monthOfYear such as '12').
+                Axes without a selection keep every key.
+        Returns:  list with an array of the positions of the selected keys along each axis
+        """
+        masks = [np.ones((len(keys),),dtype=bool) for keys in self.keys]
+        for name,values in selection.iteritems():
+            if values is None:
+                continue
+            values = [str(value) for value in values]
+            if name in keyGroups:
+                axis,group = keyGroups[name]
+                labels = [group(key) for key in self.keys[self.axes.index(axis)]]
+            else:
+                axis = name
+                labels = self.keys[self.axes.index(axis)]
+            masks[self.axes.index(axis)] &= np.array([label in values for label in labels],dtype=bool)
+        return [np.nonzero(mask)[0] for mask in masks]
+
+    def rollup(self,variable,by=(),**selection):
+        """
+        rollup() [public]
+        Purpose:  Sum the statistics of a variable over a selection of the cube, keeping the axes or groups of keys in by.
+        Parameters:
+            variable:  forecast variable
+            by:  names of the axes (station, period, shift, month) or groups of keys (shiftDay, shiftPeriod, year,
+                monthOfYear) to keep, one per axis at most.  Everything else is pooled.
+            selection:  as in select()
+        Returns:  tuple of (names in by in the order of the cube axes, list of the keys along each of them, array of the
+            statistics with one leading axis per name)
+        """
+        selected = self.select(**selection)
+        data = self.stats[variable][np.ix_(*selected)]
+        names = []
+        keys = []
+        for axis in range(len(self.axes) - 1,-1,-1):
+            axisKeys = [self.keys[axis][i] for i in selected[axis]]
+            kept = [name for name in by if name == self.axes[axis] or (name in keyGroups and keyGroups[name][0] == self.axes[axis])]
+            if len(kept) == 0:
+                data = data.sum(axis=axis)
+                continue
+            if kept[0] in keyGroups:
+                labels = [keyGroups[kept[0]][1](key) for key in axisKeys]
+            else:
+                labels = axisKeys
+            groups,inverse = np.unique(labels,return_inverse=True)
+            indicator = np.zeros((len(groups),len(labels)))
+            indicator[inverse,np.arange(len(labels))] = 1
+            data = np.moveaxis(np.tensordot(indicator,data,axes=([1],[axis])),0,axis)
+            names.insert(0,kept[0])
+            keys.insert(0,list(groups))
+        return names,keys,data
+
+    def scores(self,variable,by=(),**selection):
+        """
+        scores() [public]
+        Purpose:  Compute the scores of a variable for a rollup of the cube.
+        Parameters:
+            variable,by,selection:  as in rollup()
+        Returns:  tuple of (names in by, list of the keys along each of them, dictionary mapping score names to arrays
+            with one axis per name).  Continuous variables get N, ME, MAE and RMSE, PPRB gets N, BS and BSS and SKYC
+            gets N, HSS and PSS.  Scores without any pairs are NaN.
+        """
+        names,keys,data = self.rollup(variable,by,**selection)
+        if variable in tableVariables:
+            tables = StackedContingencyTable(tableVariables[variable][0],names,keys,tableVariables[variable][1],data)
+            scores = dict(N=data.sum(axis=(-2,-1)))
+            if variable == 'PPRB':
+                scores['BS'] = tables.BrierScore()
+                scores['BSS'] = tables.BrierSkillScore()
+            else:
+                scores['HSS'] = tables.HeidkeSkillScore()
+                scores['PSS'] = tables.PeirceSkillScore()
+            return names,keys,scores
+        N = data[...,0]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            scores = dict(N=N,ME=data[...,1] / N,MAE=data[...,2] / N,RMSE=np.sqrt(data[...,3] / N))
+        return names,keys,scores
+
+    def save(self,path):
+        """
+        save() [public]
+        Purpose:  Write the cube to a directory: cube.json describes it and each variable is a .npy file.
+        Parameters:
+            path:  directory for the cube
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for variable in self.variables:
+            self._write(path,variable + '.npy',self.stats[variable])
+        info = dict(version=self.version,keys=self.keys,variables=self.variables,start=self.startDate,end=self.endDate,
+            validRange=self.validRange)
+        self._write(path,'cube.json',info)
+
+    def _write(self,path,name,contents):
+        """Write a cube file next to its final name and rename it into place."""
+        filename = os.path.join(path,name)
+        outfile = open(filename + '.tmp','wb')
+        if name.endswith('.json'):
+            json.dump(contents,outfile)
+        else:
+            np.save(outfile,contents)
+        outfile.close()
+        os.rename(filename + '.tmp',filename)
+
+def buildCube(matched,variables,startDate='',endDate=''):
+    """
+    buildCube()
+    Purpose:  Build a VerificationCube covering every station, shift and month of a matched table.
+    Parameters:
+        matched:  table from matchForecasts()
+        variables:  list of forecast variables with columns in matched
+        startDate,endDate:  YYYYMMDD strings of the verification period
+    Returns:  VerificationCube
+    """
+    cube = VerificationCube(np.unique(matched['station']),np.unique(matched['shift']),np.unique(matched['SDATE'].astype('S6')),
+        variables,startDate,endDate)
+    cube.add(matched)
+    return cube
+
+def openCube(path):
+    """
+    openCube()
+    Purpose:  Open a cube written by VerificationCube.save().  The statistics are memory mapped.
+    Parameters:
+        path:  directory of the cube
+    Returns:  VerificationCube
+    """
+    infofile = open(os.path.join(path,'cube.json'))
+    info = json.load(infofile)
+    infofile.close()
+    if info['version'] != VerificationCube.version:
+        raise ValueError('Cube in %s has layout version %s, expected %s' % (path,info['version'],VerificationCube.version))
+    stations,periods,shifts,months = [[str(key) for key in keys] for keys in info['keys']]
+    cube = VerificationCube(stations,shifts,months,[],str(info['start']),str(info['end']),info['validRange'])
+    cube.variables = [str(variable) for variable in info['variables']]
+    for variable in cube.variables:
+        cube.stats[variable] = np.load(os.path.join(path,variable + '.npy'),mmap_mode='r')
+    return cube
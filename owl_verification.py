@@ -1,12 +1,19 @@
 from OWLShift import OWLShift
-from ASOS import ASOS
-from ContingencyTable import ProbContingencyTable,ContinuousContingencyTable
-from OWLOutput import OWLOutput
+from ASOS import ASOS,asosFilename,readASOSFile,openASOSStore,timeToEpoch,epochToTime,encodeClouds,cloudCategories
+from MOS import MOS
+from ContingencyTable import ProbContingencyTable,MultiContingencyTable,StackedContingencyTable,ContinuousContingencyTable,bootstrapWeights
+from ContingencyTable import brierScores,heidkeSkillScores,peirceSkillScores
+from OWLOutput import OWLOutput,BinaryOutput
+from OWLCache import OWLCache
+from VerificationCube import buildCube,openCube
 from datetime import datetime,timedelta
 import os
-import re
-import cPickle as pickle
+import sys
+import time
+import threading
 import argparse
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import numpy as np
 
 days = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun']
@@ -18,22 +25,72 @@ verif_to_fcst = {'GUY':'KGUY', 'WWR':'KWWR', 'CLK':'KCSM', 'LTS':'KLTS', 'LAW':'
 # Dictionary mapping forecast points to verifying points
 fcst_to_verif = {'KGUY':'GUY', 'KWWR':'WWR', 'KCSM':'CLK', 'KLTS':'LTS', 'KLAW':'LAW', 'KEND':'END', 'KOKC':'OKC', 'KOUN':'OUN', 'KADM':'ADM', 'KTUL':'TUL', 'KMLC':'MLC', 'KHHW':'PRX', 'KEYW':'EYW' }
 
+# Time zone of each verifying point.  The forecast windows and the ASOS observations (downloaded with tz=local) are in local time.
+station_timezones = {'GUY':'America/Chicago', 'WWR':'America/Chicago', 'CLK':'America/Chicago', 'LTS':'America/Chicago', 'LAW':'America/Chicago', 'END':'America/Chicago', 'OKC':'America/Chicago', 'OUN':'America/Chicago', 'ADM':'America/Chicago', 'TUL':'America/Chicago', 'MLC':'America/Chicago', 'PRX':'America/Chicago', 'EYW':'America/New_York' }
+
+# Verified forecast variables and the ASOS method that gives the matching observation for each forecast window
+verif_variables = [('TMPH','getHighTemps'), ('TMPL','getLowTemps'), ('WSHI','getMaxWinds'), ('WSLO','getMinWinds'), ('PPRB','getPrecip'), ('SKYC','getSkyCover')]
+
+# Categorical forecast variables and the function that encodes them as the category indices of their observations
+categorical_variables = {'SKYC':encodeClouds}
+
+# MOS guidance compared with each verified variable: (MOS element, window reduction, hours covered by each value, factor to the forecast units)
+mos_baseline = {'TMPH':('X/N','max',0,1.0), 'TMPL':('X/N','min',0,1.0), 'WSHI':('WSP','max',0,1.15077945), 'WSLO':('WSP','min',0,1.15077945), 'PPRB':('P12','max',12,1.0)}
+
+# Scores written for each rolling window in --trend mode
+trend_scores = ['N','ME','MAE','RMSE','BS','BSS','HSS','PSS']
+
+# Scores written for each selection of the cube in --fromcube mode
+cube_scores = ['N','ME','MAE','RMSE','BS','BSS','PSS','HSS']
+
+# Scores written for each variable in --baseline mos mode
+mos_scores = ['N','ME','MAE','RMSE','MSE','MOS_ME','MOS_MAE','MOS_RMSE','MOS_MSE','SS_MOS']
+
 def main():
     parser = argparse.ArgumentParser(description='Load and match forecasts and observed data.')
     parser.add_argument('--start',default='20090910',help='Start verification date in the format YYYYMMDD')
     parser.add_argument('--end',default='20110509',help='End verification date in the format YYYYMMDD')
-    parser.add_argument('--update',action='store_true',help='Load data from pickle files and add any new data from files.')
-    parser.add_argument('--frompickle',action='store_true', help='Load data from a pickle file.')
-    parser.add_argument('--owlpickle',default='owl_shift_forecasts.pkl',help='Specify name of OWL forecast file.')
-    parser.add_argument('--asospickle',default='asos_sites.pkl',help='Specify name of ASOS sites file')
+    parser.add_argument('--update',action='store_true',help='Load data from the cache and add any new data from files.')
+    parser.add_argument('--frompickle',action='store_true', help='Load data from the cache.  The cache is rebuilt if it is out of date.')
+    parser.add_argument('--cache',default='owl_cache/',help='Directory of the memory mapped forecast and observation cache.')
     parser.add_argument('--precip',action='store_true', help='Run precip verification')
     parser.add_argument('--temps',action='store_true', help='Run temperature verification')
     parser.add_argument('--winds',action='store_true', help='Run wind verification')
-    parser.add_argument('--out',default=None,help='Output file for verification data.')
+    parser.add_argument('--sky',action='store_true', help='Run sky cover verification')
+    parser.add_argument('--out',default=None,help='Output file for verification data.  Each verified variable adds a block with its own header line.')
+    parser.add_argument('--pairsout',default=None,help='.npy file for every matched forecast and observation pair.')
+    parser.add_argument('--workers',type=int,default=1,help='Number of threads reading forecast files and of processes matching forecasts and observations, split by station.')
+    parser.add_argument('--baseline',default='climo',choices=['climo','mos'],help='Reference forecast for skill scores.  mos adds scores relative to MOS guidance.')
+    parser.add_argument('--mosdir',default='mos/gfsmex/',help='Directory of the MOS files used by --baseline mos.')
+    parser.add_argument('--mostype',default='mex',help='MOS product used by --baseline mos, such as mex or mav.')
+    parser.add_argument('--mosout',default=None,help='Output file for the scores relative to MOS.  They are added to --out if not given.')
+    parser.add_argument('--bootstrap',type=int,default=0,help='Number of bootstrap resamples for confidence intervals of the scores.  0 turns them off.')
+    parser.add_argument('--bootstrapblock',default='date',choices=['date','pair'],help='Resample all forecasts verifying on the same date together, or each pair on its own.')
+    parser.add_argument('--alpha',type=float,default=0.05,help='Confidence intervals cover 1 - alpha of the bootstrap scores.')
+    parser.add_argument('--trend',type=int,default=0,help='Length in days of the rolling windows of the score trends.  0 turns them off.')
+    parser.add_argument('--cube',default=None,help='Directory to save the verification cube of sums by station, period, shift and month in.')
+    parser.add_argument('--fromcube',default=None,help='Directory of a saved verification cube.  Scores are rolled up from it without loading forecasts or observations.')
+    parser.add_argument('--by',default='period,station',help='Comma separated list of what --fromcube scores are split by: station, period, shift, month, shiftDay, shiftPeriod, year or monthOfYear.  Months and years are written as the StartDate and EndDate.')
+    parser.add_argument('--stations',default=None,help='Comma separated list of the stations --fromcube scores include.')
+    parser.add_argument('--shiftdays',default=None,help='Comma separated list of the shift days --fromcube scores include, such as Thu.')
+    parser.add_argument('--shiftperiods',default=None,help='Comma separated list of the shift periods --fromcube scores include, such as Mor.')
+    parser.add_argument('--months',default=None,help='Comma separated list of the months of the year --fromcube scores include, such as 12,1,2.')
     args = parser.parse_args()
-    if args.update or args.frompickle:
-        shifts = pickle.load(open(args.owlpickle))
-        asos_sites = pickle.load(open(args.asospickle))
+    selected_variables = []
+    for flag, variables in [(args.temps,['TMPH','TMPL']), (args.winds,['WSHI','WSLO']), (args.precip,['PPRB'])]:
+        if flag:
+            selected_variables.extend(variables)
+    if args.fromcube is not None:
+        cubeScores(args, selected_variables + (['SKYC'] if args.sky else []))
+        return
+    cache = OWLCache(args.cache)
+    from_cache = args.frompickle and cache.isValid(args.start,args.end)
+    if args.frompickle and not from_cache:
+        print "Cache in %s is missing or out of date, rebuilding it" % args.cache
+    ingested = {}
+    if from_cache or (args.update and cache.exists()):
+        shifts,asos_sites = cache.load()
+        ingested = cache.ingestedForecasts()
     else:
         asos_sites = None
         shifts = {}
@@ -41,30 +98,30 @@ def main():
             for time in times:
                 shifts[day + '_' + time] = OWLShift(day,time)
 
-    if not args.frompickle:
-        shifts = collectForecasts(shifts,args.start,args.end)
-        asos_sites = collectASOS(args.start,args.end,asos_sites)
-        pickle.dump(shifts,open(args.owlpickle,'w'))
-        pickle.dump(asos_sites,open(args.asospickle,'w'))
+    if not from_cache:
+        shifts,asos_sites = ingest(shifts,asos_sites,args.start,args.end,ingested,args.workers,store_dir=os.path.join(cache.path,'asos'))
+        cache.save(shifts,asos_sites,args.start,args.end,ingested)
 
-    morning_shifts = {}
-    afternoon_shifts = {}
-    evening_shifts = {}
-
-    for shift_time, fcsts in shifts.iteritems():
-        if shift_time[-3:] == "Mor":
-            morning_shifts[shift_time] = fcsts
-        if shift_time[-3:] == "Aft":
-            afternoon_shifts[shift_time] = fcsts
-        if shift_time[-3:] == "Eve":
-            evening_shifts[shift_time] = fcsts
+    if args.precip or args.winds or args.temps or args.sky or args.cube is not None:
+        observations = asos_sites
+        if args.workers > 1:
+            # Stations that are not mapped from the cache are loaded by the process that matches them
+            observations = dict([(site, asos if asos.store is not None else None) for site, asos in asos_sites.iteritems()])
+        pairs_file = args.pairsout if args.precip or args.winds or args.temps or args.sky else None
+        matched = matchForecasts(shifts, observations, args.start, args.end, workers=args.workers, pairs_file=pairs_file)
+    if args.cube is not None:
+        cube = buildCube(matched, [variable for variable, method in verif_variables], args.start, args.end)
+        cube.save(args.cube)
+        print "Saved the verification cube to %s" % args.cube
 
+    # Blocks after the first one written to --out are appended to it
+    out_blocks = 0
     if args.precip:
         precip_out = OWLOutput(header=['BSS','0','10','20','30','40','50','60','70','80','90','100'])
-        scores,cts = verifyPrecip(shifts, asos_sites, args.start, args.end)
-        #morning_scores = verifyPrecip(morning_shifts, asos_sites, args.start, args.end)
-        #afternoon_scores = verifyPrecip(afternoon_shifts, asos_sites, args.start, args.end)
-        #evening_scores = verifyPrecip(evening_shifts, asos_sites, args.start, args.end)
+        if args.out is not None:
+            precip_out.open(args.out,append=out_blocks > 0)
+            out_blocks += 1
+        scores,cts = verifyPrecip(shifts, asos_sites, args.start, args.end, matched)
 
         print "Overall Verification Scores"
         station_list = asos_sites.keys()
@@ -72,20 +129,21 @@ def main():
             print "BSS's for period %s:" % period
             print "All stations: %f" % scores[period]['all']
             for station in station_list:
-                #print "%s: %2.2f %2.2f %2.2f %2.2f" % (verif_to_fcst[station], scores[period][station], morning_scores[period][station], afternoon_scores[period][station], evening_scores[period][station])
                 entry = ['PPRB',period,station,args.start,args.end,'ALL','ALL',scores[period][station]]
                 entry.extend(cts[period][station].getReliability())
                 precip_out.addEntry(*entry)
       
             print
-        if args.out is not None:
-            precip_out.toCSV(args.out)
+        precip_out.close()
 
     if args.winds:
         wind_out = OWLOutput(header=['ME','MAE','RMSE'])
+        if args.out is not None:
+            wind_out.open(args.out,append=out_blocks > 0)
+            out_blocks += 1
         station_list = asos_sites.keys()
         station_list.sort()
-        me,mae,rmse = verifyWinds(shifts, asos_sites, args.start, args.end)
+        me,mae,rmse = verifyWinds(shifts, asos_sites, args.start, args.end, matched)
         for period in OWLShift._forecast_days:
             print 'Day ' + period
             for station in station_list:
@@ -93,13 +151,15 @@ def main():
                 for t in ['HI','LO']: 
                     entry = ['WS' + t,period,station,args.start,args.end,'ALL','ALL',me[period][station][t],mae[period][station][t],rmse[period][station][t]]
                     wind_out.addEntry(*entry)
-        if args.out is not None:
-            wind_out.toCSV(args.out)
+        wind_out.close()
     if args.temps:
         temp_out = OWLOutput(header=['ME','MAE','RMSE'])
+        if args.out is not None:
+            temp_out.open(args.out,append=out_blocks > 0)
+            out_blocks += 1
         station_list = asos_sites.keys()
         station_list.sort()
-        me,mae,rmse = verifyTemps(shifts, asos_sites,args.start,args.end)
+        me,mae,rmse = verifyTemps(shifts, asos_sites,args.start,args.end, matched)
         for period in OWLShift._forecast_days:
             print 'Day ' + period
             for station in station_list:
@@ -107,29 +167,173 @@ def main():
                 for t in ['H','L']:
                     entry = ['TMP' + t,period,station,args.start,args.end,'ALL','ALL',me[period][station][t],mae[period][station][t],rmse[period][station][t]]
                     temp_out.addEntry(*entry)
+        temp_out.close()
+    if args.sky:
+        sky_out = OWLOutput(header=['HSS','PSS','N'])
         if args.out is not None:
-            temp_out.toCSV(args.out)
+            sky_out.open(args.out,append=out_blocks > 0)
+            out_blocks += 1
+        hss,pss,cts = verifySky(shifts, asos_sites, args.start, args.end, matched)
+        for period in OWLShift._forecast_days:
+            print 'Day ' + period
+            for station in sorted(asos_sites.keys()) + ['all']:
+                ct = cts[period][station]
+                print '%s: HSS:  %2.3f  PSS:  %2.3f' % (verif_to_fcst.get(station,station), hss[period][station], pss[period][station])
+                sky_out.addEntry('SKYC',period,station.upper(),args.start,args.end,'ALL','ALL',hss[period][station],pss[period][station],ct.ct.sum())
+        sky_out.close()
+    if args.baseline == 'mos' and len(selected_variables) > 0:
+        mos = MOS([verif_to_fcst[station] for station in sorted(asos_sites.keys())], args.start, args.end, [0,12], type=args.mostype, path=args.mosdir)
+        matched = addMOSBaseline(matched, mos)
+        mos_out = OWLOutput(header=mos_scores)
+        if args.mosout is not None:
+            mos_out.open(args.mosout)
+        elif args.out is not None:
+            mos_out.open(args.out,append=out_blocks > 0)
+            out_blocks += 1
+        for variable in selected_variables:
+            print "%s skill relative to MOS:" % variable
+            for keys in [('period','station'), ('period',)]:
+                group_keys, scores = pairedScores(matched, variable, keys)
+                for i, key in enumerate(group_keys):
+                    station = key[1] if len(key) > 1 else 'ALL'
+                    if station == 'ALL':
+                        print "Day %s: OWL RMSE %2.2f  MOS RMSE %2.2f  Skill %2.3f" % (key[0], scores['RMSE'][i], scores['MOS_RMSE'][i], scores['SS_MOS'][i])
+                    entry = [variable,key[0],station,args.start,args.end,'ALL','ALL']
+                    entry.extend([scores[name][i] for name in mos_scores])
+                    mos_out.addEntry(*entry)
+        mos_out.close()
+    if args.bootstrap > 0 and len(selected_variables) > 0:
+        bootstrap_out = OWLOutput(header=['Score','Value','Low','High','Samples'])
+        if args.out is not None:
+            bootstrap_out.open(args.out,append=out_blocks > 0)
+            out_blocks += 1
+        intervals = bootstrapScores(matched, selected_variables, args.bootstrap, args.alpha, args.bootstrapblock == 'date', args.workers)
+        print "%d%% bootstrap confidence intervals from %d resamples:" % (round(100 * (1 - args.alpha)), args.bootstrap)
+        for variable, period, station, score, value, low, high in intervals:
+            print "%s day %s %s %s: %2.3f [%2.3f, %2.3f]" % (variable, period, station, score, value, low, high)
+            bootstrap_out.addEntry(variable,period,station,args.start,args.end,'ALL','ALL',score,value,low,high,args.bootstrap)
+        bootstrap_out.close()
+    if args.trend > 0 and (args.precip or args.winds or args.temps or args.sky):
+        trend_out = OWLOutput(header=trend_scores)
+        if args.out is not None:
+            trend_out.open(args.out,append=out_blocks > 0)
+            out_blocks += 1
+        trend_variables = selected_variables + (['SKYC'] if args.sky else [])
+        trends = trendScores(matched, trend_variables, args.trend, args.start, args.end)
+        for variable in trend_variables:
+            group_keys, window_starts, window_ends, scores = trends[variable]
+            print "%s %d day trends: %d windows for %d periods and stations" % (variable, args.trend, len(window_ends), len(group_keys))
+            for g, (period, station) in enumerate(group_keys):
+                for w in xrange(len(window_ends)):
+                    if scores['N'][g, w] > 0:
+                        entry = [variable,period,station,window_starts[w],window_ends[w],'ALL','ALL']
+                        entry.extend([scores[name][g, w] if name in scores else np.nan for name in trend_scores])
+                        trend_out.addEntry(*entry)
+        trend_out.close()
     return
 
-def collectForecasts(shifts,startDate,endDate,forecastDir='fcst/'):
+def cubeScores(args, variables):
+    """
+    cubeScores()
+    Purpose:    Print and write the scores of a saved verification cube for the selection given on the command line.
+    Parameters: args [type=argparse.Namespace]
+                    Command line arguments.  --fromcube, --by, --stations, --shiftdays, --shiftperiods, --months and --out are used.
+                variables [type=list]
+                    Forecast variables to score.  Every variable in the cube is scored if it is empty.
+    """
+    cube = openCube(args.fromcube)
+    if len(variables) == 0:
+        variables = cube.variables
+    split = lambda value: value.split(',') if value is not None else None
+    by = split(args.by)
+    selection = dict(station=split(args.stations), shiftDay=split(args.shiftdays), shiftPeriod=split(args.shiftperiods))
+    if args.months is not None:
+        selection['monthOfYear'] = ['%02d' % int(month) for month in split(args.months)]
+    labels = dict(shiftPeriod='ALL' if args.shiftperiods is None else args.shiftperiods.replace(',','+'),
+                  shiftDay='ALL' if args.shiftdays is None else args.shiftdays.replace(',','+'),
+                  station='ALL' if args.stations is None else args.stations.replace(',','+'), period='ALL')
+    cube_out = OWLOutput(header=cube_scores)
+    if args.out is not None:
+        cube_out.open(args.out)
+    for variable in variables:
+        names, keys, scores = cube.scores(variable, by, **selection)
+        print "%s scores by %s:" % (variable, ', '.join(names) if len(names) > 0 else 'nothing')
+        for index in np.ndindex(*[len(axis_keys) for axis_keys in keys]):
+            row = dict(labels)
+            row['startDate'], row['endDate'] = cube.startDate, cube.endDate
+            for axis, name in enumerate(names):
+                key = keys[axis][index[axis]]
+                if name == 'shift':
+                    row['shiftDay'], row['shiftPeriod'] = key.split('_')
+                elif name in ['month','year','monthOfYear']:
+                    row['startDate'] = row['endDate'] = key
+                else:
+                    row[name] = key
+            print "%s N %d  %s" % (' '.join([keys[axis][index[axis]] for axis in range(len(names))]), scores['N'][index],
+                '  '.join(['%s %2.3f' % (name, scores[name][index]) for name in cube_scores[1:] if name in scores]))
+            entry = [variable, row['period'], row['station'], row['startDate'], row['endDate'], row['shiftPeriod'], row['shiftDay']]
+            entry.extend([scores[name][index] if name in scores else np.nan for name in cube_scores])
+            cube_out.addEntry(*entry)
+    cube_out.close()
+
+def collectForecasts(shifts,startDate,endDate,forecastDir='fcst/',ingested=None,workers=1):
     """collectForecasts
-        Purpose:  Loop through series of dates and load forecasts into appropriate OWL shifts
+        Purpose:  Loop through series of dates and load forecasts into appropriate OWL shifts.  Files listed in ingested
+            with the same modification time and size are skipped.  The rows of changed or deleted files are removed
+            first, so a file's forecasts are never added twice.
         Parameters:
             shifts - dictionary of OWLShift class objects
             startDate,endDate - starting and ending dates of verification period in YYYYMMDD form
+            forecastDir - directory of the .fcst files
+            ingested - dictionary mapping the names of .fcst files already loaded into shifts to [modification time, size].
+                       Updated in place with the files loaded or removed.
+            workers - number of threads reading and parsing files.  Files are added to the shifts in date order either way.
     """
-    forecastFiles = os.listdir(forecastDir)
-    forecastFiles.sort()
+    if ingested is None:
+        ingested = {}
+    forecastFiles = set(os.listdir(forecastDir))
     currDateTime = datetime(year=int(startDate[0:4]),month=int(startDate[4:6]),day=int(startDate[6:]))
     endDateTime = datetime(year=int(endDate[0:4]),month=int(endDate[4:6]),day=int(endDate[6:]))
+    tasks = []
     while (endDateTime - currDateTime).days >= 0:
         weekday = currDateTime.strftime('%a')
         currDate = currDateTime.strftime('%Y%m%d')
-#       print currDate
-        for time in times:
-            if currDate + time + '.fcst' in forecastFiles:
-                loadOWLForecast(currDate,time,shifts[weekday + '_' + time])
+        for shiftTime in times:
+            filename = currDate + shiftTime + '.fcst'
+            owlshift = shifts[weekday + '_' + shiftTime]
+            if filename in forecastFiles:
+                info = os.stat(forecastDir + filename)
+                stamp = [info.st_mtime,info.st_size]
+                if ingested.get(filename) == stamp:
+                    continue
+                if filename in ingested:
+                    removeOWLForecast(currDate,shiftTime,owlshift)
+                tasks.append((currDate,shiftTime,owlshift,stamp))
+            elif filename in ingested:
+                removeOWLForecast(currDate,shiftTime,owlshift)
+                del ingested[filename]
         currDateTime = currDateTime + timedelta(days=1)
+
+    parseTasks = [(forecastDir + date + shiftTime + '.fcst',date,shiftTime,owlshift.perDtype) for date,shiftTime,owlshift,stamp in tasks]
+    if workers > 1:
+        pool = ThreadPool(workers)
+        try:
+            parsed = pool.map(parseOWLForecastTask,parseTasks,chunksize=8)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        parsed = map(parseOWLForecastTask,parseTasks)
+    elapsed = []
+    for (date,shiftTime,owlshift,stamp),((forecasts,errors),seconds) in zip(tasks,parsed):
+        storeOWLForecast(date + shiftTime + '.fcst',owlshift,forecasts,errors)
+        ingested[date + shiftTime + '.fcst'] = stamp
+        elapsed.append(seconds)
+    if len(tasks) > 0:
+        slowest = np.argmax(elapsed)
+        print "Loaded %d forecast files, %.4f s per file, slowest %s%s.fcst in %.4f s" % (len(tasks),np.mean(elapsed),tasks[slowest][0],tasks[slowest][1],elapsed[slowest])
+    else:
+        print "Loaded 0 forecast files"
     return shifts
 
 def loadOWLForecast(date,shift,owlshift,forecastDir='fcst/'):
@@ -139,24 +343,110 @@ def loadOWLForecast(date,shift,owlshift,forecastDir='fcst/'):
                     owlshift - OWLShift class passed from shifts that is to be modified
         Returns:  owl forecast in array form."""
     filename = date + shift + '.fcst'
-    owlFile = open(forecastDir + filename)
+    forecasts,errors = parseOWLForecast(forecastDir + filename,date,shift,owlshift.perDtype)
+    storeOWLForecast(filename,owlshift,forecasts,errors)
+    return
+
+def parseOWLForecastTask(task):
+    """parseOWLForecastTask
+        Purpose:  Call parseOWLForecast() with a (filename, date, shift, perDtype) tuple, for pool workers.
+        Returns:  tuple of the parseOWLForecast() result and the seconds it took."""
+    start = time.time()
+    result = parseOWLForecast(*task)
+    return result,time.time() - start
+
+def parseOWLForecast(filename,date,shift,perDtype):
+    """parseOWLForecast
+        Purpose:  Read a forecast file in one pass.  A line starting with a YYYYMMDD date begins the next period and a line
+            starting with a K site identifier is a forecast.  The site lines are cut into 5 character fields with one numpy
+            view, and each field is converted for the whole file at once.
+        Parameters: filename - path of the .fcst file
+                    date - YYYYMMDD string representing date
+                    shift - Mor,Aft,Eve
+                    perDtype - record type of the forecasts (OWLShift.perDtype)
+        Returns:  tuple of (list of forecast arrays for periods 1A,1B,2,3,4, list of (period index, line number, fields,
+                  error message) for the lines that could not be read).  Rows keep their order in the file."""
+    owlFile = open(filename)
+    lines = owlFile.read().splitlines()
+    owlFile.close()
+    periodDates = np.array([(start.strftime('%Y%m%d_%H:%M'),end.strftime('%Y%m%d_%H:%M')) for start,end in setPeriodDates(date,shift)])
+    numFields = len(perDtype) - 2
+    if len(lines) == 0:
+        return [np.zeros((0,),dtype=perDtype) for dates in periodDates],[]
+
+    # A period starts on lines whose first 8 characters are all digits, and forecasts are on lines matching K[A-Z]{3}.
+    # Shorter lines are padded with zero bytes, so a line needs a full YYYYMMDD date to start a period.
+    heads = np.array(lines,dtype='S8').view(np.uint8).reshape((len(lines),8))
+    digits = (heads >= ord('0')) & (heads <= ord('9'))
+    perIdx = np.cumsum(digits.all(axis=1)) - 1
+    letters = (heads[:,1:4] >= ord('A')) & (heads[:,1:4] <= ord('Z'))
+    rows = np.nonzero((heads[:,0] == ord('K')) & letters.all(axis=1))[0]
+    lengths = np.array([len(lines[row]) for row in rows],dtype=int)
+    width = 5 * max(numFields,(lengths.max() + 4) / 5 if len(rows) > 0 else 0)
+    siteLines = np.array([lines[row] for row in rows],dtype='S%d' % width)
+    # Blank out the trailing whitespace of every field in the raw bytes, so that the S5 view drops it like str.strip()
+    raw = siteLines.view(np.uint8).reshape((len(rows),width / 5,5))[:,:numFields]
+    blank = (raw == ord(' ')) | (raw == ord('\t')) | (raw == 0)
+    raw = np.where(np.logical_and.accumulate(blank[:,:,::-1],axis=2)[:,:,::-1],0,raw).astype(np.uint8)
+    fields = raw.view('S5')[:,:,0]
+    if (blank[:,:,0] & ~blank.all(axis=2)).any():
+        fields = np.char.strip(fields)
+    fields[fields == ''] = '-999'
+
+    periods = perIdx[rows]
+    errors = {}
+    for r in np.nonzero((periods < 0) | (periods >= len(periodDates)))[0]:
+        errors[r] = 'line is not in one of the %d forecast periods' % len(periodDates)
+    for r in np.nonzero((lengths + 4) / 5 != numFields)[0]:
+        errors.setdefault(r,'expected %d fields, found %d' % (numFields,(lengths[r] + 4) / 5))
+    columns = {}
+    for j,(name,dtype) in enumerate(perDtype[2:]):
+        try:
+            columns[name] = fields[:,j].astype(dtype)
+        except ValueError:
+            columns[name] = np.zeros((len(rows),),dtype=dtype)
+            for r in xrange(len(rows)):
+                try:
+                    columns[name][r] = fields[r,j]
+                except ValueError, e:
+                    errors.setdefault(r,str(e))
+
+    good = np.ones((len(rows),),dtype=bool)
+    good[errors.keys()] = False
+    forecasts = np.zeros((np.count_nonzero(good),),dtype=perDtype)
+    forecasts['SDATE'] = periodDates[periods[good],0]
+    forecasts['EDATE'] = periodDates[periods[good],1]
+    for name,column in columns.iteritems():
+        forecasts[name] = column[good]
+    bounds = periods[good].searchsorted(np.arange(len(periodDates) + 1))
+    badLines = [(periods[r],rows[r] + 1,splitLine(lines[rows[r]] + '\n'),errors[r]) for r in sorted(errors.keys())]
+    return [forecasts[bounds[p]:bounds[p + 1]] for p in xrange(len(periodDates))],badLines
+
+def storeOWLForecast(filename,owlshift,forecasts,errors):
+    """storeOWLForecast
+        Purpose:  Add the forecasts and bad lines from parseOWLForecast() to an OWL shift
+        Parameters: filename - name of the .fcst file, used to report bad lines as file:line
+                    owlshift - OWLShift class that is to be modified
+                    forecasts,errors - the results of parseOWLForecast()"""
     periods = ['day1A','day1B','day2','day3','day4']
-    periodDates = setPeriodDates(date,shift)
-    perIdx = -1
-    for line in owlFile:
-        if line[:8].isdigit():
-            date = line[:8]
-            perIdx += 1
-            
-        if 'TMPH' in line:
-            header = splitLine(line[:-1])
-        if re.match('K[A-Z]{3}',line):
-            forecast = [periodDates[perIdx][0].strftime('%Y%m%d_%H:%M'),periodDates[perIdx][1].strftime('%Y%m%d_%H:%M')]
-            forecast.extend(splitLine(line))
-            owlshift.addForecast(forecast,periods[perIdx])
+    for period,periodForecasts in zip(periods,forecasts):
+        owlshift.addForecasts(period,periodForecasts)
+    for perIdx,lineNum,fields,message in errors:
+        period = periods[perIdx] if 0 <= perIdx < len(periods) else None
+        owlshift.recordBadForecast(period,'%s:%d' % (filename,lineNum),fields,message)
+    return
+
+def removeOWLForecast(date,shift,owlshift):
+    """removeOWLForecast
+        Purpose:  Remove the forecasts that loadOWLForecast() added from one forecast file
+        Parameters: date - YYYYMMDD string representing date
+                    shift - Mor,Aft,Eve
+                    owlshift - OWLShift class holding the file's forecasts"""
+    for period,(start,end) in zip(OWLShift._forecast_days,setPeriodDates(date,shift)):
+        owlshift.removeForecasts('day' + period,start.strftime('%Y%m%d_%H:%M'))
     return
 
-def collectASOS(startDate,endDate,sites=None,asos_dir='verif_data/'):
+def collectASOS(startDate,endDate,sites=None,asos_dir='verif_data/',pool=None,store_dir=None):
     """ collectASOS(sites,startDate,endDAte,asos_dir)
         Purpose:  Collect data from IEM ASOS data files.
         Parameters:
@@ -165,31 +455,125 @@ def collectASOS(startDate,endDate,sites=None,asos_dir='verif_data/'):
                 sites: dictionary that has site acronyms as keys and ASOS objects as values
                        If None, then sites is initialized and all dates are added
                 asos_dir:  directory containing IEM ASOS files
+                pool:  optional multiprocessing pool.  Each yearly file of a new site is then parsed by one of its
+                       processes.  Sites are assembled in name order from the parsed files either way.
+                store_dir:  optional directory of ASOS stores, used with pool.  Each new site is then loaded by one of
+                       the processes and written to its store in store_dir, which the parent only memory maps.
         Returns:  sites dictionary with ASOS data
     """
-    if sites==None:
-        asos_files = os.listdir(asos_dir)
-        asos_files.sort()
+    if sites==None and pool is not None and store_dir is not None:
+        site_names = sorted(set([asos_file.split('_')[0] for asos_file in os.listdir(asos_dir)]))
+        tasks = [(site,startDate,endDate,asos_dir,os.path.join(store_dir,site)) for site in site_names]
+        sites = {}
+        for (site,startDate,endDate,asos_dir,store),elapsed in zip(tasks,pool.map(storeASOSWorker,tasks,chunksize=1)):
+            print "%s: stored in %s in %.2f s" % (site,store,elapsed)
+            sites[site] = openASOSStore(store)
+    elif sites==None:
+        site_names = sorted(set([asos_file.split('_')[0] for asos_file in os.listdir(asos_dir)]))
+        startTime = startDate + '_00:00'
+        endTime = endDate + '_00:00'
+        years = range(int(startDate[:4]),int(endDate[:4]) + 1)
+        tasks = [(asosFilename(asos_dir,site,year),startTime,endTime) for site in site_names for year in years]
+        if pool is None:
+            results = map(readASOSWorker,tasks)
+        else:
+            results = pool.map(readASOSWorker,tasks,chunksize=1)
+        files = {}
+        for (filename,startTime,endTime),(result,elapsed) in zip(tasks,results):
+            print "%s: scanned %d rows in %.2f s" % (filename,result[3],elapsed)
+            files[filename] = result
         sites = {}
-        for asos_file in asos_files:
-            site = asos_file.split('_')[0]
-            sites[site] = ASOS(site,startDate,endDate)
+        for site in site_names:
+            site_files = [asosFilename(asos_dir,site,year) for year in years]
+            sites[site] = ASOS(site,startDate,endDate,path=asos_dir,files=[(filename,files[filename]) for filename in site_files])
     else:
         for site,asos in sites.iteritems():
             asos.update(startDate,endDate)
     return sites
 
-def verifyTemps(forecasts,observations,start_date,end_date):
+def readASOSWorker(task):
+    """
+    readASOSWorker()
+    Purpose:    Parse one IEM ASOS file for collectASOS().
+    Parameters: task [type=tuple]
+                    (filename, startTime, endTime) as passed to readASOSFile()
+    Returns:    Tuple of the readASOSFile() result and the seconds it took.
+    """
+    start = time.time()
+    result = readASOSFile(*task)
+    return result,time.time() - start
+
+def storeASOSWorker(task):
+    """
+    storeASOSWorker()
+    Purpose:    Load one site for collectASOS() and write it to its ASOS store, so that its observations are never sent
+                back to the parent process.
+    Parameters: task [type=tuple]
+                    (site, startDate, endDate, asos_dir, store directory)
+    Returns:    The seconds it took.
+    """
+    start = time.time()
+    site, startDate, endDate, asos_dir, store = task
+    ASOS(site, startDate, endDate, path=asos_dir).writeStore(store)
+    return time.time() - start
+
+def ingest(shifts,asos_sites,startDate,endDate,ingested=None,workers=1,forecastDir='fcst/',asos_dir='verif_data/',store_dir=None):
+    """
+    ingest()
+    Purpose:    Load the forecast and observation files.  With more than one worker, the ASOS files are parsed by a
+                process pool while a second thread reads the forecast files with a thread pool.  The CPU bound ASOS
+                parsing then overlaps the forecast reads.  Results are merged in date and site order, so they do not
+                depend on the number of workers.
+    Parameters: shifts, ingested:  as in collectForecasts()
+                asos_sites:  as the sites of collectASOS()
+                startDate, endDate [type=string]
+                    YYYYMMDD strings of the verification period.
+                workers [type=int]
+                    Number of processes parsing ASOS files and of threads reading forecast files.
+                store_dir [type=string]
+                    Optional directory of ASOS stores.  With more than one worker, new sites are loaded and stored by
+                    the processes, as in collectASOS().
+    Returns:    Tuple of (shifts, asos_sites).
+    """
+    if workers <= 1:
+        shifts = collectForecasts(shifts,startDate,endDate,forecastDir,ingested)
+        return shifts,collectASOS(startDate,endDate,asos_sites,asos_dir)
+    # Start the processes before the forecast thread, so that no thread is running when they are forked
+    pool = multiprocessing.Pool(workers)
+    failures = []
+    def readForecasts():
+        try:
+            collectForecasts(shifts,startDate,endDate,forecastDir,ingested,workers)
+        except Exception:
+            failures.append(sys.exc_info())
+    forecast_thread = threading.Thread(target=readForecasts)
+    forecast_thread.start()
+    try:
+        asos_sites = collectASOS(startDate,endDate,asos_sites,asos_dir,pool,store_dir)
+    finally:
+        forecast_thread.join()
+        pool.close()
+        pool.join()
+    if len(failures) > 0:
+        raise failures[0][0],failures[0][1],failures[0][2]
+    return shifts,asos_sites
+
+def verifyTemps(forecasts,observations,start_date,end_date,matched=None):
     """
     verifyTemps()
     Purpose:  Control function for temperature verification
     Parameters:  forecasts [type=dictionary]
                     Dictionary mapping shift days (e.g. 'Tue_Aft' for Tuesday Afternoon) to their OWLShift objects.
+                 matched [type=np.array]
+                    Table of matched forecasts and observations from matchForecasts().  Built if not given.
 
     """
     me = {}
     mae = {}
     rmse = {}
+    if matched is None:
+        matched = matchForecasts(forecasts, observations, start_date, end_date)
+    groups = groupPairs(matched, ('period','station'))
     all_obs = observations.keys()
     all_obs.sort()
     for period in OWLShift._forecast_days:
@@ -197,15 +581,16 @@ def verifyTemps(forecasts,observations,start_date,end_date):
         mae[period] = {}
         me[period] = {}
         for station in all_obs:
-            H_ct = tempContingencyTable(forecasts, observations, start_date, end_date, temp="H",stations=station, period=period)
-            L_ct = tempContingencyTable(forecasts, observations, start_date, end_date, temp="L",stations=station, period=period)
+            pairs = matched[groups.get((period,station),np.zeros((0,),dtype=int))]
+            H_ct = pairContingencyTable(pairs, 'TMPH')
+            L_ct = pairContingencyTable(pairs, 'TMPL')
             print station, period
             rmse[period][station] = dict(H=H_ct.RootMeanSquareError(),L=L_ct.RootMeanSquareError()) 
             mae[period][station] = dict(H=H_ct.MeanAbsoluteError(),L=L_ct.MeanAbsoluteError())
             me[period][station] = dict(H=H_ct.MeanError(),L=L_ct.MeanError())
     return me,mae,rmse
 
-def verifyPrecip(forecasts, observations, start_date, end_date):
+def verifyPrecip(forecasts, observations, start_date, end_date, matched=None):
     """
     verifyPrecip()
     Purpose:    Main precipitation verification function
@@ -217,32 +602,38 @@ def verifyPrecip(forecasts, observations, start_date, end_date):
                     String containing the date of the start of the verification period (format is 'YYYYMMDD_HH:MM').
                 end_date [type=string]
                     String containing the date of the end of the verification period (format is 'YYYYMMDD_HH:MM', same as in start_date).
-    Returns:    [nothing ... yet]
+                matched [type=np.array]
+                    Table of matched forecasts and observations from matchForecasts().  Built if not given.
+    Returns:    Dictionaries of Brier Skill Scores and contingency tables by period and station
     """
+    if matched is None:
+        matched = matchForecasts(forecasts, observations, start_date, end_date)
+    stations = sorted(observations.keys())
+    tables = precipContingencyTables(matched, stations)
+    scores = tables.BrierSkillScore()
+    pooled = tables.pool('station')
+    pooled_scores = pooled.BrierScore(components=True)
+
     brier_skill_scores = {}
     ct_dict = {}
-
-    for period in OWLShift._forecast_days:
+    for p, period in enumerate(OWLShift._forecast_days):
         brier_skill_scores[period] = {}
         ct_dict[period] = {}
-        cts = []
         print "Period %s" % period
-        for station in observations.keys():
+        for s, station in enumerate(stations):
             print "Day %s forecasts for station %s:" % (period, verif_to_fcst[station])
-            ct = precipContingencyTable(forecasts, observations, start_date, end_date, stations=station, period=period)
-            BSS = ct.BrierSkillScore()
+            ct = ProbContingencyTable(tables.labels, data=tables.ct[p, s])
             print "Contingency Table:"
             print ct
-            print "Brier Skill Score: ", BSS
+            print "Brier Skill Score: ", scores[p, s]
             print
 
-            brier_skill_scores[period][station] = BSS
+            brier_skill_scores[period][station] = scores[p, s]
             ct_dict[period][station] = ct
-            cts.append(ct)
 
-        ct = sum(cts, ProbContingencyTable(np.arange(0, 1.1, 0.1), size=11))
-        bs,reliability,resolution,uncertainty = ct.BrierScore(components=True)
-        BSS = ct.BrierSkillScore()
+        ct = ProbContingencyTable(tables.labels, data=pooled.ct[p])
+        bs,reliability,resolution,uncertainty = [score[p] for score in pooled_scores]
+        BSS = (resolution - reliability) / uncertainty
 
         print "Contingency Table:"
         print ct
@@ -257,25 +648,31 @@ def verifyPrecip(forecasts, observations, start_date, end_date):
     return brier_skill_scores,ct_dict
 
 
-def verifyWinds(forecasts,observations,start_date,end_date):
+def verifyWinds(forecasts,observations,start_date,end_date,matched=None):
     """
     verifyWinds()
     Purpose:  Primary wind verification function
     Parameters:  forecasts [type=dictionary]
                     Dictionary mapping shift days (e.g. 'Tue_Aft' for Tuesday Afternoon) to their OWLShift objects.
                  observations 
+                 matched [type=np.array]
+                    Table of matched forecasts and observations from matchForecasts().  Built if not given.
     """
     rmse = {}
     mae = {}
     me = {}
+    if matched is None:
+        matched = matchForecasts(forecasts, observations, start_date, end_date)
+    groups = groupPairs(matched, ('period','station'))
     all_obs = observations.keys()
     for period in OWLShift._forecast_days:
         me[period] = {}
         mae[period] = {}
         rmse[period] = {}
         for station in all_obs:
-            max_ct = windContingencyTable(forecasts, observations, start_date, end_date, winds="max", stations=station, period=period)
-            min_ct = windContingencyTable(forecasts, observations, start_date, end_date, winds="min", stations=station, period=period)
+            pairs = matched[groups.get((period,station),np.zeros((0,),dtype=int))]
+            max_ct = pairContingencyTable(pairs, 'WSHI')
+            min_ct = pairContingencyTable(pairs, 'WSLO')
             print '\n---------------------\n'
             print station, period
             rmse[period][station] = dict(HI=max_ct.RootMeanSquareError(),LO=min_ct.RootMeanSquareError())
@@ -293,6 +690,496 @@ def verifyWinds(forecasts,observations,start_date,end_date):
             print "RMSE: ",min_ct.RootMeanSquareError()
     return me,mae,rmse
 
+def verifySky(forecasts, observations, start_date, end_date, matched=None):
+    """
+    verifySky()
+    Purpose:    Sky cover verification.  The forecast sky cover is compared with the greatest cover observed in any cloud
+                layer during the forecast window, and every period and station is counted into its table at once.
+    Parameters: forecasts [type=dictionary]
+                    Dictionary mapping shift days (e.g. 'Tue_Aft' for Tuesday Afternoon) to their OWLShift objects.
+                observations [type=dictionary]
+                    Dictionary mapping observation points (e.g. 'OUN' for Norman) to their ASOS objects.
+                start_date, end_date [type=string]
+                    Strings bounding the verifying windows (format is 'YYYYMMDD' or 'YYYYMMDD_HH:MM').
+                matched [type=np.array]
+                    Table of matched forecasts and observations from matchForecasts().  Built if not given.
+    Returns:    Dictionaries of Heidke and Peirce skill scores and of MultiContingencyTables by period and station, with
+                all stations pooled under 'all'.  Table rows are the forecast and columns the observed cloudCategories.
+    """
+    if matched is None:
+        matched = matchForecasts(forecasts, observations, start_date, end_date)
+    stations = sorted(observations.keys())
+    size = len(cloudCategories)
+    tables = StackedContingencyTable(cloudCategories, ('period','station'), [OWLShift._forecast_days, stations], (size, size))
+    valid = matched['SKYC_OK'] & (matched['SKYC_OBS'] > -990)
+    forecast = matched['SKYC'][valid].astype(int)
+    observed = matched['SKYC_OBS'][valid].astype(int)
+    counted = (forecast >= 0) & (forecast < size) & (observed >= 0) & (observed < size)
+    indices = stackIndices(matched[valid][counted], tables.axes, tables.keys)
+    tables.accumulate(indices, forecast[counted], observed[counted])
+    pooled = tables.pool('station')
+
+    hss = {}
+    pss = {}
+    ct_dict = {}
+    for stack, names in [(tables, stations), (pooled, ['all'])]:
+        stack_hss = stack.HeidkeSkillScore().reshape((len(OWLShift._forecast_days), len(names)))
+        stack_pss = stack.PeirceSkillScore().reshape((len(OWLShift._forecast_days), len(names)))
+        stack_ct = stack.ct.reshape((len(OWLShift._forecast_days), len(names), size, size))
+        for p, period in enumerate(OWLShift._forecast_days):
+            for s, station in enumerate(names):
+                hss.setdefault(period, {})[station] = stack_hss[p, s]
+                pss.setdefault(period, {})[station] = stack_pss[p, s]
+                ct_dict.setdefault(period, {})[station] = MultiContingencyTable(cloudCategories, data=stack_ct[p, s])
+    return hss, pss, ct_dict
+
+def matchForecasts(forecasts, observations, start_date, end_date, variables=verif_variables, workers=1, asos_dir='verif_data/', pairs_file=None):
+    """
+    matchForecasts()
+    Purpose:    Match every forecast with its observations in a single table, so that all of the scores can be computed by grouping its rows.
+    Parameters: forecasts [type=dictionary]
+                    Dictionary mapping shift days (e.g. 'Tue_Aft' for Tuesday Afternoon) to their OWLShift objects.
+                observations [type=dictionary]
+                    Dictionary mapping observation points (e.g. 'OUN' for Norman) to their ASOS objects.  A value of None
+                    means the station's observations are loaded from asos_dir by whichever process matches that station.
+                start_date, end_date [type=string]
+                    Strings bounding the verifying windows (format is 'YYYYMMDD' or 'YYYYMMDD_HH:MM').
+                variables [type=list]
+                    List of (forecast variable, ASOS method) tuples.  Each one adds a forecast, validity and observation column.
+                workers [type=int]
+                    Number of processes.  Stations are independent, so each process matches whole stations and
+                    receives only that station's observations, which are sent as the name of their store when they
+                    are mapped from an ASOS store.  The result is the same as with one process.  Processes return
+                    their stations' rows rather than contingency tables, so the per-station results are merged by
+                    concatenating rows, and the tables for each station and for 'all' are counted from the merged
+                    table (see precipContingencyTables) instead of being summed with ContingencyTable.__add__.
+                asos_dir [type=string]
+                    Directory of IEM ASOS files for stations without loaded observations.
+                pairs_file [type=string]
+                    Optional .npy file.  Each station's rows are written to it with BinaryOutput as soon as they are matched.
+    Returns:    Structured array with one row per shift, period, station and forecast window.  The columns are shift, period,
+                station, SDATE and EDATE, then for each variable the forecast, <variable>_OK (the getForecasts filter) and
+                <variable>_OBS (the observation, -998 if missing).  Rows are ordered by station, shift and period.
+                With pairs_file, the table is memory mapped from that file, so it does not have to fit in memory.
+    """
+    tasks = [(station, observations[station], start_date, end_date, variables, asos_dir) for station in sorted(observations.keys())]
+    pairs_out = None
+    tables = []
+    pool = None
+    try:
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=initMatchWorker, initargs=(forecasts,))
+            station_tables = pool.imap(matchStationWorker, tasks, chunksize=1)
+        else:
+            station_tables = (matchStationTask(forecasts, task) for task in tasks)
+        for table in station_tables:
+            if pairs_file is None:
+                tables.append(table)
+                continue
+            if pairs_out is None:
+                pairs_out = BinaryOutput(pairs_file, table.dtype)
+            pairs_out.write(table)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if pairs_out is not None:
+            pairs_out.close()
+    if pairs_out is not None:
+        print "Wrote %d matched pairs to %s" % (pairs_out.rows, pairs_file)
+        return np.load(pairs_file, mmap_mode='r')
+    return np.concatenate(tables)
+
+# Forecasts shared by every task of a matchForecasts() worker process
+worker_forecasts = None
+
+def initMatchWorker(forecasts):
+    """
+    initMatchWorker()
+    Purpose:    Give a matchForecasts() worker process the forecasts once, rather than with every task.
+    """
+    global worker_forecasts
+    worker_forecasts = forecasts
+
+def matchStationWorker(task):
+    """
+    matchStationWorker()
+    Purpose:    Match one station for matchForecasts() in a worker process with the forecasts given by initMatchWorker().
+    Parameters: task [type=tuple]
+                    As in matchStationTask().
+    Returns:    The station's rows of the matched table.
+    """
+    return matchStationTask(worker_forecasts, task)
+
+def matchStationTask(forecasts, task):
+    """
+    matchStationTask()
+    Purpose:    Match one station for matchForecasts(), loading its observations first if they were not passed in.
+    Parameters: forecasts [type=dictionary]
+                    Dictionary mapping shift days to their OWLShift objects.
+                task [type=tuple]
+                    (station, ASOS object or None, start_date, end_date, variables, asos_dir)
+    Returns:    The station's rows of the matched table.
+    """
+    station, asos, start_date, end_date, variables, asos_dir = task
+    if asos is None:
+        asos = ASOS(station, start_date[:8], end_date[:8], path=asos_dir)
+    return matchStation(forecasts, station, asos, start_date, end_date, variables)
+
+def matchStation(forecasts, station, asos, start_date, end_date, variables=verif_variables):
+    """
+    matchStation()
+    Purpose:    Build the matchForecasts() table for a single station.  Each distinct forecast window is reduced once
+                from the ASOS data, no matter how many shifts and periods share it.
+    Parameters: forecasts [type=dictionary]
+                    Dictionary mapping shift days to their OWLShift objects.
+                station [type=string]
+                    Verifying station (e.g. 'OUN').
+                asos [type=ASOS]
+                    Observations for the station.
+                start_date, end_date, variables:  as in matchForecasts()
+    Returns:    The station's rows of the matched table.
+    """
+    labels = []
+    records = []
+    for shift_name in sorted(forecasts.keys()):
+        for period in OWLShift._forecast_days:
+            site_fcsts, valid_masks = forecasts[shift_name].getSiteForecasts(period, start_date, end_date, verif_to_fcst[station])
+            labels.append((shift_name, period, len(site_fcsts)))
+            records.append((site_fcsts, valid_masks))
+
+    counts = [count for shift_name, period, count in labels]
+    columns = [('shift', np.repeat(np.array([label[0] for label in labels], dtype='S7'), counts)),
+               ('period', np.repeat(np.array([label[1] for label in labels], dtype='S2'), counts)),
+               ('station', np.repeat(np.array([station], dtype='S3'), sum(counts))),
+               ('SDATE', np.concatenate([site_fcsts['SDATE'] for site_fcsts, valid_masks in records])),
+               ('EDATE', np.concatenate([site_fcsts['EDATE'] for site_fcsts, valid_masks in records]))]
+
+    windows, first, inverse = np.unique(np.char.add(columns[3][1], columns[4][1]), return_index=True, return_inverse=True)
+    window_starts = columns[3][1][first]
+    window_ends = columns[4][1][first]
+    for variable, method in variables:
+        values = np.concatenate([site_fcsts[variable] for site_fcsts, valid_masks in records])
+        if variable in categorical_variables:
+            values = categorical_variables[variable](values)
+        columns.append((variable, values))
+        columns.append((variable + '_OK', np.concatenate([validPairs(site_fcsts, valid_masks, variable) for site_fcsts, valid_masks in records])))
+        columns.append((variable + '_OBS', getattr(asos, method)(window_starts, window_ends)[inverse]))
+
+    matched = np.zeros((sum(counts),), dtype=[(name, column.dtype) for name, column in columns])
+    for name, column in columns:
+        matched[name] = column
+    return matched
+
+def addMOSBaseline(matched, mos, variables=verif_variables, timezones=station_timezones):
+    """
+    addMOSBaseline()
+    Purpose:    Add the MOS guidance for every forecast window to a matched table.  Each forecast is compared with the latest
+                MOS run issued before the start of period 1A of its shift, the guidance the forecaster had.  Every shift and
+                period of a station is reduced from the MOS forecasts at once.
+    Parameters: matched [type=np.array]
+                    Table from matchForecasts().
+                mos [type=MOS]
+                    MOS guidance for the forecast sites, with both the 00 and 12 UTC runs.
+                variables [type=list]
+                    List of (forecast variable, ASOS method) tuples.  Variables in mos_baseline get a column.
+                timezones [type=dictionary]
+                    Time zone of the local times of each station's forecast windows and observations.
+    Returns:    Copy of the matched table with a <variable>_MOS column for each variable, in the units of the forecast
+                and -998 where there is no guidance.  PPRB uses the highest 12 hour PoP overlapping the window.
+    """
+    issued = shiftIssueTimes(matched)
+    columns = []
+    for variable, method in variables:
+        if variable in mos_baseline:
+            columns.append((variable + '_MOS', np.zeros((len(matched),), dtype=float) - 998))
+    for (station,), rows in groupPairs(matched, ('station',)).iteritems():
+        for name, column in columns:
+            element, op, period_hours, factor = mos_baseline[name[:-4]]
+            guidance = mos.reduceWindows(verif_to_fcst[station], element, matched['SDATE'][rows], matched['EDATE'][rows], op,
+                issuedBefore=issued[rows], periodHours=period_hours, timezone=timezones[station])
+            column[rows] = np.where(guidance > -990, guidance * factor, guidance)
+
+    names = [name for name in matched.dtype.names if name not in dict(columns)]
+    with_mos = np.zeros((len(matched),), dtype=[(name, matched.dtype[name]) for name in names] + [(name, column.dtype) for name, column in columns])
+    for name in names:
+        with_mos[name] = matched[name]
+    for name, column in columns:
+        with_mos[name] = column
+    return with_mos
+
+def shiftIssueTimes(matched):
+    """
+    shiftIssueTimes()
+    Purpose:    Find the start of period 1A of the shift that made each forecast in a matched table.  The offset of each
+                period from the start of period 1A comes from setPeriodDates().
+    Parameters: matched [type=np.array]
+                    Table from matchForecasts().
+    Returns:    Array of 'YYYYMMDD_HH:MM' strings.
+    """
+    starts = timeToEpoch(matched['SDATE'])
+    issued = np.zeros((len(matched),), dtype=np.int64)
+    for shiftTime in times:
+        shift_rows = np.char.endswith(matched['shift'], shiftTime)
+        period_starts = timeToEpoch(np.array([start.strftime('%Y%m%d_%H:%M') for start, end in setPeriodDates('19700101', shiftTime)]))
+        for period, period_start in zip(OWLShift._forecast_days, period_starts):
+            rows = shift_rows & (matched['period'] == period)
+            issued[rows] = starts[rows] - period_start + period_starts[0]
+    return epochToTime(issued)
+
+def pairedScores(matched, variable, keys=('period','station')):
+    """
+    pairedScores()
+    Purpose:    Score OWL forecasts and MOS guidance on the same pairs, for every group of a matched table at once.  Only
+                rows with a valid forecast, MOS value and observation are used.  Probabilities are scored against whether
+                precipitation was observed, so MSE is the Brier score and SS_MOS the Brier skill score relative to MOS.
+    Parameters: matched [type=np.array]
+                    Table from addMOSBaseline().
+                variable [type=string]
+                    Forecast variable to verify (e.g. 'TMPH').
+                keys [type=tuple]
+                    Names of the columns to group by.
+    Returns:    List of tuples of key values and a dictionary mapping each name in mos_scores to an array of that score
+                for each group.  SS_MOS is 1 - MSE / MOS_MSE.
+    """
+    observed = matched[variable + '_OBS']
+    guidance = matched[variable + '_MOS']
+    if variable == 'PPRB':
+        valid = matched[variable + '_OK'] & (guidance > -990) & (observed > -990)
+        outcome = (observed > 0).astype(float)
+        errors = [matched[variable] / 100. - outcome, guidance / 100. - outcome]
+    else:
+        valid = matched[variable + '_OK'] & (guidance > -990) & (observed >= -50.0) & (observed <= 120.0)
+        errors = [matched[variable] - observed, guidance - observed]
+    group_keys, ids = groupIds(matched[valid], keys)
+    counts = np.bincount(ids, minlength=len(group_keys)).astype(float)
+    scores = {'N':counts.astype(int)}
+    for prefix, error in zip(['','MOS_'], errors):
+        error = error[valid]
+        scores[prefix + 'ME'] = np.bincount(ids, error, len(group_keys)) / counts
+        scores[prefix + 'MAE'] = np.bincount(ids, np.abs(error), len(group_keys)) / counts
+        scores[prefix + 'MSE'] = np.bincount(ids, error ** 2, len(group_keys)) / counts
+        scores[prefix + 'RMSE'] = np.sqrt(scores[prefix + 'MSE'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores['SS_MOS'] = 1 - scores['MSE'] / scores['MOS_MSE']
+    return group_keys, scores
+
+def bootstrapScores(matched, variables, samples, alpha=0.05, block_by_date=True, workers=1, seed=0):
+    """
+    bootstrapScores()
+    Purpose:    Bootstrap confidence intervals for the scores of every period and station.  Every resample of a station
+                and period is scored at once by the contingency tables.  All variables of a station and period share
+                the same resamples, drawn from a random state seeded by seed, the station and the period.  Stations are
+                resampled in parallel processes, and the intervals do not depend on the number of workers.
+    Parameters: matched [type=np.array]
+                    Table from matchForecasts().
+                variables [type=list]
+                    Forecast variables to score.  PPRB gets BS and BSS intervals, the others ME, MAE and RMSE.
+                samples [type=int]
+                    Number of resamples.
+                alpha [type=float]
+                    The intervals run from the alpha/2 to the 1 - alpha/2 quantile of the resampled scores.
+                block_by_date [type=bool]
+                    If True, all forecasts verifying on the same date are resampled together, since they share the
+                    same weather.  If False, each pair is resampled on its own.
+                workers [type=int]
+                    Number of processes.
+                seed [type=int]
+                    Seed of the random states.
+    Returns:    List of (variable, period, station, score, value, low, high) tuples ordered by station and period.
+    """
+    groups = groupPairs(matched, ('station',))
+    tasks = [(station, matched[rows], variables, samples, alpha, block_by_date, seed) for (station,), rows in sorted(groups.items())]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(bootstrapStation, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(bootstrapStation, tasks)
+    return [interval for station_intervals in results for interval in station_intervals]
+
+def bootstrapStation(task):
+    """
+    bootstrapStation()
+    Purpose:    Compute the bootstrapScores() intervals of one station.
+    Parameters: task [type=tuple]
+                    (station, the station's rows of the matched table, variables, samples, alpha, block_by_date, seed)
+    Returns:    List of (variable, period, station, score, value, low, high) tuples.
+    """
+    station, pairs, variables, samples, alpha, block_by_date, seed = task
+    intervals = []
+    for period_index, period in enumerate(OWLShift._forecast_days):
+        period_pairs = pairs[pairs['period'] == period]
+        random_state = np.random.RandomState([seed, period_index] + [ord(c) for c in station])
+        if block_by_date:
+            dates, blocks = np.unique(period_pairs['SDATE'].astype('S8'), return_inverse=True)
+        else:
+            blocks = np.arange(len(period_pairs))
+        weights = bootstrapWeights(blocks.max() + 1 if len(blocks) > 0 else 0, samples, random_state)
+        for variable in variables:
+            valid = period_pairs[variable + '_OK']
+            if variable == 'PPRB':
+                ct = ProbContingencyTable(np.arange(0,1.1,.1), size=11)
+                cells, counted = ct.cells(period_pairs['PPRB'][valid], period_pairs['PPRB_OBS'][valid], bins=np.arange(0,120,10))
+                ct.ct += np.bincount(cells, minlength=ct.ct.size).reshape(ct.ct.shape)
+                block_tables = np.bincount(blocks[valid][counted] * ct.ct.size + cells, minlength=weights.shape[1] * ct.ct.size)
+                resampled = ct.bootstrap(blockTables=block_tables.reshape((weights.shape[1],) + ct.ct.shape), weights=weights)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    estimates = dict(BS=ct.BrierScore(), BSS=ct.BrierSkillScore())
+            else:
+                ct = ContinuousContingencyTable(period_pairs[variable][valid], period_pairs[variable + '_OBS'][valid])
+                resampled = ct.bootstrap(blocks=blocks[valid], weights=weights)
+                estimates = dict(ME=ct.MeanError(), MAE=ct.MeanAbsoluteError(), RMSE=ct.RootMeanSquareError())
+            for score in sorted(estimates.keys()):
+                finite = resampled[score][np.isfinite(resampled[score])]
+                if len(finite) > 0:
+                    low, high = np.percentile(finite, [50 * alpha, 100 - 50 * alpha])
+                else:
+                    low, high = np.nan, np.nan
+                intervals.append((variable, period, station, score, estimates[score], low, high))
+    return intervals
+
+def trendScores(matched, variables, window_days, start_date, end_date, valid_range=(-50.0,120.0)):
+    """
+    trendScores()
+    Purpose:    Scores of every period and station, and of every period for all stations, over rolling windows of
+                window_days days.  The sums behind the scores are added up for each day and accumulated over the dates,
+                so the sums of any window are the difference of two cumulative sums and every window is scored at once.
+    Parameters: matched [type=np.array]
+                    Table from matchForecasts().
+                variables [type=list]
+                    Forecast variables to score.  PPRB gets BS and BSS, SKYC gets HSS and PSS and the others ME, MAE and
+                    RMSE.  Every variable gets N, the number of pairs.
+                window_days [type=int]
+                    Number of days in each window.
+                start_date, end_date [type=string]
+                    First and last days of the trends (format is 'YYYYMMDD').  Pairs are placed on the day their
+                    forecast window starts.
+                valid_range [type=tuple]
+                    Continuous pairs are only scored when the observation is within this range, as in ContinuousContingencyTable.
+    Returns:    Dictionary mapping each variable to a tuple of (list of (period, station) keys with 'ALL' for all stations,
+                list of window start dates, list of window end dates, dictionary mapping score names to arrays of shape
+                (keys, windows)).  The windows end on every day from window_days - 1 days after start_date to end_date.
+    """
+    first_day = timeToEpoch(start_date[:8])[0] // 1440
+    num_days = int(timeToEpoch(end_date[:8])[0] // 1440 - first_day + 1)
+    day = timeToEpoch(matched['SDATE']) // 1440 - first_day
+    station_keys, station_ids = groupIds(matched, ('period','station'))
+    period_keys, period_ids = groupIds(matched, ('period',))
+    group_keys = station_keys + [(period, 'ALL') for (period,) in period_keys]
+    # Every pair counts toward its station and toward all stations
+    rows = np.concatenate((np.arange(len(matched)), np.arange(len(matched))))
+    cells = np.concatenate((station_ids, period_ids + len(station_keys))) * num_days + np.concatenate((day, day))
+    in_range = (day >= 0) & (day < num_days)
+
+    ends = np.arange(min(window_days, num_days) - 1, num_days)
+    starts = np.maximum(ends - window_days + 1, 0)
+    dates = [date[:8] for date in epochToTime((np.arange(num_days) + first_day) * 1440)]
+    trends = {}
+    for variable in variables:
+        valid = (matched[variable + '_OK'] & in_range)[rows]
+        forecasts = matched[variable][rows][valid]
+        observations = matched[variable + '_OBS'][rows][valid]
+        if variable == 'PPRB':
+            table_cells, counted = ProbContingencyTable(np.arange(0,1.1,.1), size=11).cells(forecasts, observations, bins=np.arange(0,120,10))
+            daily = np.bincount(cells[valid][counted] * 22 + table_cells, minlength=len(group_keys) * num_days * 22).reshape((len(group_keys), num_days, 22))
+        elif variable in categorical_variables:
+            size = len(cloudCategories)
+            forecasts = forecasts.astype(int)
+            observations = observations.astype(int)
+            counted = (forecasts >= 0) & (forecasts < size) & (observations >= 0) & (observations < size)
+            daily = np.bincount(cells[valid][counted] * size**2 + forecasts[counted] * size + observations[counted],
+                minlength=len(group_keys) * num_days * size**2).reshape((len(group_keys), num_days, size**2))
+        else:
+            counted = (observations >= valid_range[0]) & (observations <= valid_range[1])
+            errors = forecasts[counted] - observations[counted]
+            daily = np.dstack([np.bincount(cells[valid][counted], weights=weights, minlength=len(group_keys) * num_days).reshape((len(group_keys), num_days))
+                for weights in [None, errors, np.abs(errors), errors ** 2]])
+        cumulative = np.concatenate((np.zeros((len(group_keys), 1, daily.shape[2])), np.cumsum(daily, axis=1)), axis=1)
+        sums = cumulative[:, ends + 1] - cumulative[:, starts]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if variable == 'PPRB':
+                tables = sums.reshape(sums.shape[:2] + (2, 11))
+                BS, reliability, resolution, uncertainty = brierScores(tables, np.arange(0,1.1,.1))
+                scores = dict(N=tables.sum(axis=(-2, -1)), BS=BS, BSS=(resolution - reliability) / uncertainty)
+            elif variable in categorical_variables:
+                tables = sums.reshape(sums.shape[:2] + (size, size))
+                scores = dict(N=tables.sum(axis=(-2, -1)), HSS=heidkeSkillScores(tables), PSS=peirceSkillScores(tables))
+            else:
+                N = sums[..., 0]
+                scores = dict(N=N, ME=sums[..., 1] / N, MAE=sums[..., 2] / N, RMSE=np.sqrt(sums[..., 3] / N))
+        trends[variable] = (group_keys, [dates[start] for start in starts], [dates[end] for end in ends], scores)
+    return trends
+
+def validPairs(site_fcsts, valid_masks, variable):
+    """
+    validPairs()
+    Purpose:    Apply the OWLShift.getForecasts() filter for a variable to forecasts from OWLShift.getSiteForecasts().
+    Returns:    Boolean array marking forecasts that are kept.
+    """
+    if variable in valid_masks:
+        return valid_masks[variable]
+    if variable in categorical_variables:
+        present = categorical_variables[variable](site_fcsts[variable]) >= 0
+    else:
+        present = site_fcsts[variable] > -900
+    return present & ((site_fcsts['TMPH'] > -900) | (site_fcsts['TMPL'] > -900))
+
+def groupPairs(matched, keys):
+    """
+    groupPairs()
+    Purpose:    Group the rows of a matched table by the values of one or more columns.
+    Parameters: matched [type=np.array]
+                    Table from matchForecasts().
+                keys [type=tuple]
+                    Names of the columns to group by.
+    Returns:    Dictionary mapping tuples of key values to arrays of row indices.
+    """
+    group_keys, ids = groupIds(matched, keys)
+    order = np.argsort(ids, kind='mergesort')
+    bounds = ids[order].searchsorted(np.arange(len(group_keys) + 1))
+    return dict([(key, order[bounds[i]:bounds[i + 1]]) for i, key in enumerate(group_keys)])
+
+def groupIds(matched, keys):
+    """
+    groupIds()
+    Purpose:    Number the groups of rows of a matched table that share the values of one or more columns, so that
+                scores for every group can be summed at once with np.bincount.
+    Parameters: matched [type=np.array]
+                    Table from matchForecasts().
+                keys [type=tuple]
+                    Names of the columns to group by.
+    Returns:    List of tuples of key values in sorted order and an array giving the group number of each row.
+    """
+    if len(matched) == 0:
+        return [], np.zeros((0,), dtype=int)
+    order = np.lexsort([matched[key] for key in reversed(keys)])
+    sorted_keys = [matched[key][order] for key in keys]
+    breaks = np.zeros((len(order),), dtype=bool)
+    breaks[0] = True
+    for column in sorted_keys:
+        breaks[1:] |= column[1:] != column[:-1]
+    starts = np.nonzero(breaks)[0]
+    ids = np.zeros((len(order),), dtype=int)
+    ids[order] = np.cumsum(breaks) - 1
+    return [tuple([column[start] for column in sorted_keys]) for start in starts], ids
+
+def pairContingencyTable(pairs, variable):
+    """
+    pairContingencyTable()
+    Purpose:    Produce a continuous contingency table from rows of a matched table.
+    Parameters: pairs [type=np.array]
+                    Rows from matchForecasts().
+                variable [type=string]
+                    Forecast variable to verify (e.g. 'TMPH').
+    Returns:    The completed contingency table as a ContinuousContingencyTable object.
+    """
+    valid = pairs[variable + '_OK']
+    return ContinuousContingencyTable(pairs[variable][valid], pairs[variable + '_OBS'][valid], keepPairs=False)
+
 def dump(grid):
     """
     dump()
@@ -312,10 +1199,68 @@ def dump(grid):
         print
     return
 
+def stackIndices(matched, axes, keys):
+    """
+    stackIndices()
+    Purpose:    Find the table of every row of a matched table in a StackedContingencyTable.
+    Parameters: matched [type=np.array]
+                    Rows from matchForecasts().  Every row's value of each axis must be in keys.
+                axes [type=tuple]
+                    Names of the columns that make up the leading axes of the stack, such as ('period', 'station').
+                keys [type=list]
+                    List of the key values along each axis.
+    Returns:    Tuple with an array of positions along each axis.  A ValueError is raised if a row's value is not in keys.
+    """
+    indices = []
+    for axis, axis_keys in zip(axes, keys):
+        axis_keys = np.array(axis_keys)
+        order = np.argsort(axis_keys, kind='mergesort')
+        sorted_keys = axis_keys[order]
+        if len(sorted_keys) == 0:
+            positions = np.zeros(matched[axis].shape, dtype=int)
+            missing = np.ones(matched[axis].shape, dtype=bool)
+        else:
+            positions = np.minimum(sorted_keys.searchsorted(matched[axis]), len(sorted_keys) - 1)
+            missing = sorted_keys[positions] != matched[axis]
+        if np.any(missing):
+            raise ValueError("%s %s is not in the keys of the stack" % (axis, matched[axis][missing][0]))
+        indices.append(order[positions])
+    return tuple(indices)
+
+def precipContingencyTables(matched, stations, axes=('period','station')):
+    """
+    precipContingencyTables()
+    Purpose:    Count the precipitation probability forecasts of a matched table into a 2x11 table for every period and
+                station at once.
+    Parameters: matched [type=np.array]
+                    Table from matchForecasts().
+                stations [type=list]
+                    Verifying stations, in the order of the station axis.
+                axes [type=tuple]
+                    Columns of the matched table that make up the leading axes of the stack.  'period' and 'station'
+                    take their keys from OWLShift._forecast_days and stations, the others from the values in matched.
+    Returns:    StackedContingencyTable of ProbContingencyTable data.
+    """
+    labels = np.arange(0,1.1,.1)
+    keys = []
+    for axis in axes:
+        if axis == 'period':
+            keys.append(OWLShift._forecast_days)
+        elif axis == 'station':
+            keys.append(stations)
+        else:
+            keys.append(list(np.unique(matched[axis])))
+    tables = StackedContingencyTable(labels, axes, keys, (2, 11))
+    valid = matched['PPRB_OK']
+    cells, counted = ProbContingencyTable(labels, size=11).cells(matched['PPRB'][valid], matched['PPRB_OBS'][valid], bins=np.arange(0,120,10))
+    tables.accumulate(stackIndices(matched[valid][counted], axes, keys), cells // 11, cells % 11)
+    return tables
+
 def precipContingencyTable(forecasts, observations, start_date, end_date, stations=None, shift=None, period=None):
     """
     precipContingencyTable()
     Purpose:    Produce a 2x11 contingency table containing all the precipitation probability forecasts for the period.
+                The forecasts are paired with matchForecasts() and counted with ProbContingencyTable.accumulate().
     Parameters: forecasts [type=dictionary]
                     Dictionary mapping shift days (e.g. 'Tue_Aft' for Tuesday Afternoon) to their OWLShift objects.
                 observations [type=dictionary]
@@ -325,17 +1270,13 @@ def precipContingencyTable(forecasts, observations, start_date, end_date, statio
                 end_date [type=string]
                     String containing the date of the end of the verification period (format is 'YYYYMMDD_HH:MM', same as in start_date).
                 stations [type=list,tuple,string]
-                    A station or list of stations to include in the contingency table.  Optional, defaults to KOUN if not given.
+                    A station or list of stations to include in the contingency table.  Optional, defaults to every station in observations.
                 shift [type=string]
                     The shift to verify (e.g. 'Tue_Aft' for Tuesday Afternoon).  Not implemented yet.
                 period [type=string]
                     The period to verify (one of '1A', '1B', '2', '3', or '4').  Optional, defaults to '1A' if not given.
     Returns:    The completed contingency table as a ProbContingencyTable object.
     """
-    labels = np.arange(0,1.1,.1)
-    contingency_table = ProbContingencyTable(labels,size=11)
-    total_forecasts = 0
-
     if period is None:
         period = OWLShift._forecast_days[0]
 
@@ -344,24 +1285,10 @@ def precipContingencyTable(forecasts, observations, start_date, end_date, statio
     elif type(stations) not in [ list, tuple ]:
         stations = [ stations ]
 
-    for shift_name, shift_data in forecasts.iteritems():
-        for stn in stations:
-            pprb = shift_data.getForecasts(period, start_date, end_date, "PPRB", verif_to_fcst[stn])
-
-            shift_start_times, shift_end_times = pprb[:2]
-
-            precip_obs = observations[stn].getPrecip(shift_start_times, shift_end_times)
-
-#           if shift_name[-3:] == "Mor" and stn == "ADM":
-#               print "Shift starts:", shift_start_times
-#               print "Shift ends:", shift_end_times
-#               print "Obs:", precip_obs
-
-            for idx in range(len(precip_obs)):
-                if precip_obs[idx] > -990:
-                    contingency_table[precip_obs[idx] > 0, pprb[2][idx] / 10] += 1
-                    total_forecasts += 1
-
+    matched = matchForecasts(forecasts, dict([(stn, observations[stn]) for stn in stations]), start_date, end_date, variables=[('PPRB','getPrecip')])
+    pairs = matched[matched['PPRB_OK'] & (matched['period'] == period)]
+    contingency_table = ProbContingencyTable(np.arange(0,1.1,.1),size=11)
+    contingency_table.accumulate(pairs['PPRB'], pairs['PPRB_OBS'], bins=np.arange(0,120,10))
     return contingency_table
 
 def splitLine(line,width=5):
@@ -371,109 +1298,6 @@ def splitLine(line,width=5):
         lineList.append(line[i-width:i].strip())
     return lineList
 
-def tempContingencyTable(forecasts, observations, start_date, end_date, temp="H", stations=None, shift=None, period=None):
-    """
-    tempContingencyTable()
-    Purpose:    Produce a continuous contingency table containing all the temperature forecasts for the period.
-    Parameters: forecasts [type=dictionary]
-                    Dictionary mapping shift days (e.g. 'Tue_Aft' for Tuesday Afternoon) to their OWLShift objects.
-                observations [type=dictionary]
-                    Dictionary mapping observation points (e.g. 'OUN' for Norman) to their ASOS objects.
-                start_date [type=string]
-                    String containing the date of the start of the verification period (format is 'YYYYMMDD_HH:MM').
-                end_date [type=string]
-                    String containing the date of the end of the verification period (format is 'YYYYMMDD_HH:MM', same as in start_date).
-                temp [type=string]
-                    String telling whether the high or low temperature is being evaluated.  "H" for high and "L" for low.
-                stations [type=list,tuple,string]
-                    A station or list of stations to include in the contingency table.  Optional, defaults to KOUN if not given.
-                shift [type=string]
-                    The shift to verify (e.g. 'Tue_Aft' for Tuesday Afternoon).  Not implemented yet.
-                period [type=string]
-                    The period to verify (one of '1A', '1B', '2', '3', or '4').  Optional, defaults to '1A' if not given.
-    Returns:    The completed contingency table as a ContinuousContingencyTable object.
-    """
-    temp_ct = ContinuousContingencyTable(np.array([]),np.array([]))
-    if period is None:
-        period = OWLShift._forecast_days[0]
-
-    if stations is None:
-        stations = observations.keys()
-    elif type(stations) not in [ list, tuple ]:
-        stations = [ stations ]
-
-    for shift_name, shift_data in forecasts.iteritems():
-        for stn in stations:
-            if temp.upper()=="H":
-                temp_fcasts = shift_data.getForecasts(period, start_date, end_date, "TMPH", verif_to_fcst[stn])
-            else:
-                temp_fcasts = shift_data.getForecasts(period, start_date, end_date, "TMPL", verif_to_fcst[stn])
-            
-            shift_start_times, shift_end_times = temp_fcasts[:2]
-            if temp.upper()=="H":
-                temp_obs = observations[stn].getHighTemps(shift_start_times,shift_end_times)
-                high_idxs = np.nonzero(temp_obs > 150)
-                if len(high_idxs[0]) > 0:
-                    print shift_start_times[high_idxs],temp_obs[high_idxs]
-            else:
-                temp_obs = observations[stn].getLowTemps(shift_start_times,shift_end_times)
-            temp_ct.addPairs(temp_fcasts[2],temp_obs)
-            
-    return temp_ct
-
-####
-def windContingencyTable(forecasts, observations, start_date, end_date, winds="max", stations=None, shift=None, period=None):
-    """
-    windContingencyTable()
-    Purpose:    Produce a continuous contingency table containing all the wind forecasts for the period.
-    Parameters: forecasts [type=dictionary]
-                    Dictionary mapping shift days (e.g. 'Tue_Aft' for Tuesday Afternoon) to their OWLShift objects.
-                observations [type=dictionary]
-                    Dictionary mapping observation points (e.g. 'OUN' for Norman) to their ASOS objects.
-                start_date [type=string]
-                    String containing the date of the start of the verification period (format is 'YYYYMMDD_HH:MM').
-                end_date [type=string]
-                    String containing the date of the end of the verification period (format is 'YYYYMMDD_HH:MM', same as in start_date).
-                winds [type=string]
-                    String telling whether the high or low temperature is being evaluated.  "H" for high and "L" for low.
-                stations [type=list,tuple,string]
-                    A station or list of stations to include in the contingency table.  Optional, defaults to KOUN if not given.
-                shift [type=string]
-                    The shift to verify (e.g. 'Tue_Aft' for Tuesday Afternoon).  Not implemented yet.
-                period [type=string]
-                    The period to verify (one of '1A', '1B', '2', '3', or '4').  Optional, defaults to '1A' if not given.
-    Returns:    The completed contingency table as a ContinuousContingencyTable object.
-    """
-    wind_ct = ContinuousContingencyTable(np.array([]),np.array([]))
-    if period is None:
-        period = OWLShift._forecast_days[0]
-
-    if stations is None:
-        stations = observations.keys()
-    elif type(stations) not in [ list, tuple ]:
-        stations = [ stations ]
-
-    for shift_name, shift_data in forecasts.iteritems():
-        for stn in stations:
-            if stn == 'KHHW' or stn == 'HHW':
-                pass
-            else:
-                if winds.upper()=="MAX":
-                    wind_fcasts = shift_data.getForecasts(period, start_date, end_date, "WSHI", verif_to_fcst[stn])
-                else:
-                    wind_fcasts = shift_data.getForecasts(period, start_date, end_date, "WSLO", verif_to_fcst[stn])
-
-                shift_start_times, shift_end_times = wind_fcasts[:2]
-                if winds.upper()=="MAX":
-                    wind_obs = observations[stn].getMaxWinds(shift_start_times,shift_end_times)
-                else:
-                    wind_obs = observations[stn].getMinWinds(shift_start_times,shift_end_times)
-                wind_ct.addPairs(wind_fcasts[2],wind_obs)
-    return wind_ct
-
-####
-
-
 def setPeriodDates(date,shift):
     """setPeriodDates
         Purpose:  Make a list of the appropriate verification datetimes for each forecast period"""
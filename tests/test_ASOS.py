@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from datetime import datetime,timedelta
+from ASOS import ASOS,readASOSFile,openASOSStore
+
+header = 'station,valid,lon,lat,tmpf,dwpf,relh,drct,sknt,p01m,alti,mslp,vsby,gust,skyc1,skyc2,skyc3,skyc4,skyl1,skyl2,skyl3,skyl4,metar\n'
+
+def asosLine(time,tmpf,sknt='5.00',p01m='0.00',skyc1='CLR'):
+    """Format one IEM ASOS row for OUN at a 'YYYY-MM-DD HH:MM' time."""
+    return 'OUN,%s,-97.47,35.25,%s,40.00,50.00,180.00,%s,%s,30.00,1013.00,10.00,M,%s,   ,   ,   ,M,M,M,M,KOUN AUTO\n' % (time,tmpf,sknt,p01m,skyc1)
+
+class ASOSTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def writeFile(self,lines,year=2010,comments=True):
+        filename = os.path.join(self.path,'OUN_asos_%d.txt' % year)
+        outfile = open(filename,'w')
+        if comments:
+            outfile.write('#DEBUG: Format Typ    -> comma\n')
+        outfile.writelines(lines)
+        outfile.close()
+        return filename
+
+class TestReadASOSFile(ASOSTestCase):
+    def testRepeatedHeaderIsSkipped(self):
+        first = [asosLine('2010-01-01 00:53','20.00'),asosLine('2010-01-01 01:53','21.00')]
+        second = [asosLine('2010-01-01 02:53','22.00')]
+        filename = self.writeFile([header] + first + ['#DEBUG: Format Typ    -> comma\n',header] + second)
+        header_,records,offset,scanned = readASOSFile(filename,'20100101_00:00','20100102_00:00')
+        self.assertEqual(len(records),3)
+        np.testing.assert_array_equal(records['tmpf'],[20.0,21.0,22.0])
+        self.assertEqual(offset,os.path.getsize(filename))
+
+    def testHeaderWithOtherColumnsRaises(self):
+        filename = self.writeFile([header,asosLine('2010-01-01 00:53','20.00'),'station,valid,tmpf\n','OUN,2010-01-01 01:53,21.00\n'])
+        self.assertRaises(ValueError,readASOSFile,filename,'20100101_00:00','20100102_00:00')
+
+    def testRowsScannedIncludeRowsOutsideWindow(self):
+        filename = self.writeFile([header] + [asosLine('2010-01-0%d 12:00' % day,'20.00') for day in range(1,6)])
+        header_,records,offset,scanned = readASOSFile(filename,'20100102_00:00','20100103_23:59')
+        self.assertEqual(len(records),2)
+        self.assertEqual(scanned,5)
+
+class TestReduceWindows(ASOSTestCase):
+    def setUp(self):
+        ASOSTestCase.setUp(self)
+        random = np.random.RandomState(3)
+        start = datetime(2010,1,1)
+        lines = [header]
+        minutes = np.cumsum(random.randint(5,90,size=300))
+        for minute in minutes:
+            value = lambda low,high: 'M' if random.rand() < .1 else '%.2f' % random.uniform(low,high)
+            lines.append(asosLine((start + timedelta(minutes=int(minute))).strftime('%Y-%m-%d %H:%M'),value(-60,150),
+                value(0,30),value(0,2)))
+        self.writeFile(lines)
+        self.asos = ASOS('OUN','20100101','20101231',path=self.path)
+        windowStarts = [start + timedelta(minutes=int(minute)) for minute in random.randint(0,minutes[-1] + 600,size=100)]
+        windowEnds = [windowStart + timedelta(minutes=int(length)) for windowStart,length in zip(windowStarts,random.randint(0,1500,size=100))]
+        self.startDates = np.array([date.strftime('%Y%m%d_%H:%M') for date in windowStarts])
+        self.endDates = np.array([date.strftime('%Y%m%d_%H:%M') for date in windowEnds])
+
+    def loopWindows(self,variable,reduce,valid_range=None):
+        """Reduce each window separately with getDataValues, as the methods did before reduceWindows."""
+        reduced = np.zeros((len(self.startDates),),dtype=float)
+        for idx in xrange(len(self.startDates)):
+            values = self.asos.getDataValues(self.startDates[idx],self.endDates[idx],variable)
+            if valid_range is not None:
+                values = values[(values >= valid_range[0]) & (values <= valid_range[1])]
+            reduced[idx] = reduce(values) if len(values) > 0 else -998
+        return reduced
+
+    def testMatchesPerWindowLoop(self):
+        for asos in [self.asos,self.storeCopy()]:
+            np.testing.assert_allclose(asos.getHighTemps(self.startDates,self.endDates),self.loopWindows('tmpf',np.max,(-40,140)))
+            np.testing.assert_allclose(asos.getLowTemps(self.startDates,self.endDates),self.loopWindows('tmpf',np.min,(-40,140)))
+            np.testing.assert_allclose(asos.getMaxWinds(self.startDates,self.endDates),
+                np.where(self.loopWindows('sknt',np.max) > -990,self.loopWindows('sknt',np.max) * 1.15077945,-998))
+            np.testing.assert_allclose(asos.getMinWinds(self.startDates,self.endDates),
+                np.where(self.loopWindows('sknt',np.min) > -990,self.loopWindows('sknt',np.min) * 1.15077945,-998))
+            np.testing.assert_allclose(asos.getPrecip(self.startDates,self.endDates),self.loopWindows('p01m',np.sum))
+            np.testing.assert_array_equal(asos.reduceWindows('tmpf',self.startDates,self.endDates,'count'),
+                [len(asos.getDataValues(s,e,'tmpf')) for s,e in zip(self.startDates,self.endDates)])
+
+    def testSomeWindowsAreEmpty(self):
+        self.assertTrue((self.loopWindows('tmpf',np.max) == -998).any())
+        self.assertTrue((self.loopWindows('tmpf',np.max) > -990).any())
+
+    def storeCopy(self):
+        self.asos.writeStore(os.path.join(self.path,'store'))
+        return openASOSStore(os.path.join(self.path,'store'))
+
+if __name__ == "__main__":
+    unittest.main()
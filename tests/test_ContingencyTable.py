@@ -0,0 +1,276 @@
+import unittest
+import numpy as np
+from ContingencyTable import ProbContingencyTable,MultiContingencyTable,StackedContingencyTable,ContinuousContingencyTable,\
+    bootstrapWeights,heidkeSkillScores,peirceSkillScores
+
+class TestStackedContingencyTable(unittest.TestCase):
+    def setUp(self):
+        self.keys = [['1A','1B'],['OKC','OUN','TUL']]
+        self.first = StackedContingencyTable(np.arange(3),('period','station'),self.keys,(3,3))
+        self.second = StackedContingencyTable(np.arange(3),('period','station'),self.keys,(3,3))
+        self.first.accumulate((np.array([0,0,1]),np.array([0,2,1])),np.array([0,1,2]),np.array([0,1,1]))
+        self.second.accumulate((np.array([1,1]),np.array([1,1])),np.array([2,2]),np.array([1,2]))
+
+    def testAddLeavesOperandsUnchanged(self):
+        first = self.first.ct.copy()
+        second = self.second.ct.copy()
+        total = self.first + self.second
+        np.testing.assert_array_equal(self.first.ct,first)
+        np.testing.assert_array_equal(self.second.ct,second)
+        np.testing.assert_array_equal(total.ct,first + second)
+        self.assertEqual(total.keys,self.keys)
+
+    def testBaseTablesAddLeavesOperandsUnchanged(self):
+        for table,other in [(MultiContingencyTable(np.arange(3),data=np.eye(3)),MultiContingencyTable(np.arange(3),data=np.ones((3,3)))),
+                            (ProbContingencyTable(np.arange(0,1.1,.1),data=np.ones((2,11))),ProbContingencyTable(np.arange(0,1.1,.1),data=np.ones((2,11))))]:
+            before = table.ct.copy()
+            total = table + other
+            np.testing.assert_array_equal(table.ct,before)
+            np.testing.assert_array_equal(total.ct,before + other.ct)
+
+    def testAccumulateAndIndex(self):
+        self.assertEqual(self.first.ct.sum(),3)
+        self.assertEqual(self.first.ct[self.first.index(period='1B',station='OUN')][2,1],1)
+        self.assertEqual(self.first.ct[self.first.index(period='1A',station='TUL')][1,1],1)
+
+    def testPoolMatchesSumOfTables(self):
+        pooled = self.first.pool('station')
+        self.assertEqual(pooled.axes,('period',))
+        self.assertEqual(pooled.keys,[['1A','1B']])
+        np.testing.assert_array_equal(pooled.ct,self.first.ct.sum(axis=1))
+
+    def testScoresMatchSingleTables(self):
+        total = self.first + self.second
+        hss = total.HeidkeSkillScore()
+        pss = total.PeirceSkillScore()
+        self.assertEqual(hss.shape,(2,3))
+        for index in np.ndindex(2,3):
+            table = MultiContingencyTable(np.arange(3),data=total.ct[index])
+            with np.errstate(divide='ignore',invalid='ignore'):
+                np.testing.assert_equal(hss[index],table.HeidkeSkillScore())
+                np.testing.assert_equal(pss[index],table.PeirceSkillScore())
+
+    def testDataOfWrongShapeRaises(self):
+        self.assertRaises(ValueError,StackedContingencyTable,np.arange(3),('period','station'),self.keys,(3,3),np.zeros((3,2,3,3)))
+
+class TestProbContingencyTable(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(20)
+        self.labels = np.arange(0,1.1,.1)
+        self.probs = np.round(random.uniform(-5,110,size=500))
+        self.probs[random.rand(500) < .05] = -998
+        self.probs[random.rand(500) < .02] = np.nan
+        self.probs[:4] = [0,100,110,115]
+        self.outcomes = random.randint(0,2,size=500).astype(float)
+        self.outcomes[random.rand(500) < .05] = -998
+
+    def loopCounts(self,bins):
+        """Count each pair separately, as the per-pair loops did before accumulate."""
+        counts = np.zeros((2,len(bins) - 1))
+        for prob,outcome in zip(self.probs,self.outcomes):
+            if np.isnan(prob) or prob <= -990 or outcome <= -990:
+                continue
+            for column in xrange(len(bins) - 1):
+                if bins[column] <= prob < bins[column + 1] or (column == len(bins) - 2 and prob == bins[-1]):
+                    counts[int(outcome > 0),column] += 1
+        return counts
+
+    def testAccumulateMatchesPerPairLoop(self):
+        bins = np.arange(0,120,10)
+        table = ProbContingencyTable(self.labels,size=11)
+        counted = table.accumulate(self.probs,self.outcomes,bins=bins)
+        np.testing.assert_array_equal(table.ct,self.loopCounts(bins))
+        self.assertEqual(counted,table.ct.sum())
+
+    def testDefaultBinsUseNearestLabel(self):
+        table = ProbContingencyTable(self.labels,size=11)
+        probs = np.array([0,.04,.06,.5,.94,.96,1.2,-.3])
+        table.accumulate(probs,np.array([True,False,True,True,False,False,True,False]))
+        np.testing.assert_array_equal(table.ct[1],[1,1,0,0,0,1,0,0,0,0,1])
+        np.testing.assert_array_equal(table.ct[0],[2,0,0,0,0,0,0,0,0,1,1])
+
+    def testCellsMarksCountedPairs(self):
+        bins = np.arange(0,120,10)
+        table = ProbContingencyTable(self.labels,size=11)
+        cells,counted = table.cells(self.probs,self.outcomes,bins=bins)
+        self.assertEqual(len(cells),counted.sum())
+        self.assertTrue(counted[2] and not counted[3])
+        missing = np.isnan(self.probs) | (np.nan_to_num(self.probs) <= -990) | (self.outcomes <= -990)
+        self.assertFalse(counted[missing].any())
+        np.testing.assert_array_equal(cells % 11,np.minimum(self.probs[counted] // 10,10))
+        np.testing.assert_array_equal(cells // 11,self.outcomes[counted])
+
+    def testBrierScoreMatchesPairs(self):
+        bins = np.arange(0,120,10)
+        table = ProbContingencyTable(self.labels,size=11)
+        cells,counted = table.cells(self.probs,self.outcomes,bins=bins)
+        table.accumulate(self.probs,self.outcomes,bins=bins)
+        self.assertAlmostEqual(table.BrierScore(),((self.labels[cells % 11] - self.outcomes[counted]) ** 2).mean())
+
+    def testWrongNumberOfBinsRaises(self):
+        table = ProbContingencyTable(self.labels,size=11)
+        self.assertRaises(ValueError,table.accumulate,self.probs,self.outcomes,np.arange(0,110,10))
+
+class TestMultiContingencyTable(unittest.TestCase):
+    def testTwoByTwoScores(self):
+        hits,falseAlarms,misses,correctNulls = 28.,72.,23.,2680.
+        table = MultiContingencyTable(np.arange(2),data=np.array([[hits,falseAlarms],[misses,correctNulls]]))
+        cross = hits * correctNulls - falseAlarms * misses
+        self.assertAlmostEqual(table.HeidkeSkillScore(),
+            2 * cross / ((hits + misses) * (misses + correctNulls) + (hits + falseAlarms) * (falseAlarms + correctNulls)))
+        self.assertAlmostEqual(table.PeirceSkillScore(),hits / (hits + misses) - falseAlarms / (falseAlarms + correctNulls))
+
+    def testMulticlassScores(self):
+        ct = np.array([[50.,91.,71.],[47.,2364.,170.],[54.,205.,3288.]])
+        table = MultiContingencyTable(np.arange(3),data=ct)
+        N = ct.sum()
+        correct = sum([ct[i,i] for i in xrange(3)]) / N
+        chance = sum([ct[i,:].sum() * ct[:,i].sum() for i in xrange(3)]) / N ** 2
+        observed = sum([ct[:,i].sum() ** 2 for i in xrange(3)]) / N ** 2
+        self.assertAlmostEqual(table.HeidkeSkillScore(),(correct - chance) / (1 - chance))
+        self.assertAlmostEqual(table.PeirceSkillScore(),(correct - chance) / (1 - observed))
+
+    def testPerfectAndRandomForecasts(self):
+        self.assertAlmostEqual(MultiContingencyTable(np.arange(3),data=np.diag([5.,7.,9.])).HeidkeSkillScore(),1.)
+        self.assertAlmostEqual(MultiContingencyTable(np.arange(3),data=np.diag([5.,7.,9.])).PeirceSkillScore(),1.)
+        self.assertAlmostEqual(MultiContingencyTable(np.arange(3),data=np.ones((3,3))).HeidkeSkillScore(),0.)
+        self.assertAlmostEqual(MultiContingencyTable(np.arange(3),data=np.ones((3,3))).PeirceSkillScore(),0.)
+
+    def testAccumulateMatchesPerPairLoop(self):
+        random = np.random.RandomState(22)
+        forecasts = random.randint(-1,5,size=300)
+        observations = random.randint(0,5,size=300).astype(float)
+        observations[random.rand(300) < .05] = -998
+        table = MultiContingencyTable(np.arange(4),size=4)
+        counted = table.accumulate(forecasts,observations)
+        counts = np.zeros((4,4))
+        for forecast,observation in zip(forecasts,observations):
+            if 0 <= forecast < 4 and 0 <= observation < 4:
+                counts[int(forecast),int(observation)] += 1
+        np.testing.assert_array_equal(table.ct,counts)
+        self.assertEqual(counted,counts.sum())
+
+    def testStackedScoresMatchSingleTables(self):
+        tables = np.random.RandomState(22).randint(0,50,size=(4,3,3)).astype(float)
+        np.testing.assert_allclose(heidkeSkillScores(tables),[MultiContingencyTable(np.arange(3),data=ct).HeidkeSkillScore() for ct in tables])
+        np.testing.assert_allclose(peirceSkillScores(tables),[MultiContingencyTable(np.arange(3),data=ct).PeirceSkillScore() for ct in tables])
+
+class TestContinuousContingencyTable(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(19)
+        self.chunks = []
+        for size in [0,7,40,1,25]:
+            observations = random.uniform(-80,150,size=size)
+            observations[random.rand(size) < .1] = -998
+            self.chunks.append((observations + random.normal(0,5,size=size),observations))
+
+    def directScores(self,valid_range=(-50.0,120.0)):
+        """Score all of the stored pairs at once."""
+        forecasts = np.concatenate([chunk[0] for chunk in self.chunks])
+        observations = np.concatenate([chunk[1] for chunk in self.chunks])
+        valid = (observations >= valid_range[0]) & (observations <= valid_range[1])
+        errors = forecasts[valid] - observations[valid]
+        return len(errors),errors.mean(),np.abs(errors).mean(),np.sqrt((errors ** 2).mean())
+
+    def scores(self,table):
+        return table.n,table.MeanError(),table.MeanAbsoluteError(),table.RootMeanSquareError()
+
+    def testRunningSumsMatchStoredPairs(self):
+        for keepPairs in [True,False]:
+            table = ContinuousContingencyTable(*self.chunks[0],keepPairs=keepPairs)
+            for forecasts,observations in self.chunks[1:]:
+                table.addPairs(forecasts,observations)
+            np.testing.assert_allclose(self.scores(table),self.directScores())
+
+    def testStoredPairsAreKept(self):
+        table = ContinuousContingencyTable(*self.chunks[0])
+        for forecasts,observations in self.chunks[1:]:
+            table.addPairs(forecasts,observations)
+        np.testing.assert_array_equal(table.forecasts,np.concatenate([chunk[0] for chunk in self.chunks]))
+        np.testing.assert_array_equal(table.observations,np.concatenate([chunk[1] for chunk in self.chunks]))
+        valid = (table.observations >= -50) & (table.observations <= 120)
+        np.testing.assert_allclose(table.errors,table.forecasts[valid] - table.observations[valid])
+
+    def testAddCombinesTables(self):
+        tables = [ContinuousContingencyTable(forecasts,observations,keepPairs=i != 2) for i,(forecasts,observations) in enumerate(self.chunks)]
+        before = [self.scores(table) for table in tables]
+        total = tables[0]
+        for table in tables[1:]:
+            total = total + table
+        np.testing.assert_allclose(self.scores(total),self.directScores())
+        self.assertFalse(total.keepPairs)
+        np.testing.assert_allclose([self.scores(table) for table in tables[1:]],before[1:])
+        total = ContinuousContingencyTable(*self.chunks[1])
+        for table in tables[2:]:
+            total += table
+        np.testing.assert_allclose(self.scores(total),self.directScores())
+
+    def testEmptyTableScoresAreNaN(self):
+        table = ContinuousContingencyTable(np.zeros((0,)),np.zeros((0,)))
+        self.assertEqual(table.n,0)
+        self.assertTrue(np.isnan(table.MeanError()) and np.isnan(table.RootMeanSquareError()))
+
+class TestBootstrap(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(21)
+        self.observations = random.uniform(-60,130,size=60)
+        self.forecasts = self.observations + random.normal(0,4,size=60)
+        self.blocks = np.repeat(np.arange(15),4)
+
+    def testWeightsShapeAndCounts(self):
+        weights = bootstrapWeights(15,200,np.random.RandomState(0))
+        self.assertEqual(weights.shape,(200,15))
+        np.testing.assert_array_equal(weights.sum(axis=1),15)
+        self.assertTrue((weights >= 0).all())
+        self.assertEqual(bootstrapWeights(0,200).shape,(200,0))
+
+    def testWeightsAreReproducibleWithSeed(self):
+        np.testing.assert_array_equal(bootstrapWeights(15,50,np.random.RandomState(7)),bootstrapWeights(15,50,np.random.RandomState(7)))
+        self.assertFalse((bootstrapWeights(15,50,np.random.RandomState(7)) == bootstrapWeights(15,50,np.random.RandomState(8))).all())
+
+    def testWeightsMatchDraws(self):
+        draws = np.random.RandomState(3).randint(0,15,size=(20,15))
+        weights = bootstrapWeights(15,20,np.random.RandomState(3))
+        for sample in xrange(20):
+            np.testing.assert_array_equal(weights[sample],np.bincount(draws[sample],minlength=15))
+
+    def testContinuousMatchesResampledTables(self):
+        table = ContinuousContingencyTable(self.forecasts,self.observations)
+        valid = (self.observations >= -50) & (self.observations <= 120)
+        weights = bootstrapWeights(15,30,np.random.RandomState(5))
+        resampled = table.bootstrap(blocks=self.blocks,weights=weights)
+        for sample in xrange(30):
+            pairs = np.concatenate([np.flatnonzero((self.blocks == block) & valid) for block in xrange(15) for count in xrange(weights[sample,block])])
+            direct = ContinuousContingencyTable(self.forecasts[pairs],self.observations[pairs])
+            self.assertAlmostEqual(resampled['ME'][sample],direct.MeanError())
+            self.assertAlmostEqual(resampled['MAE'][sample],direct.MeanAbsoluteError())
+            self.assertAlmostEqual(resampled['RMSE'][sample],direct.RootMeanSquareError())
+
+    def testProbMatchesResampledTables(self):
+        probs = np.round(np.random.RandomState(6).uniform(0,100,size=60))
+        outcomes = self.observations > 40
+        labels = np.arange(0,1.1,.1)
+        blockTables = np.zeros((15,2,11))
+        for block in xrange(15):
+            ProbContingencyTable(labels,data=blockTables[block]).accumulate(probs[self.blocks == block],outcomes[self.blocks == block],np.arange(0,120,10))
+        table = ProbContingencyTable(labels,data=blockTables.sum(axis=0))
+        weights = bootstrapWeights(15,30,np.random.RandomState(5))
+        resampled = table.bootstrap(blockTables=blockTables,weights=weights)
+        for sample in xrange(30):
+            direct = ProbContingencyTable(labels,data=(weights[sample][:,np.newaxis,np.newaxis] * blockTables).sum(axis=0))
+            self.assertAlmostEqual(resampled['BS'][sample],direct.BrierScore())
+            self.assertAlmostEqual(resampled['BSS'][sample],direct.BrierSkillScore())
+
+    def testResamplesAreReproducibleWithSeed(self):
+        table = ContinuousContingencyTable(self.forecasts,self.observations)
+        first = table.bootstrap(samples=40,blocks=self.blocks,randomState=np.random.RandomState(9))
+        second = table.bootstrap(samples=40,blocks=self.blocks,randomState=np.random.RandomState(9))
+        self.assertEqual(first['RMSE'].shape,(40,))
+        np.testing.assert_array_equal(first['RMSE'],second['RMSE'])
+
+    def testTableWithoutPairsRaises(self):
+        table = ContinuousContingencyTable(self.forecasts,self.observations,keepPairs=False)
+        self.assertRaises(ValueError,table.bootstrap)
+
+if __name__ == "__main__":
+    unittest.main()
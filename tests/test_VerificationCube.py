@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from ContingencyTable import ProbContingencyTable,MultiContingencyTable,ContinuousContingencyTable
+from VerificationCube import VerificationCube,buildCube,openCube
+
+stations = ['OKC','OUN','TUL']
+shifts = ['Mon_Aft','Mon_Mor','Thu_Aft','Thu_Mor']
+periods = ['1A','1B','2','3','4']
+
+def matchedTable(size,seed=24):
+    """Make a random matched table with the columns of matchForecasts() for TMPH, PPRB and SKYC."""
+    random = np.random.RandomState(seed)
+    matched = np.zeros((size,),dtype=[('shift','S7'),('period','S2'),('station','S3'),('SDATE','S14'),('EDATE','S14'),
+        ('TMPH',float),('TMPH_OK',bool),('TMPH_OBS',float),('PPRB',float),('PPRB_OK',bool),('PPRB_OBS',float),
+        ('SKYC',int),('SKYC_OK',bool),('SKYC_OBS',float)])
+    matched['shift'] = np.array(shifts)[random.randint(0,len(shifts),size=size)]
+    matched['period'] = np.array(periods)[random.randint(0,len(periods),size=size)]
+    matched['station'] = np.array(stations)[random.randint(0,len(stations),size=size)]
+    months = np.array(['201011','201012','201101','201102'])[random.randint(0,4,size=size)]
+    matched['SDATE'] = np.char.add(months,'15_12:00')
+    matched['TMPH_OBS'] = random.uniform(-60,130,size=size)
+    matched['TMPH'] = np.round(matched['TMPH_OBS'] + random.normal(0,4,size=size))
+    matched['TMPH_OK'] = random.rand(size) > .1
+    matched['PPRB'] = np.round(random.uniform(0,100,size=size),-1)
+    matched['PPRB_OBS'] = np.where(random.rand(size) < .3,random.uniform(0,1,size=size),0)
+    matched['PPRB_OBS'][random.rand(size) < .05] = -998
+    matched['PPRB_OK'] = random.rand(size) > .1
+    matched['SKYC'] = random.randint(0,5,size=size)
+    matched['SKYC_OBS'] = random.randint(-1,5,size=size)
+    matched['SKYC_OK'] = random.rand(size) > .1
+    return matched
+
+class TestVerificationCube(unittest.TestCase):
+    def setUp(self):
+        self.matched = matchedTable(2000)
+        self.cube = buildCube(self.matched,['TMPH','PPRB','SKYC'],'20101101','20110228')
+
+    def pairs(self,variable,rows):
+        ok = rows & self.matched[variable + '_OK']
+        return self.matched[variable][ok],self.matched[variable + '_OBS'][ok]
+
+    def testRollupMatchesDirectScores(self):
+        rows = (np.char.endswith(self.matched['shift'],'Aft') & (np.char.startswith(self.matched['SDATE'],'201012') |
+            np.char.startswith(self.matched['SDATE'],'201101')))
+        names,keys,scores = self.cube.scores('TMPH',by=('station',),shiftPeriod=['Aft'],monthOfYear=['12','01'])
+        self.assertEqual(names,['station'])
+        self.assertEqual(keys,[stations])
+        for i,station in enumerate(stations):
+            table = ContinuousContingencyTable(*self.pairs('TMPH',rows & (self.matched['station'] == station)))
+            self.assertEqual(scores['N'][i],table.n)
+            self.assertAlmostEqual(scores['ME'][i],table.MeanError())
+            self.assertAlmostEqual(scores['MAE'][i],table.MeanAbsoluteError())
+            self.assertAlmostEqual(scores['RMSE'][i],table.RootMeanSquareError())
+
+    def testTableRollupsMatchAccumulate(self):
+        rows = np.char.startswith(self.matched['shift'],'Thu')
+        names,keys,data = self.cube.rollup('PPRB',shiftDay=['Thu'])
+        table = ProbContingencyTable(np.arange(0,1.1,.1),size=11)
+        table.accumulate(*self.pairs('PPRB',rows),bins=np.arange(0,120,10))
+        np.testing.assert_array_equal(data,table.ct)
+        names,keys,data = self.cube.rollup('SKYC',by=('period','year'))
+        self.assertEqual(names,['period','year'])
+        self.assertEqual(keys,[periods,['2010','2011']])
+        for i,period in enumerate(periods):
+            for j,year in enumerate(keys[1]):
+                table = MultiContingencyTable(np.arange(5),size=5)
+                table.accumulate(*self.pairs('SKYC',(self.matched['period'] == period) & np.char.startswith(self.matched['SDATE'],year)))
+                np.testing.assert_array_equal(data[i,j],table.ct)
+
+    def testAddingInPiecesMatchesOneAdd(self):
+        cube = VerificationCube(stations,shifts,['201011','201012','201101','201102'],['TMPH','PPRB','SKYC'])
+        for rows in np.array_split(np.arange(len(self.matched)),4):
+            cube.add(self.matched[rows])
+        for variable in ['TMPH','PPRB','SKYC']:
+            np.testing.assert_allclose(cube.stats[variable],self.cube.stats[variable])
+
+    def testSaveAndOpen(self):
+        path = tempfile.mkdtemp()
+        try:
+            self.cube.save(path)
+            cube = openCube(path)
+            self.assertEqual(cube.keys,self.cube.keys)
+            self.assertEqual((cube.startDate,cube.endDate),('20101101','20110228'))
+            for variable in ['TMPH','PPRB','SKYC']:
+                np.testing.assert_array_equal(cube.stats[variable],self.cube.stats[variable])
+        finally:
+            shutil.rmtree(path)
+
+    def testValueNotInCubeRaises(self):
+        other = matchedTable(10,seed=5)
+        other['station'][3] = 'ADM'
+        self.assertRaisesRegexp(ValueError,'station ADM is not in the cube',self.cube.add,other)
+        self.assertRaisesRegexp(ValueError,'station .* is not in the cube',VerificationCube([],shifts,['201011'],['TMPH']).add,other)
+
+if __name__ == "__main__":
+    unittest.main()
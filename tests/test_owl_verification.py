@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from OWLShift import OWLShift
+from ContingencyTable import ProbContingencyTable,MultiContingencyTable,ContinuousContingencyTable
+from owl_verification import parseOWLForecast,stackIndices,trendScores
+
+fcst_header = 'SITE TMPH TIMH TMPL TIML WDRI WDRF WSHI WSLO WGST SKYC PPRB PTYP PINT '
+
+def fcstLine(site,tmph):
+    """Format one OWL forecast line with a high temperature and fixed values for the other fields."""
+    return '%-5s%-5s17   29   7    S    SW   26   0    25   CLR  0    RA   LGT  ' % (site,tmph)
+
+class TestParseOWLForecast(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.perDtype = OWLShift('Wed','Aft').perDtype
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def parse(self,lines):
+        filename = os.path.join(self.path,'20100901Aft.fcst')
+        outfile = open(filename,'w')
+        outfile.write('\n'.join(lines) + '\n')
+        outfile.close()
+        return parseOWLForecast(filename,'20100901','Aft',self.perDtype)
+
+    def testShortDigitLineDoesNotStartPeriod(self):
+        lines = []
+        for p,date in enumerate(['20100901','20100902','20100903','20100904','20100905']):
+            lines.extend([date,fcst_header,fcstLine('KOUN',str(70 + p))])
+            if p == 0:
+                lines.append('12345')
+                lines.append(fcstLine('KOKC','60'))
+        forecasts,errors = self.parse(lines)
+        self.assertEqual(errors,[])
+        self.assertEqual([len(period) for period in forecasts],[2,1,1,1,1])
+        np.testing.assert_array_equal(forecasts[0]['TMPH'],[70,60])
+        np.testing.assert_array_equal([period['TMPH'][-1] for period in forecasts],[60,71,72,73,74])
+
+class TestStackIndices(unittest.TestCase):
+    def setUp(self):
+        self.matched = np.array([('1B','OUN'),('1A','TUL'),('1A','OKC'),('1B','TUL')],dtype=[('period','S2'),('station','S4')])
+
+    def testPositionsFollowKeyOrder(self):
+        indices = stackIndices(self.matched,('period','station'),[['1A','1B'],['TUL','OKC','OUN']])
+        np.testing.assert_array_equal(indices[0],[1,0,0,1])
+        np.testing.assert_array_equal(indices[1],[2,0,1,0])
+
+    def testUnknownKeyRaises(self):
+        self.assertRaises(ValueError,stackIndices,self.matched,('period','station'),[['1A','1B'],['OKC','OUN']])
+        self.assertRaises(ValueError,stackIndices,self.matched,('period',),[[]])
+
+class TestTrendScores(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(25)
+        size = 1500
+        self.matched = np.zeros((size,),dtype=[('period','S2'),('station','S3'),('SDATE','S14'),
+            ('TMPH',float),('TMPH_OK',bool),('TMPH_OBS',float),('PPRB',float),('PPRB_OK',bool),('PPRB_OBS',float),
+            ('SKYC',int),('SKYC_OK',bool),('SKYC_OBS',float)])
+        self.matched['period'] = np.array(['1A','1B','2'])[random.randint(0,3,size=size)]
+        self.matched['station'] = np.array(['OKC','OUN'])[random.randint(0,2,size=size)]
+        # Days 0 to 24 of December, with some pairs before and after the trend dates
+        self.days = random.randint(-3,25,size=size)
+        self.matched['SDATE'] = ['201012%02d_%02d:00' % (day + 1,hour) if day >= 0 else '201011%02d_%02d:00' % (30 + day + 1,hour)
+            for day,hour in zip(self.days,random.randint(0,24,size=size))]
+        self.matched['TMPH_OBS'] = random.uniform(-60,130,size=size)
+        self.matched['TMPH'] = np.round(self.matched['TMPH_OBS'] + random.normal(0,4,size=size))
+        self.matched['TMPH_OK'] = random.rand(size) > .1
+        self.matched['PPRB'] = np.round(random.uniform(0,100,size=size),-1)
+        self.matched['PPRB_OBS'] = np.where(random.rand(size) < .3,random.uniform(0,1,size=size),0)
+        self.matched['PPRB_OK'] = random.rand(size) > .1
+        self.matched['SKYC'] = random.randint(0,5,size=size)
+        self.matched['SKYC_OBS'] = random.randint(-1,5,size=size)
+        self.matched['SKYC_OK'] = random.rand(size) > .1
+        self.trends = trendScores(self.matched,['TMPH','PPRB','SKYC'],7,'20101201','20101220')
+
+    def windowPairs(self,variable,key,window):
+        """Select the pairs of one key and window directly from the matched table."""
+        rows = (self.matched['period'] == key[0]) & self.matched[variable + '_OK'] & (self.days >= window) & (self.days < window + 7)
+        if key[1] != 'ALL':
+            rows &= self.matched['station'] == key[1]
+        return self.matched[variable][rows],self.matched[variable + '_OBS'][rows]
+
+    def testWindowDates(self):
+        keys,starts,ends,scores = self.trends['TMPH']
+        self.assertEqual(len(starts),14)
+        self.assertEqual((starts[0],ends[0]),('20101201','20101207'))
+        self.assertEqual((starts[-1],ends[-1]),('20101214','20101220'))
+        self.assertEqual(sorted(keys),sorted([(period,station) for period in ['1A','1B','2'] for station in ['ALL','OKC','OUN']]))
+
+    def testMatchesDirectRecompute(self):
+        keys,starts,ends,scores = self.trends['TMPH']
+        for k,key in enumerate(keys):
+            for window in xrange(len(starts)):
+                table = ContinuousContingencyTable(*self.windowPairs('TMPH',key,window))
+                self.assertEqual(scores['N'][k,window],table.n)
+                self.assertAlmostEqual(scores['ME'][k,window],table.MeanError())
+                self.assertAlmostEqual(scores['RMSE'][k,window],table.RootMeanSquareError())
+        keys,starts,ends,scores = self.trends['PPRB']
+        for k,key in enumerate(keys):
+            for window in xrange(len(starts)):
+                table = ProbContingencyTable(np.arange(0,1.1,.1),size=11)
+                table.accumulate(*self.windowPairs('PPRB',key,window),bins=np.arange(0,120,10))
+                self.assertEqual(scores['N'][k,window],table.ct.sum())
+                self.assertAlmostEqual(scores['BS'][k,window],table.BrierScore())
+        keys,starts,ends,scores = self.trends['SKYC']
+        for k,key in enumerate(keys):
+            for window in xrange(len(starts)):
+                table = MultiContingencyTable(np.arange(5),size=5)
+                table.accumulate(*self.windowPairs('SKYC',key,window))
+                self.assertEqual(scores['N'][k,window],table.ct.sum())
+                self.assertAlmostEqual(scores['HSS'][k,window],table.HeidkeSkillScore())
+                self.assertAlmostEqual(scores['PSS'][k,window],table.PeirceSkillScore())
+
+if __name__ == "__main__":
+    unittest.main()